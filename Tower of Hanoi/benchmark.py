@@ -0,0 +1,395 @@
+"""
+Benchmarks for the hot paths of the Tour of Anne Hoy model and solvers.
+
+Each benchmark is timed with timeit over a grid of cheese and stool counts.
+Results are written as JSON and can be compared against a stored baseline
+so that regressions are caught before they ship.
+
+Run from this folder with:
+
+    python3 benchmark.py                      # run and compare to baseline
+    python3 benchmark.py --output out.json    # also write results
+    python3 benchmark.py --save-baseline      # overwrite the baseline
+    python3 benchmark.py --startup            # check import times instead
+
+The startup check imports each module of ENTRY_POINTS in a fresh
+interpreter with -X importtime and fails if any takes longer than
+STARTUP_BUDGET, so that optional front ends and heavy standard library
+modules stay out of the core.
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import timeit
+
+from toah_model import TOAHModel, Cheese
+from tour import tour_of_four_stools
+
+CHEESE_COUNTS = (4, 8, 12)
+STOOL_COUNTS = (3, 4, 6)
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                'benchmark_baseline.json')
+DEFAULT_TOLERANCE = 0.25
+MIN_TIME = 0.05
+REPEAT = 3
+ENTRY_POINTS = ('toah_model', 'tour', 'console_controller', 'distance_oracle',
+                'replay', 'snapshot', 'journal', 'move_codec',
+                'state_explorer', 'external_bfs')
+STARTUP_BUDGET = 0.025
+
+
+def _filled_model(number_of_stools, number_of_cheeses):
+    """ Return a new TOAHModel with number_of_cheeses on its first stool.
+
+    @type number_of_stools: int
+    @type number_of_cheeses: int
+    @rtype: TOAHModel
+
+    >>> _filled_model(4, 3).get_number_of_cheeses()
+    3
+    """
+    model = TOAHModel(number_of_stools)
+    model.fill_first_stool(number_of_cheeses)
+    return model
+
+
+def _tour_sequence(number_of_cheeses):
+    """ Return the MoveSequence of a four stool tour of number_of_cheeses.
+
+    @type number_of_cheeses: int
+    @rtype: MoveSequence
+
+    >>> _tour_sequence(3).length()
+    5
+    """
+    model = _filled_model(4, number_of_cheeses)
+    tour_of_four_stools(model)
+    return model.get_move_seq()
+
+
+def bench_move(number_of_stools, number_of_cheeses):
+    """ Return a function timing a legal move and its reversal.
+
+    @type number_of_stools: int
+    @type number_of_cheeses: int
+    @rtype: function
+    """
+    model = _filled_model(number_of_stools, number_of_cheeses)
+
+    def run():
+        model.move(0, 1)
+        model.move(1, 0)
+    return run
+
+
+def bench_get_cheese_location(number_of_stools, number_of_cheeses):
+    """ Return a function timing the lookup of the smallest cheese.
+
+    The smallest cheese sits at the top of the first stool, so the
+    lookup has to scan the whole stack.
+
+    @type number_of_stools: int
+    @type number_of_cheeses: int
+    @rtype: function
+    """
+    model = _filled_model(number_of_stools, number_of_cheeses)
+    cheese = Cheese(1)
+    return lambda: model.get_cheese_location(cheese)
+
+
+def bench_eq(number_of_stools, number_of_cheeses):
+    """ Return a function timing the comparison of two equal models.
+
+    @type number_of_stools: int
+    @type number_of_cheeses: int
+    @rtype: function
+    """
+    model = _filled_model(number_of_stools, number_of_cheeses)
+    other = _filled_model(number_of_stools, number_of_cheeses)
+    return lambda: model == other
+
+
+def bench_str(number_of_stools, number_of_cheeses):
+    """ Return a function timing the text rendering of a model after a
+    move, which it then undoes.
+
+    Rendering an unchanged model is only a cache lookup, so every call
+    moves the smallest cheese first and renders the changed rows.
+
+    @type number_of_stools: int
+    @type number_of_cheeses: int
+    @rtype: function
+    """
+    model = _filled_model(number_of_stools, number_of_cheeses)
+
+    def run():
+        model.move(0, 1)
+        str(model)
+        model.undo()
+    return run
+
+
+def bench_generate_toah_model(number_of_stools, number_of_cheeses):
+    """ Return a function timing the replay of a four stool tour.
+
+    Returns None when there are not enough stools for the tour.
+
+    @type number_of_stools: int
+    @type number_of_cheeses: int
+    @rtype: function | None
+    """
+    if number_of_stools < 4:
+        return None
+    move_seq = _tour_sequence(number_of_cheeses)
+    return lambda: move_seq.generate_toah_model(number_of_stools,
+                                                number_of_cheeses)
+
+
+def bench_tour_of_four_stools(number_of_stools, number_of_cheeses):
+    """ Return a function timing a full four stool tour.
+
+    Returns None when there are not enough stools for the tour.
+
+    @type number_of_stools: int
+    @type number_of_cheeses: int
+    @rtype: function | None
+    """
+    if number_of_stools < 4:
+        return None
+    return lambda: tour_of_four_stools(_filled_model(number_of_stools,
+                                                     number_of_cheeses))
+
+
+BENCHMARKS = {
+    'move': bench_move,
+    'get_cheese_location': bench_get_cheese_location,
+    'eq': bench_eq,
+    'str': bench_str,
+    'generate_toah_model': bench_generate_toah_model,
+    'tour_of_four_stools': bench_tour_of_four_stools,
+}
+
+
+def case_name(benchmark, number_of_stools, number_of_cheeses):
+    """ Return the key a benchmark case is stored under.
+
+    @type benchmark: str
+    @type number_of_stools: int
+    @type number_of_cheeses: int
+    @rtype: str
+
+    >>> case_name('move', 4, 8)
+    'move[stools=4,cheeses=8]'
+    """
+    return '{}[stools={},cheeses={}]'.format(benchmark, number_of_stools,
+                                             number_of_cheeses)
+
+
+def time_function(function, min_time=MIN_TIME, repeat=REPEAT):
+    """ Return the best time in seconds of a single call to function.
+
+    The number of calls per measurement is doubled until one measurement
+    takes at least min_time seconds.
+
+    @type function: function
+    @type min_time: float
+    @type repeat: int
+    @rtype: float
+
+    >>> time_function(lambda: None, min_time=0.001, repeat=1) >= 0
+    True
+    """
+    timer = timeit.Timer(function)
+    number = 1
+    while timer.timeit(number) < min_time:
+        number *= 2
+    return min(timer.repeat(repeat, number)) / number
+
+
+def run_benchmarks(names=None, stool_counts=STOOL_COUNTS,
+                   cheese_counts=CHEESE_COUNTS, min_time=MIN_TIME,
+                   repeat=REPEAT):
+    """ Run the named benchmarks (all of them if names is None) over the
+    grid of stool and cheese counts.
+
+    Return a dictionary mapping each case name to its results.
+
+    @type names: list[str] | None
+    @type stool_counts: tuple[int]
+    @type cheese_counts: tuple[int]
+    @type min_time: float
+    @type repeat: int
+    @rtype: dict[str, dict]
+
+    >>> results = run_benchmarks(['eq'], (4,), (3,), 0.001, 1)
+    >>> list(results)
+    ['eq[stools=4,cheeses=3]']
+    >>> results['eq[stools=4,cheeses=3]']['cheeses']
+    3
+    """
+    results = {}
+    for name in names or list(BENCHMARKS):
+        for number_of_stools in stool_counts:
+            for number_of_cheeses in cheese_counts:
+                function = BENCHMARKS[name](number_of_stools,
+                                            number_of_cheeses)
+                if function is None:
+                    continue
+                seconds = time_function(function, min_time, repeat)
+                results[case_name(name, number_of_stools,
+                                  number_of_cheeses)] = {
+                                      'benchmark': name,
+                                      'stools': number_of_stools,
+                                      'cheeses': number_of_cheeses,
+                                      'seconds': seconds}
+    return results
+
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """ Return the cases in results that are slower than in baseline by
+    more than the given tolerance, as (case, baseline, current) tuples.
+
+    Cases missing from either side are ignored.
+
+    @type results: dict[str, dict]
+    @type baseline: dict[str, dict]
+    @type tolerance: float
+    @rtype: list[tuple]
+
+    >>> old = {'a': {'seconds': 1.0}, 'b': {'seconds': 1.0}}
+    >>> new = {'a': {'seconds': 1.1}, 'b': {'seconds': 2.0}}
+    >>> compare(new, old)
+    [('b', 1.0, 2.0)]
+    """
+    regressions = []
+    for case in sorted(results):
+        if case in baseline:
+            old = baseline[case]['seconds']
+            new = results[case]['seconds']
+            if new > old * (1 + tolerance):
+                regressions.append((case, old, new))
+    return regressions
+
+
+def import_time(module, repeat=REPEAT):
+    """ Return the best time in seconds that importing module takes in a
+    fresh interpreter, as reported by -X importtime.
+
+    @type module: str
+    @type repeat: int
+    @rtype: float
+
+    >>> import_time('toah_model', repeat=1) < 1
+    True
+    """
+    best = None
+    for _ in range(repeat):
+        process = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', 'import ' + module],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.PIPE, universal_newlines=True, check=True)
+        line = process.stderr.strip().splitlines()[-1]
+        seconds = int(line.split('|')[1]) / 1e6
+        if best is None or seconds < best:
+            best = seconds
+    return best
+
+
+def check_startup(modules=ENTRY_POINTS, budget=STARTUP_BUDGET,
+                  repeat=REPEAT):
+    """ Return the import time of each module and the modules over budget.
+
+    @type modules: tuple[str]
+    @type budget: float
+    @type repeat: int
+    @rtype: tuple[dict[str, float], list[str]]
+    """
+    times = {}
+    for module in modules:
+        times[module] = import_time(module, repeat)
+    return times, [module for module in modules if times[module] > budget]
+
+
+def report(results):
+    """ Return the JSON document describing results.
+
+    @type results: dict[str, dict]
+    @rtype: dict
+    """
+    return {'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'results': results}
+
+
+def main(argv=None):
+    """ Run the benchmark command line and return its exit status.
+
+    The status is 1 if any case regressed against the baseline.
+
+    @type argv: list[str] | None
+    @rtype: int
+    """
+    parser = argparse.ArgumentParser(
+        description='Benchmark the Tour of Anne Hoy hot paths.')
+    parser.add_argument('benchmarks', nargs='*',
+                        help='benchmarks to run (default: all of '
+                             + ', '.join(BENCHMARKS) + ')')
+    parser.add_argument('--output', help='file to write the JSON results to')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE,
+                        help='baseline JSON file to compare against')
+    parser.add_argument('--save-baseline', action='store_true',
+                        help='store the results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help='allowed slowdown ratio before failing')
+    parser.add_argument('--quick', action='store_true',
+                        help='time each case once, for smoke testing')
+    parser.add_argument('--startup', action='store_true',
+                        help='check the import time of the entry points '
+                             'against the startup budget instead')
+    args = parser.parse_args(argv)
+    if args.startup:
+        times, over = check_startup(repeat=1 if args.quick else REPEAT)
+        print(json.dumps(times, indent=2, sort_keys=True))
+        for module in over:
+            print('OVER BUDGET {}: {:.1f} ms > {:.1f} ms'.format(
+                module, times[module] * 1000, STARTUP_BUDGET * 1000),
+                file=sys.stderr)
+        return 1 if over else 0
+    for name in args.benchmarks:
+        if name not in BENCHMARKS:
+            parser.error('unknown benchmark: ' + name)
+
+    if args.quick:
+        results = run_benchmarks(args.benchmarks, min_time=0.001, repeat=1)
+    else:
+        results = run_benchmarks(args.benchmarks)
+    document = report(results)
+    text = json.dumps(document, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as output:
+            output.write(text + '\n')
+    else:
+        print(text)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as output:
+            output.write(text + '\n')
+        return 0
+    if not os.path.exists(args.baseline):
+        print('No baseline at {}'.format(args.baseline), file=sys.stderr)
+        return 0
+    with open(args.baseline) as baseline_file:
+        baseline = json.load(baseline_file)['results']
+    regressions = compare(results, baseline, args.tolerance)
+    for case, old, new in regressions:
+        print('REGRESSION {}: {:.3g}s -> {:.3g}s ({:+.0%})'.format(
+            case, old, new, new / old - 1), file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
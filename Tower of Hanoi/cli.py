@@ -0,0 +1,455 @@
+"""
+Command line for solving, checking and replaying Tour of Anne Hoy games.
+
+    python3 cli.py solve --cheeses N --stools K [--format F] [--output FILE]
+    python3 cli.py validate FILE [--format F] [--stools K --cheeses N]
+    python3 cli.py replay FILE [--format F] [--every E] [--output FILE]
+    python3 cli.py animate --cheeses N --stools K --output FILE
+                           [--keyframe-interval I] [--delay SECONDS]
+    python3 cli.py play FILE [--start FRAME] [--delay SECONDS]
+    python3 cli.py bench [benchmark options]
+
+Moves are written and read in one of two formats:
+
+    text     the move scripts of console_controller: a header line
+             "# toah stools=K cheeses=N", then one "origin destination"
+             pair of stool numbers (from 1) per line, or u / r to undo /
+             redo
+    packed   one byte per move as in toah_model.pack_moves, with no header,
+             so validate and replay need --stools and --cheeses
+
+FILE may be - for stdin. The exit status is 1 if a file holds an illegal
+move or validate finds that the game is not won, and 2 for other errors.
+
+Moves are streamed through buffered writers and readers a chunk at a
+time (packed three stool tours a NumPy block at a time when NumPy is
+installed), and models forget the older half of their history every
+HISTORY_LIMIT moves, so memory does not grow with the length of a tour.
+An undo line can so take back at least the last HISTORY_LIMIT // 2 moves.
+
+animate records the tour as an asciicast text animation with
+frame_recorder, and play shows such a recording in the terminal from any
+frame.
+"""
+
+import argparse
+import io
+import sys
+import time
+
+from console_controller import parse_script_lines, read_script_header
+from toah_model import TOAHModel, IllegalMoveError, MoveSequence, \
+    pack_moves, unpack_moves
+from tour import three_stool_moves, four_stool_moves, tour_length, \
+    three_stool_blocks
+
+FORMATS = ('text', 'packed')
+CHUNK_MOVES = 64 * 1024
+HISTORY_LIMIT = 64 * 1024
+
+
+def tour_moves(number_of_cheeses, number_of_stools):
+    """ Generate the moves of the tour taking number_of_cheeses from the
+    first stool to the last, using three stools if there are three and
+    otherwise the first three and the last.
+
+    @type number_of_cheeses: int
+    @type number_of_stools: int
+    @rtype: generator[tuple[int]]
+
+    >>> list(tour_moves(2, 5))
+    [(0, 1), (0, 4), (1, 4)]
+    """
+    if number_of_stools == 3:
+        return three_stool_moves(number_of_cheeses, 0, 1, 2)
+    if number_of_stools >= 4:
+        return four_stool_moves(number_of_cheeses, 0, 1, 2,
+                                number_of_stools - 1)
+    raise ValueError("tours need at least 3 stools")
+
+
+def _chunks(moves):
+    """ Generate the moves in lists of at most CHUNK_MOVES.
+
+    @type moves: iterable[tuple[int]]
+    @rtype: generator[list[tuple[int]]]
+    """
+    chunk = []
+    for move in moves:
+        chunk.append(move)
+        if len(chunk) == CHUNK_MOVES:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def write_moves(output, moves, fmt, number_of_stools, number_of_cheeses):
+    """ Write moves to the binary file output in format fmt and return how
+    many there were.
+
+    @type output: file
+    @type moves: iterable[tuple[int]]
+    @type fmt: str
+    @type number_of_stools: int
+    @type number_of_cheeses: int
+    @rtype: int
+
+    >>> output = io.BytesIO()
+    >>> write_moves(output, [(0, 2)], 'text', 3, 1)
+    1
+    >>> output.getvalue()
+    b'# toah stools=3 cheeses=1\\n1 3\\n'
+    """
+    count = 0
+    if fmt == 'text':
+        output.write('# toah stools={} cheeses={}\n'.format(
+            number_of_stools, number_of_cheeses).encode())
+    for chunk in _chunks(moves):
+        if fmt == 'text':
+            output.write(''.join(['{} {}\n'.format(source + 1,
+                                                   destination + 1)
+                                  for source, destination in chunk])
+                         .encode())
+        else:
+            output.write(pack_moves(chunk))
+        count += len(chunk)
+    return count
+
+
+def write_packed_blocks(output, number_of_cheeses):
+    """ Write the three stool tour of number_of_cheeses to the binary file
+    output packed as in write_moves, a NumPy block at a time, and return
+    the number of moves, or None without writing anything if NumPy is not
+    installed.
+
+    @type output: file
+    @type number_of_cheeses: int
+    @rtype: int | None
+    """
+    try:
+        import numpy
+    except ImportError:
+        return None
+    count = 0
+    for sources, destinations in three_stool_blocks(number_of_cheeses):
+        output.write((sources * numpy.uint8(16) + destinations).tobytes())
+        count += len(sources)
+    return count
+
+
+def read_moves(source, fmt, number_of_stools):
+    """ Generate the moves of the binary file source in format fmt, as
+    pairs of stool indices (from 0), or 'u' or 'r' for the undo and redo
+    lines of a text file.
+
+    Raises ValueError naming the first bad line of a text file.
+
+    @type source: file
+    @type fmt: str
+    @type number_of_stools: int
+    @rtype: generator[tuple[int] | str]
+
+    >>> list(read_moves(io.BytesIO(b'# toah stools=3 cheeses=1\\n1 3\\nu\\n'),
+    ...                 'text', 3))
+    [(0, 2), 'u']
+    """
+    if fmt == 'packed':
+        while True:
+            chunk = source.read(CHUNK_MOVES)
+            if not chunk:
+                return
+            yield from unpack_moves(chunk)
+    yield from parse_script_lines(io.TextIOWrapper(source, encoding='ascii'),
+                                  number_of_stools)
+
+
+def _open_input(path):
+    """ Return the binary file at path, or stdin if path is '-'.
+
+    @type path: str
+    @rtype: file
+    """
+    return sys.stdin.buffer if path == '-' else open(path, 'rb')
+
+
+def _open_output(path):
+    """ Return the binary file at path opened for writing, or stdout if
+    path is None.
+
+    @type path: str | None
+    @rtype: file
+    """
+    return sys.stdout.buffer if path is None else open(path, 'wb')
+
+
+def _game(source, args):
+    """ Return the (number_of_stools, number_of_cheeses) of the game in
+    source, from --stools and --cheeses or else from its text header.
+
+    @type source: file
+    @type args: argparse.Namespace
+    @rtype: tuple[int]
+    """
+    if args.stools is not None and args.cheeses is not None:
+        return args.stools, args.cheeses
+    header = None
+    if args.format == 'text':
+        header = read_script_header(source.peek(256)[:256].decode(
+            'ascii', 'replace'))
+    if header is None:
+        raise ValueError('give --stools and --cheeses, or a text file with '
+                         'a "# toah stools=K cheeses=N" header')
+    return header
+
+
+def _apply(model, move, index):
+    """ Make move in model, or undo or redo if move is 'u' or 'r', and
+    return by how much that changed the number of moves made.
+
+    The older half of the history of model is forgotten every
+    HISTORY_LIMIT moves. Raises IllegalMoveError naming move number index
+    if it is illegal.
+
+    @type model: TOAHModel
+    @type move: tuple[int] | str
+    @type index: int
+    @rtype: int
+
+    >>> M = TOAHModel(3)
+    >>> M.fill_first_stool(2)
+    >>> _apply(M, (0, 1), 1), _apply(M, 'u', 2), _apply(M, 'r', 3)
+    (1, -1, 1)
+    """
+    try:
+        if move == 'u':
+            model.undo()
+            return -1
+        if move == 'r':
+            model.redo()
+            return 1
+        model.move(move[0], move[1])
+    except IllegalMoveError as e:
+        raise IllegalMoveError('move {}: {}'.format(index, e))
+    if model.number_of_moves() >= HISTORY_LIMIT:
+        model.load_history(MoveSequence(
+            list(model.get_move_seq())[HISTORY_LIMIT // 2:]))
+    return 1
+
+
+def solve(args):
+    """ Write the tour of the game to the output.
+
+    @type args: argparse.Namespace
+    @rtype: int
+    """
+    moves = tour_moves(args.cheeses, args.stools)
+    output = _open_output(args.output)
+    try:
+        count = None
+        if args.format == 'packed' and args.stools == 3 and \
+                0 < args.cheeses <= 63:
+            count = write_packed_blocks(output, args.cheeses)
+        if count is None:
+            count = write_moves(output, moves, args.format, args.stools,
+                                args.cheeses)
+    finally:
+        if output is not sys.stdout.buffer:
+            output.close()
+        else:
+            output.flush()
+    if args.output is not None:
+        print('Wrote {} moves to {}'.format(count, args.output))
+    return 0
+
+
+def validate(args):
+    """ Check that the moves of the file are legal and win the game.
+
+    @type args: argparse.Namespace
+    @rtype: int
+    """
+    source = _open_input(args.file)
+    try:
+        number_of_stools, number_of_cheeses = _game(source, args)
+        model = TOAHModel(number_of_stools)
+        model.fill_first_stool(number_of_cheeses)
+        count = made = 0
+        for move in read_moves(source, args.format, number_of_stools):
+            count += 1
+            made += _apply(model, move, count)
+    finally:
+        if source is not sys.stdin.buffer:
+            source.close()
+    won = model.is_solved()
+    verdict = ''
+    if won and number_of_stools == 3:
+        verdict = ' (optimal)' if made == tour_length(
+            number_of_cheeses, 3) else ' (not optimal)'
+    elif won and number_of_stools == 4:
+        length = tour_length(number_of_cheeses, 4)
+        verdict = ' (matches reference tour)' if made == length else \
+            ' (reference tour: {} moves)'.format(length)
+    print('{} legal moves, game {}{}.'.format(
+        made, 'won' if won else 'not won', verdict))
+    return 0 if won else 1
+
+
+def replay(args):
+    """ Write the board after every args.every moves of the file.
+
+    @type args: argparse.Namespace
+    @rtype: int
+    """
+    source = _open_input(args.file)
+    output = io.TextIOWrapper(_open_output(args.output), encoding='utf-8',
+                              write_through=False)
+    try:
+        number_of_stools, number_of_cheeses = _game(source, args)
+        model = TOAHModel(number_of_stools)
+        model.fill_first_stool(number_of_cheeses)
+        output.write('Move 0\n{}\n'.format(model))
+        count = 0
+        for move in read_moves(source, args.format, number_of_stools):
+            count += 1
+            _apply(model, move, count)
+            if count % args.every == 0:
+                output.write('Move {}\n{}\n'.format(count, model))
+        if count % args.every != 0:
+            output.write('Move {}\n{}\n'.format(count, model))
+    finally:
+        if source is not sys.stdin.buffer:
+            source.close()
+        if args.output is None:
+            output.flush()
+            output.detach()
+        else:
+            output.close()
+    return 0
+
+
+def animate(args):
+    """ Record the tour of the game as a text animation.
+
+    @type args: argparse.Namespace
+    @rtype: int
+    """
+    from frame_recorder import FrameRecorder
+    model = TOAHModel(args.stools)
+    model.fill_first_stool(args.cheeses)
+    with open(args.output, 'w', encoding='utf-8') as output:
+        recorder = FrameRecorder(output, args.keyframe_interval, args.delay)
+        recorder.attach(model)
+        count = 0
+        for move in tour_moves(args.cheeses, args.stools):
+            count += 1
+            _apply(model, move, count)
+    print('Wrote {} frames to {}'.format(recorder.number_of_frames(),
+                                         args.output))
+    return 0
+
+
+def play(args):
+    """ Show the frames of a text animation from frame args.start on.
+
+    @type args: argparse.Namespace
+    @rtype: int
+    """
+    from frame_recorder import FramePlayer
+    with open(args.file, 'rb') as source:
+        player = FramePlayer(source)
+        for frame in player.frames(args.start):
+            print('\x1b[H\x1b[2J' + frame, flush=True)
+            time.sleep(args.delay)
+    return 0
+
+
+def bench(args):
+    """ Run benchmark.py with the remaining arguments.
+
+    @type args: argparse.Namespace
+    @rtype: int
+    """
+    from benchmark import main as benchmark_main
+    return benchmark_main(args.arguments)
+
+
+def main(argv=None):
+    """ Run the command line and return its exit status.
+
+    @type argv: list[str] | None
+    @rtype: int
+    """
+    parser = argparse.ArgumentParser(
+        description='Solve, validate and replay Tour of Anne Hoy games.')
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+
+    solve_parser = commands.add_parser('solve', help='write the reference tour')
+    solve_parser.add_argument('--cheeses', type=int, required=True)
+    solve_parser.add_argument('--stools', type=int, default=4)
+    solve_parser.add_argument('--format', choices=FORMATS, default='text')
+    solve_parser.add_argument('--output', help='file to write (default: '
+                                               'stdout)')
+    solve_parser.set_defaults(run=solve)
+
+    for name, run, description in (
+            ('validate', validate, 'check that a move file wins the game'),
+            ('replay', replay, 'print the board along a move file')):
+        file_parser = commands.add_parser(name, help=description)
+        file_parser.add_argument('file', help='move file, or - for stdin')
+        file_parser.add_argument('--format', choices=FORMATS, default='text')
+        file_parser.add_argument('--stools', type=int)
+        file_parser.add_argument('--cheeses', type=int)
+        file_parser.set_defaults(run=run)
+        if name == 'replay':
+            file_parser.add_argument('--every', type=int, default=1,
+                                     help='print every EVERY moves')
+            file_parser.add_argument('--output', help='file to write '
+                                                      '(default: stdout)')
+
+    animate_parser = commands.add_parser(
+        'animate', help='record the reference tour as a text animation')
+    animate_parser.add_argument('--cheeses', type=int, required=True)
+    animate_parser.add_argument('--stools', type=int, default=4)
+    animate_parser.add_argument('--output', required=True)
+    animate_parser.add_argument('--keyframe-interval', type=int, default=256)
+    animate_parser.add_argument('--delay', type=float, default=0.5,
+                                help='seconds between frames')
+    animate_parser.set_defaults(run=animate)
+
+    play_parser = commands.add_parser('play', help='show a text animation')
+    play_parser.add_argument('file')
+    play_parser.add_argument('--start', type=int, default=0,
+                             help='frame to start from')
+    play_parser.add_argument('--delay', type=float, default=0.5,
+                             help='seconds between frames')
+    play_parser.set_defaults(run=play)
+
+    bench_parser = commands.add_parser(
+        'bench', help='run benchmark.py with the arguments that follow')
+    bench_parser.set_defaults(run=bench)
+
+    args, args.arguments = parser.parse_known_args(argv)
+    if args.arguments and args.command != 'bench':
+        parser.error('unrecognized arguments: ' + ' '.join(args.arguments))
+    if args.command == 'solve' and (args.stools < 3 or args.cheeses < 0):
+        parser.error('need at least 3 stools and no negative cheeses')
+    if args.command == 'replay' and args.every < 1:
+        parser.error('--every must be positive')
+    if args.command == 'animate' and (args.stools < 3 or args.cheeses < 0 or
+                                      args.keyframe_interval < 1):
+        parser.error('need at least 3 stools, no negative cheeses and a '
+                     'positive --keyframe-interval')
+    try:
+        return args.run(args)
+    except IllegalMoveError as e:
+        print(e, file=sys.stderr)
+        return 1
+    except (OSError, ValueError) as e:
+        print(e, file=sys.stderr)
+        return 2
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,380 @@
+"""
+Models of a Tour of Anne Hoy game that several threads or processes can
+play at once.
+
+ConcurrentTOAHModel is a TOAHModel for threads. SharedBoard keeps the
+positions of the cheeses in shared memory for processes. Both have one
+lock per stool, and a move takes the locks of its two stools in index
+order, so moves between disjoint pairs of stools do not wait for each
+other. Every lock is only ever taken in index order, so nothing can
+deadlock.
+"""
+
+import threading
+from contextlib import contextmanager
+
+from shared_model import SharedPositions, move_cheese
+from toah_model import TOAHModel, IllegalMoveError
+
+
+class ConcurrentTOAHModel(TOAHModel):
+    """ TOAHModel whose moves can be made from several threads at once.
+
+    A move checks and moves the cheese holding the locks of its two
+    stools, then records itself in the history under a short history
+    lock, still holding the stool locks. So the history is always an
+    order in which the moves could have been made one at a time. Every
+    other change to the model, and get_state and str, take all the locks.
+
+    While the model has listeners, moves take all the locks too, so that
+    each listener is told of the moves in the order of the history and
+    sees the board just as its move left it. Since the locks are taken
+    in index order and are reentrant, listeners may call back into the
+    model, e.g. for str.
+
+    No state snapshots are kept, since one could not be taken without
+    stopping every move, so go_to_move steps one move at a time.
+
+    === Private Attributes ===
+    @param list[threading.RLock] _stool_locks:
+        lock of each stool
+    @param threading.RLock _history_lock:
+        lock of the move history, redo moves and listeners
+    """
+
+    def __init__(self, number_of_stools):
+        """ Create a new ConcurrentTOAHModel with empty stools.
+
+        @type self: ConcurrentTOAHModel
+        @type number_of_stools: int
+        @rtype: None
+        """
+        super().__init__(number_of_stools)
+        self._stool_locks = [threading.RLock()
+                             for _ in range(number_of_stools)]
+        self._history_lock = threading.RLock()
+
+    @contextmanager
+    def _all_locks(self):
+        """ Hold every stool lock, in index order, and the history lock.
+
+        @type self: ConcurrentTOAHModel
+        @rtype: generator[None]
+        """
+        for lock in self._stool_locks:
+            lock.acquire()
+        self._history_lock.acquire()
+        try:
+            yield
+        finally:
+            self._history_lock.release()
+            for lock in reversed(self._stool_locks):
+                lock.release()
+
+    def move(self, source_stool, destination_stool):
+        """ Move the top cheese of source_stool onto destination_stool, as
+        TOAHModel.move, holding the locks of the two stools.
+
+        @type self: ConcurrentTOAHModel
+        @type source_stool: int
+        @type destination_stool: int
+        @rtype: None
+
+        Two threads moving on disjoint stools, recorded by a listener that
+        draws the whole board after every move:
+
+        >>> import io
+        >>> from frame_recorder import FrameRecorder, FramePlayer
+        >>> M = ConcurrentTOAHModel(4)
+        >>> M.fill_first_stool(4)
+        >>> M.set_state((0, 2, 0, 2))
+        >>> output = io.StringIO()
+        >>> FrameRecorder(output, keyframe_interval=1).attach(M)
+        >>> def shuttle(stool):
+        ...     for _ in range(200):
+        ...         M.move(stool, stool + 1)
+        ...         M.move(stool + 1, stool)
+        >>> threads = [threading.Thread(target=shuttle, args=(stool,))
+        ...            for stool in (0, 2)]
+        >>> for thread in threads:
+        ...     thread.start()
+        >>> for thread in threads:
+        ...     thread.join()
+        >>> M.get_state(), M.number_of_moves()
+        ((0, 2, 0, 2), 800)
+        >>> player = FramePlayer(io.BytesIO(output.getvalue().encode()))
+        >>> player.number_of_frames(), player.frame_at(800) == str(M)
+        (801, True)
+        """
+        if not self._listeners:
+            first = self._stool_locks[source_stool]
+            second = self._stool_locks[destination_stool]
+            if source_stool % self._number_of_stools > \
+                    destination_stool % self._number_of_stools:
+                first, second = second, first
+            with first, second:
+                # Listeners are only added holding every lock.
+                if not self._listeners:
+                    self._make_move(source_stool, destination_stool)
+                    return
+        with self._all_locks():
+            self._make_move(source_stool, destination_stool)
+
+    def _make_move(self, source_stool, destination_stool):
+        """ Check and make the move, holding at least the locks of its two
+        stools, record it and notify the listeners.
+
+        @type self: ConcurrentTOAHModel
+        @type source_stool: int
+        @type destination_stool: int
+        @rtype: None
+        """
+        source, destination = self._check_move(source_stool,
+                                               destination_stool)
+        destination.add_cheese_to_end(source.remove_top_cheese())
+        if destination_stool % self._number_of_stools == \
+                self._number_of_stools - 1 or \
+                source_stool % self._number_of_stools == \
+                self._number_of_stools - 1:
+            self._update_solved()
+        self._moved(source_stool, destination_stool)
+        with self._history_lock:
+            self._redo_moves = []
+            self._move_seq.add_move(source_stool, destination_stool)
+            for listener in self._listeners:
+                listener.on_move(self, source_stool, destination_stool)
+
+    def add_listener(self, listener):
+        """ Add listener as TOAHModel.add_listener, holding every lock.
+
+        @type self: ConcurrentTOAHModel
+        @type listener: MoveListener
+        @rtype: None
+        """
+        with self._all_locks():
+            super().add_listener(listener)
+
+    def remove_listener(self, listener):
+        """ Remove listener as TOAHModel.remove_listener, holding every
+        lock.
+
+        @type self: ConcurrentTOAHModel
+        @type listener: MoveListener
+        @rtype: None
+        """
+        with self._all_locks():
+            super().remove_listener(listener)
+
+    def _record_snapshot(self):
+        """ Keep no snapshots.
+
+        @type self: ConcurrentTOAHModel
+        @rtype: None
+        """
+        pass
+
+    def add(self, cheese, stool_number):
+        """ Stack cheese on stool_number as TOAHModel.add, holding every
+        lock.
+
+        @type self: ConcurrentTOAHModel
+        @type cheese: Cheese
+        @type stool_number: int
+        @rtype: None
+        """
+        with self._all_locks():
+            super().add(cheese, stool_number)
+
+    def undo(self):
+        """ Take back the last move, holding every lock.
+
+        @type self: ConcurrentTOAHModel
+        @rtype: None
+        """
+        with self._all_locks():
+            super().undo()
+
+    def redo(self):
+        """ Replay the last move taken back, holding every lock.
+
+        @type self: ConcurrentTOAHModel
+        @rtype: None
+        """
+        with self._all_locks():
+            super().redo()
+
+    def go_to_move(self, index):
+        """ Undo or redo moves until index moves have been made, holding
+        every lock.
+
+        @type self: ConcurrentTOAHModel
+        @type index: int
+        @rtype: None
+        """
+        with self._all_locks():
+            super().go_to_move(index)
+
+    def set_state(self, state):
+        """ Rearrange the cheeses as in state, holding every lock.
+
+        @type self: ConcurrentTOAHModel
+        @type state: tuple[int]
+        @rtype: None
+        """
+        with self._all_locks():
+            super().set_state(state)
+
+    def clear_history(self):
+        """ Forget the moves made so far, holding every lock.
+
+        @type self: ConcurrentTOAHModel
+        @rtype: None
+        """
+        with self._all_locks():
+            super().clear_history()
+
+    def get_state(self):
+        """ Return the stool of every cheese, from the smallest to the
+        largest, at one instant, holding every lock.
+
+        @type self: ConcurrentTOAHModel
+        @rtype: tuple[int]
+        """
+        with self._all_locks():
+            return super().get_state()
+
+    def __str__(self):
+        """ Depict the stools and cheeses at one instant, holding every
+        lock.
+
+        @type self: ConcurrentTOAHModel
+        @rtype: str
+        """
+        with self._all_locks():
+            return super().__str__()
+
+
+class SharedBoard:
+    """ The cheeses of a game in shared memory, which several processes
+    can move at once.
+
+    The game is the only slot of a shared_model.SharedPositions, moved
+    with shared_model.move_cheese under one lock per stool, starting with
+    every cheese on the first stool. A SharedBoard passed to a
+    multiprocessing.Process works on the same memory and locks there.
+    Each call only holds a view of the memory while it runs, so a board
+    can be closed, or dropped at exit, at any time.
+
+    === Attributes ===
+    @param int number_of_stools: stools in the game
+    @param int number_of_cheeses: cheeses in the game
+
+    === Private Attributes ===
+    @param SharedPositions _positions:
+        the shared memory holding the game
+    @param range _stools:
+        the stool indices, as for move_cheese
+    @param list[multiprocessing.Lock] _locks:
+        lock of each stool
+    """
+
+    def __init__(self, number_of_stools, number_of_cheeses):
+        """ Create a new SharedBoard with every cheese on the first stool.
+
+        @type self: SharedBoard
+        @type number_of_stools: int
+        @type number_of_cheeses: int
+        @rtype: None
+        """
+        import multiprocessing
+        self.number_of_stools = number_of_stools
+        self.number_of_cheeses = number_of_cheeses
+        self._positions = SharedPositions(number_of_stools, number_of_cheeses)
+        self._stools = range(number_of_stools)
+        self._locks = [multiprocessing.Lock()
+                       for _ in range(number_of_stools)]
+
+    def __getstate__(self):
+        """ Return the state to pickle, which attaches to the same memory
+        without owning it.
+
+        @type self: SharedBoard
+        @rtype: dict
+        """
+        return {'handle': self._positions.handle(), 'locks': self._locks}
+
+    def __setstate__(self, state):
+        """ Attach to the memory of the pickled SharedBoard.
+
+        @type self: SharedBoard
+        @type state: dict
+        @rtype: None
+        """
+        self._positions = SharedPositions(*state['handle'])
+        self.number_of_stools = self._positions.number_of_stools
+        self.number_of_cheeses = self._positions.number_of_cheeses
+        self._stools = range(self.number_of_stools)
+        self._locks = state['locks']
+
+    def move(self, source_stool, destination_stool):
+        """ Move the top cheese of source_stool onto destination_stool.
+
+        Raises IllegalMoveError as TOAHModel.move if the move is not
+        valid.
+
+        @type self: SharedBoard
+        @type source_stool: int
+        @type destination_stool: int
+        @rtype: None
+
+        >>> board = SharedBoard(3, 2)
+        >>> board.move(0, 2)
+        >>> try:
+        ...     board.move(0, 2)
+        ... except IllegalMoveError as e:
+        ...     print(e)
+        Cant move the cheese there!
+        >>> board.get_state()
+        (2, 0)
+        >>> board.close()
+        """
+        locks = [self._locks[source_stool], self._locks[destination_stool]]
+        if source_stool % self.number_of_stools > \
+                destination_stool % self.number_of_stools:
+            locks.reverse()
+        elif locks[0] is locks[1]:
+            del locks[1]
+        for lock in locks:
+            lock.acquire()
+        try:
+            with self._positions.buffer(0) as state:
+                move_cheese(state, self._stools, source_stool,
+                            destination_stool)
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+
+    def get_state(self):
+        """ Return the stool of every cheese, from the smallest to the
+        largest. Moves made meanwhile by other processes may or may not
+        show.
+
+        @type self: SharedBoard
+        @rtype: tuple[int]
+        """
+        with self._positions.buffer(0) as state:
+            return tuple(state)
+
+    def close(self):
+        """ Stop using the shared memory, freeing it if this process
+        created it.
+
+        @type self: SharedBoard
+        @rtype: None
+        """
+        self._positions.close()
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod(verbose=True)
@@ -1,10 +1,31 @@
 """
 ConsoleController: User interface for manually solving
 Anne Hoy's problems from the console.
+
+Besides the interactive game, a whole move script can be replayed in one
+go with
+
+    python3 console_controller.py --script FILE [--every K]
+
+where FILE (or - for stdin) holds one "origin destination" pair of stool
+numbers per line, as typed in the game, or u / r to undo / redo. Lines
+starting with # are comments, except for an optional header line
+"# toah stools=K cheeses=N" giving the game to play. A script with a
+header can also be scrubbed through move by move with
+
+    python3 console_controller.py --replay FILE
+
+python_ta only checks this file after an interactive game when --lint is
+given, so that it is not imported otherwise.
 """
 
+import sys
+
+from distance_oracle import DistanceOracle
 from toah_model import TOAHModel, IllegalMoveError
 
+SCRIPT_HEADER = '# toah'
+
 
 def move(model, origin, dest):
     """ Apply move from origin to destination in model.
@@ -21,12 +42,66 @@ def move(model, origin, dest):
     """
     try:
         model.move(origin, dest)
-    except IllegalMoveError:
+    except IllegalMoveError as e:
+        print("\n" + str(e))
         print("You have entered an illegal move.")
 
 
+def undo_or_redo(model, command):
+    """ Take back the last move in model if command is 'u', or replay the
+    last move taken back if command is 'r'.
+
+    @param TOAHModel model:
+        model to modify
+    @param str command:
+        'u' to undo or 'r' to redo
+    @rtype: None
+
+    >>> M = TOAHModel(3)
+    >>> M.fill_first_stool(2)
+    >>> undo_or_redo(M, 'u')
+    <BLANKLINE>
+    There is no move to undo!
+    """
+    try:
+        if command == 'u':
+            model.undo()
+        else:
+            model.redo()
+    except IllegalMoveError as e:
+        print("\n" + str(e))
+
+
+def parse_stool(text, number_of_stools):
+    """ Return the index (from 0) of the stool numbered (from 1) by text.
+
+    Raises ValueError with a message for the player if text is not a
+    valid stool number.
+
+    @param str text:
+        stool number typed by the player
+    @param int number_of_stools:
+    @rtype: int
+
+    >>> parse_stool('2', 3)
+    1
+    >>> parse_stool('4', 3)
+    Traceback (most recent call last):
+    ...
+    ValueError: Stool index out of range!
+    """
+    stool_selection = int(text)
+    if stool_selection > number_of_stools or stool_selection < 1:
+        raise ValueError('Stool index out of range!')
+    return stool_selection - 1
+
+
 class ConsoleController:
     """ Controller for text console.
+
+    === Attributes ===
+    @param DistanceOracle|None oracle:
+        moves left to win if played optimally, for games on three stools
     """
 
     def __init__(self, number_of_cheeses, number_of_stools):
@@ -41,6 +116,36 @@ class ConsoleController:
         self.tm.fill_first_stool(number_of_cheeses)
         self.number_of_stools = number_of_stools
         self.number_of_cheeses = number_of_cheeses
+        self.oracle = None
+        if number_of_stools == 3:
+            self.oracle = DistanceOracle()
+            self.oracle.attach(self.tm)
+
+    def show_progress(self, optimal=None):
+        """ Print how many moves are left to win if played optimally, and
+        whether the last move was optimal if optimal is not None.
+
+        Nothing is printed unless the game is on three stools.
+
+        @param ConsoleController self:
+        @param bool|None optimal:
+        @rtype: None
+
+        >>> CC = ConsoleController(3, 3)
+        >>> CC.show_progress()
+        Moves left if played optimally: 7
+        >>> CC.tm.move(0, 2)
+        >>> CC.show_progress(True)
+        Optimal move! Moves left if played optimally: 6
+        """
+        if self.oracle is None:
+            return
+        text = 'Moves left if played optimally: {}'.format(
+            self.oracle.distance())
+        if optimal is not None:
+            text = ('Optimal move! ' if optimal else 'Not an optimal move. ') \
+                + text
+        print(text)
 
     def choose_valid_stool(self, stool_type):
         """ Prompts the user to enter a valid stool selection.
@@ -53,18 +158,59 @@ class ConsoleController:
         @rtype: int
         """
         while True:
+            text = input('Type in a valid ' + stool_type + ' stool: \n')
             try:
-                stool_selection = int(input('Type in a valid ' + stool_type +
-                                            ' stool: \n'))
+                int(text)
             except ValueError:
                 print('That is not a valid ' + stool_type + ' stool!')
                 continue
-            else:
-                if stool_selection > self.number_of_stools \
-                        or stool_selection < 1:
-                    print('Stool index out of range!')
+            try:
+                return parse_stool(text, self.number_of_stools)
+            except ValueError as e:
+                print(e)
+
+    def run_script(self, moves, every=0):
+        """ Apply moves, as returned by parse_move_script, to the game
+        without prompting, and print a summary at the end.
+
+        Illegal moves, undos and redos are counted and skipped, as in the
+        interactive game. The board is only printed every `every` moves
+        if every is positive.
+
+        @param ConsoleController self:
+        @param list[tuple[int] | str] moves:
+        @param int every:
+        @rtype: dict[str, int | bool]
+
+        >>> CC = ConsoleController(2, 3)
+        >>> summary = CC.run_script([(0, 1), (0, 0), (0, 2), (1, 2)])
+        Applied 3 moves (1 illegal), 3 moves made, game won.
+        >>> summary['illegal']
+        1
+        """
+        model = self.tm
+        illegal = 0
+        applied = 0
+        for item in moves:
+            try:
+                if item == 'u':
+                    model.undo()
+                elif item == 'r':
+                    model.redo()
                 else:
-                    return stool_selection - 1
+                    model.move(item[0], item[1])
+            except IllegalMoveError:
+                illegal += 1
+                continue
+            applied += 1
+            if every > 0 and applied % every == 0:
+                print(model)
+        won = model.is_solved()
+        print('Applied {} moves ({} illegal), {} moves made, {}.'.format(
+            applied, illegal, model.number_of_moves(),
+            'game won' if won else 'game not won'))
+        return {'applied': applied, 'illegal': illegal,
+                'moves': model.number_of_moves(), 'won': won}
 
     def play_loop(self):
         """ Play Console-based game.
@@ -87,25 +233,134 @@ class ConsoleController:
         """
         playing = True
         print(self.tm)
+        self.show_progress()
         while playing:
             origin_stool = self.choose_valid_stool('origin')
             destination_stool = self.choose_valid_stool('destination')
+            optimal = self.oracle is not None and \
+                self.oracle.is_optimal_move(origin_stool, destination_stool)
+            moves_made = self.tm.number_of_moves()
             move(self.tm, origin_stool, destination_stool)
             print(self.tm)
-            if len(self.tm.get_stool_list()[-1]) == self.number_of_cheeses:
+            if self.tm.number_of_moves() != moves_made:
+                self.show_progress(optimal)
+            if self.tm.is_solved():
                 print('\nYou have won the game!')
                 print('Your total move count is: ' +
                       str(self.tm.get_move_seq().length()))
                 print('The game will now exit.')
                 playing = False
             else:
-                keep_playing = input("\nPress enter to "
-                                     "continue or type e to exit: \n")
+                keep_playing = input("\nPress enter to continue, u to undo, "
+                                     "r to redo or type e to exit: \n")
+                while keep_playing in ('u', 'r'):
+                    undo_or_redo(self.tm, keep_playing)
+                    print(self.tm)
+                    self.show_progress()
+                    keep_playing = input("\nPress enter to continue, u to "
+                                         "undo, r to redo or type e to "
+                                         "exit: \n")
                 if keep_playing == 'e':
                     print("The game will now exit.")
                     playing = False
 
 
+def replay_loop(cursor):
+    """ Let the user scrub through a recorded game from the console.
+
+    @param ReplayCursor cursor:
+        cursor over the recorded game
+    @rtype: None
+    """
+    while True:
+        print(cursor.get_model())
+        print('Move {} of {}'.format(cursor.position(), cursor.length()))
+        command = input("\nPress enter for the next move, type b to go "
+                        "back, a move number to jump to or e to exit: \n")
+        if command == 'e':
+            return
+        try:
+            if command == '':
+                cursor.step()
+            elif command == 'b':
+                cursor.back()
+            else:
+                cursor.seek(int(command))
+        except (ValueError, IndexError):
+            print('That is not a valid move number!')
+
+
+def read_script_header(text):
+    """ Return the (number_of_stools, number_of_cheeses) given by the
+    header of a move script, or None if it has no header.
+
+    @param str text:
+        the move script
+    @rtype: tuple[int] | None
+
+    >>> read_script_header('# toah stools=4 cheeses=5\\n1 2\\n')
+    (4, 5)
+    >>> read_script_header('1 2\\n') is None
+    True
+    """
+    if not text.startswith(SCRIPT_HEADER):
+        return None
+    fields = dict(field.split('=', 1) for field in
+                  text.split('\n', 1)[0][len(SCRIPT_HEADER):].split())
+    return int(fields['stools']), int(fields['cheeses'])
+
+
+def parse_move_script(text, number_of_stools):
+    """ Return the moves of a move script, in a single pass.
+
+    Each move is a pair of stool indices (from 0), or 'u' or 'r' for an
+    undo or a redo. Raises ValueError naming the first bad line.
+
+    @param str text:
+        the move script
+    @param int number_of_stools:
+    @rtype: list[tuple[int] | str]
+
+    >>> parse_move_script('# a game\\n1 3\\n\\nu\\n', 3)
+    [(0, 2), 'u']
+    >>> parse_move_script('1 4', 3)
+    Traceback (most recent call last):
+    ...
+    ValueError: line 1: Stool index out of range!
+    """
+    return list(parse_script_lines(text.splitlines(), number_of_stools))
+
+
+def parse_script_lines(lines, number_of_stools):
+    """ Generate the moves of the lines of a move script, as
+    parse_move_script, reading one line at a time.
+
+    @param iterable[str] lines:
+        the lines of the move script
+    @param int number_of_stools:
+    @rtype: generator[tuple[int] | str]
+
+    >>> list(parse_script_lines(['2 1\\n', 'r\\n'], 2))
+    [(1, 0), 'r']
+    """
+    line_number = 0
+    for line in lines:
+        line_number += 1
+        words = line.split()
+        if not words or words[0].startswith('#'):
+            continue
+        try:
+            if len(words) == 1 and words[0] in ('u', 'r'):
+                yield words[0]
+            elif len(words) == 2:
+                yield (parse_stool(words[0], number_of_stools),
+                       parse_stool(words[1], number_of_stools))
+            else:
+                raise ValueError('expected two stool numbers')
+        except ValueError as e:
+            raise ValueError('line {}: {}'.format(line_number, e))
+
+
 def prompt_number(item):
     """ Prompts the user to input a valid integer
     greater than 0 to be used for the inputed item.
@@ -127,6 +382,69 @@ def prompt_number(item):
                 print('You have inputed an invalid number!')
 
 
+def run_script_file(path, number_of_stools=None, number_of_cheeses=None,
+                    every=0):
+    """ Replay the move script at path (or stdin if path is '-') in a
+    new game, reading the whole script at once.
+
+    The game is given by the script header, unless number_of_stools and
+    number_of_cheeses are given.
+
+    @param str path:
+    @param int|None number_of_stools:
+    @param int|None number_of_cheeses:
+    @param int every:
+    @rtype: dict[str, int | bool]
+    """
+    if path == '-':
+        text = sys.stdin.read()
+    else:
+        with open(path) as script:
+            text = script.read()
+    if number_of_stools is None or number_of_cheeses is None:
+        header = read_script_header(text)
+        if header is None:
+            raise ValueError('the script has no "# toah stools=K cheeses=N"'
+                             ' header')
+        number_of_stools, number_of_cheeses = header
+    controller = ConsoleController(number_of_cheeses, number_of_stools)
+    return controller.run_script(parse_move_script(text, number_of_stools),
+                                 every)
+
+
+if __name__ == '__main__' and '--script' in sys.argv:
+    import argparse
+    PARSER = argparse.ArgumentParser(description='Replay a move script.')
+    PARSER.add_argument('--script', required=True,
+                        help='move script to replay, or - for stdin')
+    PARSER.add_argument('--stools', type=int)
+    PARSER.add_argument('--cheeses', type=int)
+    PARSER.add_argument('--every', type=int, default=0,
+                        help='print the board every EVERY moves')
+    ARGS = PARSER.parse_args()
+    try:
+        SUMMARY = run_script_file(ARGS.script, ARGS.stools, ARGS.cheeses,
+                                  ARGS.every)
+    except (OSError, ValueError) as e:
+        sys.exit(str(e))
+    sys.exit(0 if SUMMARY['won'] else 1)
+
+if __name__ == '__main__' and '--replay' in sys.argv:
+    import argparse
+    from replay import read_replay
+    PARSER = argparse.ArgumentParser(
+        description='Scrub through a recorded game.')
+    PARSER.add_argument('--replay', required=True,
+                        help='move script of the game to replay')
+    ARGS = PARSER.parse_args()
+    try:
+        with open(ARGS.replay) as SCRIPT:
+            CURSOR = read_replay(SCRIPT.read())
+    except (OSError, ValueError, IllegalMoveError) as e:
+        sys.exit(str(e))
+    replay_loop(CURSOR)
+    sys.exit(0)
+
 if __name__ == '__main__':
     INSTRUCTIONS0 = "The goal of this game is to move the entire stack of "\
                     "cheese rounds from the first stool to the last stool."
@@ -142,7 +460,9 @@ if __name__ == '__main__':
     INSTRUCTIONS4 = "Each stool choice must be a valid natural number between "\
                     "1 and the total number of stools in the game."
     INSTRUCTIONS5 = "At the end of each move, you will be given the option to "\
-                    "exit the game by simply typing e."
+                    "exit the game by simply typing e, to take back the last "\
+                    "move by typing u, or to replay a move taken back by "\
+                    "typing r."
     INSTRUCTIONS6 = "Good luck and have fun!"
     print("Hello, welcome to the Tower of Anne Horton!"
           "\nPlease select one of the following numbers below.")
@@ -189,5 +509,6 @@ if __name__ == '__main__':
     elif MENU == 3:
         print('\nThe game will now exit.')
 
-    import python_ta
-    python_ta.check_all(config="consolecontroller_pyta.txt")
+    if '--lint' in sys.argv:
+        import python_ta
+        python_ta.check_all(config="consolecontroller_pyta.txt")
@@ -0,0 +1,234 @@
+"""
+Contention benchmark for concurrent_model: workers all make random moves
+on one board, and the legal moves per second are reported for 1 up to
+--workers threads sharing a ConcurrentTOAHModel (and, for comparison, a
+TOAHModel behind a single lock) and processes sharing a SharedBoard.
+
+    python3 contention_benchmark.py --stools 8 --cheeses 8 --workers 4
+
+Every worker tallies the cheeses it moved onto and off each stool, and
+each run fails unless the final board agrees with the tallies. Thread
+runs also replay the move history of the model to check that it leads to
+the final board.
+
+Under a Python with a global interpreter lock, threads only show the
+overhead of the locks, not a speedup; processes scale with the cores.
+"""
+
+import argparse
+import random
+import sys
+import threading
+import time
+
+from concurrent_model import ConcurrentTOAHModel, SharedBoard
+from toah_model import TOAHModel, IllegalMoveError
+
+
+def random_moves(number_of_stools, count, seed):
+    """ Return count random (source, destination) pairs of stools, legal
+    or not.
+
+    @type number_of_stools: int
+    @type count: int
+    @type seed: int
+    @rtype: list[tuple[int]]
+
+    >>> len(random_moves(4, 10, 0))
+    10
+    """
+    rng = random.Random(seed)
+    return [(rng.randrange(number_of_stools), rng.randrange(number_of_stools))
+            for _ in range(count)]
+
+
+def play(move, moves, number_of_stools):
+    """ Try each of moves with the function move and return the number of
+    legal ones and the net number of cheeses they put on each stool.
+
+    @type move: function
+    @type moves: list[tuple[int]]
+    @type number_of_stools: int
+    @rtype: tuple[int, list[int]]
+
+    >>> M = TOAHModel(3)
+    >>> M.fill_first_stool(2)
+    >>> play(M.move, [(0, 1), (0, 1), (0, 2)], 3)
+    (2, [-2, 1, 1])
+    """
+    made = 0
+    flows = [0] * number_of_stools
+    for source, destination in moves:
+        try:
+            move(source, destination)
+        except IllegalMoveError:
+            continue
+        made += 1
+        flows[source] -= 1
+        flows[destination] += 1
+    return made, flows
+
+
+def _locked(move, lock):
+    """ Return move made under lock.
+
+    @type move: function
+    @type lock: threading.Lock
+    @rtype: function
+    """
+    def locked_move(source, destination):
+        with lock:
+            move(source, destination)
+    return locked_move
+
+
+def _check(state, number_of_stools, flows):
+    """ Raise AssertionError unless the stools of state hold as many
+    cheeses as the start, all on the first stool, plus flows.
+
+    @type state: tuple[int]
+    @type number_of_stools: int
+    @type flows: list[int]
+    @rtype: None
+    """
+    counts = [0] * number_of_stools
+    for stool in state:
+        counts[stool] += 1
+    flows[0] += len(state)
+    if counts != flows:
+        raise AssertionError('board {} disagrees with the moves made {}'
+                             .format(counts, flows))
+
+
+def bench_threads(number_of_stools, number_of_cheeses, workers, attempts,
+                  coarse=False):
+    """ Return the legal moves made and seconds taken by workers threads
+    each trying attempts random moves on a shared ConcurrentTOAHModel,
+    or a TOAHModel behind one lock if coarse.
+
+    @type number_of_stools: int
+    @type number_of_cheeses: int
+    @type workers: int
+    @type attempts: int
+    @type coarse: bool
+    @rtype: tuple[int, float]
+
+    >>> bench_threads(4, 3, 2, 100)[0] > 0
+    True
+    """
+    model = TOAHModel(number_of_stools) if coarse \
+        else ConcurrentTOAHModel(number_of_stools)
+    model.fill_first_stool(number_of_cheeses)
+    move = _locked(model.move, threading.Lock()) if coarse else model.move
+    results = []
+    threads = [threading.Thread(target=lambda moves: results.append(
+        play(move, moves, number_of_stools)), args=(
+            random_moves(number_of_stools, attempts, seed),))
+        for seed in range(workers)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    flows = [sum(stool) for stool in zip(*[flow for _, flow in results])]
+    _check(model.get_state(), number_of_stools, flows)
+    replayed = TOAHModel(number_of_stools)
+    replayed.fill_first_stool(number_of_cheeses)
+    move_seq = model.get_move_seq()
+    for i in range(move_seq.length()):
+        replayed.move(*move_seq.get_move(i))
+    if replayed.get_state() != model.get_state():
+        raise AssertionError('move history does not lead to the board')
+    return sum(made for made, _ in results), elapsed
+
+
+def _process_worker(board, moves, results, ready, done):
+    """ Try moves on board and put the results of play on results, waiting
+    on the barrier ready before the first move and on done after the last.
+
+    @type board: SharedBoard
+    @type moves: list[tuple[int]]
+    @type results: multiprocessing.Queue
+    @type ready: multiprocessing.Barrier
+    @type done: multiprocessing.Barrier
+    @rtype: None
+    """
+    ready.wait()
+    result = play(board.move, moves, board.number_of_stools)
+    done.wait()
+    results.put(result)
+
+
+def bench_processes(number_of_stools, number_of_cheeses, workers, attempts):
+    """ Return the legal moves made and seconds taken by workers processes
+    each trying attempts random moves on a shared SharedBoard.
+
+    Only the moves are timed, from when every process is ready to move
+    until they have all finished, not starting and joining the processes.
+
+    @type number_of_stools: int
+    @type number_of_cheeses: int
+    @type workers: int
+    @type attempts: int
+    @rtype: tuple[int, float]
+    """
+    import multiprocessing
+    board = SharedBoard(number_of_stools, number_of_cheeses)
+    try:
+        results = multiprocessing.Queue()
+        ready = multiprocessing.Barrier(workers + 1)
+        done = multiprocessing.Barrier(workers + 1)
+        processes = [multiprocessing.Process(
+            target=_process_worker,
+            args=(board, random_moves(number_of_stools, attempts, seed),
+                  results, ready, done)) for seed in range(workers)]
+        for process in processes:
+            process.start()
+        ready.wait()
+        start = time.perf_counter()
+        done.wait()
+        elapsed = time.perf_counter() - start
+        parts = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+        flows = [sum(stool) for stool in zip(*[flow for _, flow in parts])]
+        _check(board.get_state(), number_of_stools, flows)
+    finally:
+        board.close()
+    return sum(made for made, _ in parts), elapsed
+
+
+def main(argv=None):
+    """ Run the contention benchmark and return its exit status.
+
+    @type argv: list[str] | None
+    @rtype: int
+    """
+    parser = argparse.ArgumentParser(
+        description='Benchmark concurrent moves on one board.')
+    parser.add_argument('--stools', type=int, default=8)
+    parser.add_argument('--cheeses', type=int, default=8)
+    parser.add_argument('--workers', type=int, default=4,
+                        help='most threads and processes to run')
+    parser.add_argument('--attempts', type=int, default=100000,
+                        help='random moves tried by each worker')
+    args = parser.parse_args(argv)
+    if args.stools < 2 or args.cheeses < 1 or args.workers < 1:
+        parser.error('need at least 2 stools, 1 cheese and 1 worker')
+    runs = [('threads', lambda n: bench_threads(
+                args.stools, args.cheeses, n, args.attempts)),
+            ('threads, one lock', lambda n: bench_threads(
+                args.stools, args.cheeses, n, args.attempts, coarse=True)),
+            ('processes', lambda n: bench_processes(
+                args.stools, args.cheeses, n, args.attempts))]
+    for name, run in runs:
+        for workers in range(1, args.workers + 1):
+            made, elapsed = run(workers)
+            print('{:<18} {:>3}: {:>9} moves in {:6.2f}s, {:>9.0f} moves/s'
+                  .format(name, workers, made, elapsed, made / elapsed))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
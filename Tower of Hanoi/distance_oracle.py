@@ -0,0 +1,211 @@
+"""
+DistanceOracle: MoveListener keeping the number of moves left to win a
+three stool TOAHModel if played optimally.
+
+On three stools the distance from any legal position to the tower on a
+goal stool follows from the classic recurrence, going from the largest
+cheese to the smallest: a cheese already on its target stool costs
+nothing and leaves the target of the next smaller cheese unchanged,
+while a cheese elsewhere costs 2 ** i moves (i counted from 0 for the
+smallest) and sends the smaller cheeses to the third stool.
+
+Only the targets of the moved cheese and of smaller cheeses can change
+after a move, and the update stops at the first target that does not,
+so following a game move by move costs O(1) amortized.
+"""
+
+from toah_model import MoveListener
+
+
+class DistanceOracle(MoveListener):
+    """ MoveListener answering how far a three stool TOAHModel is from
+    having every cheese on its goal stool.
+
+    === Private Attributes ===
+    @param TOAHModel|None _model:
+        the model followed, once attached
+    @param int _goal:
+        stool every cheese should end up on, or -1 for the last stool
+    @param list[int] _state:
+        stool of each cheese, from the smallest to the largest
+    @param list[int] _targets:
+        stool each cheese should be moved to next on an optimal path
+    @param dict[int, int] _index:
+        index in _state of the cheese of each size
+    @param int _distance:
+        moves left if played optimally
+    """
+
+    def __init__(self, goal=-1):
+        """ Create a new DistanceOracle for reaching goal, which is not
+        yet following a model.
+
+        @type self: DistanceOracle
+        @type goal: int
+        @rtype: None
+        """
+        self._model = None
+        self._goal = goal
+        self._state = []
+        self._targets = []
+        self._index = {}
+        self._distance = 0
+
+    def attach(self, model):
+        """ Follow the moves of model from now on.
+
+        Raises ValueError unless model has three stools.
+
+        @type self: DistanceOracle
+        @type model: TOAHModel
+        @rtype: None
+        """
+        if model.get_number_of_stools() != 3:
+            raise ValueError("distances are only known for 3 stools")
+        self._model = model
+        self.on_reset(model)
+        model.add_listener(self)
+
+    def distance(self):
+        """ Return the number of moves left to win if played optimally.
+
+        @type self: DistanceOracle
+        @rtype: int
+
+        >>> from toah_model import TOAHModel
+        >>> M = TOAHModel(3)
+        >>> M.fill_first_stool(4)
+        >>> oracle = DistanceOracle()
+        >>> oracle.attach(M)
+        >>> oracle.distance()
+        15
+        >>> M.move(0, 1)
+        >>> oracle.distance()
+        14
+        >>> M.undo()
+        >>> oracle.distance()
+        15
+        """
+        return self._distance
+
+    def is_optimal_move(self, source_stool, destination_stool):
+        """ Return whether moving the top cheese of source_stool onto
+        destination_stool is legal and on an optimal path to the goal.
+
+        @type self: DistanceOracle
+        @type source_stool: int
+        @type destination_stool: int
+        @rtype: bool
+
+        >>> from toah_model import TOAHModel
+        >>> M = TOAHModel(3)
+        >>> M.fill_first_stool(2)
+        >>> oracle = DistanceOracle()
+        >>> oracle.attach(M)
+        >>> oracle.is_optimal_move(0, 1), oracle.is_optimal_move(0, 2)
+        (True, False)
+        >>> oracle.is_optimal_move(1, 2)
+        False
+        """
+        cheese = self._model.get_top_cheese(source_stool)
+        if cheese is None or source_stool == destination_stool:
+            return False
+        top = self._model.get_top_cheese(destination_stool)
+        if top is not None and top.size <= cheese.size:
+            return False
+        return self._targets[self._index[cheese.size]] == destination_stool
+
+    def on_move(self, model, source_stool, destination_stool):
+        """ Update the distance after a move (or redo) in model.
+
+        @type self: DistanceOracle
+        @type model: TOAHModel
+        @type source_stool: int
+        @type destination_stool: int
+        @rtype: None
+        """
+        self._place(self._index[model.get_top_cheese(destination_stool).size],
+                    destination_stool)
+
+    def on_undo(self, model, source_stool, destination_stool):
+        """ Update the distance after a move was taken back in model.
+
+        @type self: DistanceOracle
+        @type model: TOAHModel
+        @type source_stool: int
+        @type destination_stool: int
+        @rtype: None
+        """
+        self._place(self._index[model.get_top_cheese(source_stool).size],
+                    source_stool)
+
+    def on_reset(self, model):
+        """ Recompute the distance of model from scratch, in O(n).
+
+        @type self: DistanceOracle
+        @type model: TOAHModel
+        @rtype: None
+        """
+        sizes = []
+        for stool in model.get_stool_list():
+            sizes.extend(cheese.size for cheese in stool.get_cheese_stack())
+        sizes.sort()
+        self._index = {sizes[i]: i for i in range(len(sizes))}
+        self._state = list(model.get_state())
+        self._targets = [0] * len(self._state)
+        self._distance = 0
+        target = self._goal % model.get_number_of_stools()
+        for index in range(len(self._state) - 1, -1, -1):
+            self._targets[index] = target
+            if self._state[index] != target:
+                self._distance += 1 << index
+                target = 3 - self._state[index] - target
+
+    def _place(self, index, stool):
+        """ Record that cheese index is now on stool and update the
+        distance.
+
+        The target of cheese index itself only depends on larger cheeses,
+        which have not moved.
+
+        @type self: DistanceOracle
+        @type index: int
+        @type stool: int
+        @rtype: None
+        """
+        if self._state[index] != self._targets[index]:
+            self._distance -= 1 << index
+        self._state[index] = stool
+        self._retarget(index)
+
+    def _retarget(self, index):
+        """ Update the distance for cheese index being on its stool, and
+        the targets of the smaller cheeses, stopping at the first target
+        that does not change.
+
+        @type self: DistanceOracle
+        @type index: int
+        @rtype: None
+        """
+        state = self._state
+        targets = self._targets
+        if state[index] != targets[index]:
+            self._distance += 1 << index
+        while index > 0:
+            if state[index] == targets[index]:
+                target = targets[index]
+            else:
+                target = 3 - state[index] - targets[index]
+            index -= 1
+            if targets[index] == target:
+                return
+            if state[index] != targets[index]:
+                self._distance -= 1 << index
+            targets[index] = target
+            if state[index] != target:
+                self._distance += 1 << index
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod(verbose=True)
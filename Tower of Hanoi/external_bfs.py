@@ -0,0 +1,386 @@
+"""
+External-memory breadth first search of the state graph of a Tour of Anne
+Hoy game, for state spaces larger than RAM.
+
+States are encoded as in state_explorer. Each frontier is a file of
+sorted, distinct state codes, each a fixed number of big-endian bytes.
+Expanding a frontier fills an in-memory buffer of neighbours up to the
+memory budget, then sorts it and writes it out as a run file. The runs are
+merged in a streaming k-way merge that drops duplicates and, since the
+graph is undirected, the states of the previous and current frontiers,
+which leaves exactly the next frontier. Every file is read and written in
+chunks, and the chunk size and the number of runs merged at once are
+chosen so that the chunks of every file open during a merge fit in the
+budget too, so memory stays within it whatever the number of states.
+
+    python3 external_bfs.py --stools 4 --cheeses 18 --memory-mb 512 \\
+        --work-dir /var/tmp
+"""
+
+import heapq
+import os
+import sys
+
+from state_explorer import encode_state, neighbours
+
+DEFAULT_MEMORY_BUDGET = 256 * 1024 * 1024
+# Rough bytes of memory per buffered state: the int and its list slot.
+BYTES_PER_STATE = 48
+# Most run files merged at once; more runs are merged in several passes.
+MAX_FAN_IN = 64
+# Bounds of the bytes read or written at once per file, within the budget.
+IO_CHUNK = 1024 * 1024
+MIN_IO_CHUNK = 4096
+
+
+def _read_codes(path, width, chunk_size=IO_CHUNK):
+    """ Generate the state codes of the file at path, reading it in chunks
+    of chunk_size bytes, a multiple of width.
+
+    @type path: str
+    @type width: int
+        bytes per state code
+    @type chunk_size: int
+    @rtype: generator[int]
+    """
+    with open(path, 'rb') as codes:
+        while True:
+            chunk = codes.read(chunk_size)
+            if not chunk:
+                return
+            for i in range(0, len(chunk), width):
+                yield int.from_bytes(chunk[i:i + width], 'big')
+
+
+def _last_code(path, width):
+    """ Return the last state code of the non-empty file at path, which
+    is the largest one if the file is sorted.
+
+    @type path: str
+    @type width: int
+    @rtype: int
+    """
+    with open(path, 'rb') as codes:
+        codes.seek(-width, os.SEEK_END)
+        return int.from_bytes(codes.read(width), 'big')
+
+
+def _write_codes(path, codes, width, chunk_size=IO_CHUNK):
+    """ Write codes to the file at path in chunks of about chunk_size
+    bytes and return how many there were.
+
+    @type path: str
+    @type codes: iterable[int]
+    @type width: int
+    @type chunk_size: int
+    @rtype: int
+    """
+    count = 0
+    buffer = bytearray()
+    with open(path, 'wb') as output:
+        for code in codes:
+            buffer += code.to_bytes(width, 'big')
+            count += 1
+            if len(buffer) >= chunk_size:
+                output.write(buffer)
+                buffer = bytearray()
+        output.write(buffer)
+    return count
+
+
+def _unique(codes):
+    """ Generate the sorted codes without repeats.
+
+    @type codes: iterable[int]
+    @rtype: generator[int]
+
+    >>> list(_unique([1, 1, 2, 3, 3]))
+    [1, 2, 3]
+    """
+    last = None
+    for code in codes:
+        if code != last:
+            yield code
+            last = code
+
+
+def _subtract(codes, excluded):
+    """ Generate the sorted codes that are not in the sorted excluded.
+
+    @type codes: iterable[int]
+    @type excluded: iterable[int]
+    @rtype: generator[int]
+
+    >>> list(_subtract([1, 2, 4, 6], [2, 3, 6]))
+    [1, 4]
+    """
+    excluded = iter(excluded)
+    other = next(excluded, None)
+    for code in codes:
+        while other is not None and other < code:
+            other = next(excluded, None)
+        if code != other:
+            yield code
+
+
+class ExternalBFS:
+    """ Breadth first search of a state graph keeping its frontiers in
+    sorted files under a work directory.
+
+    === Attributes ===
+    @param int number_of_stools: stools in the game
+    @param int number_of_cheeses: cheeses in the game
+    @param int memory_budget: bytes of states buffered at most
+
+    === Private Attributes ===
+    @param str _work_dir:
+        directory holding the frontier and run files
+    @param int _width:
+        bytes per state code
+    @param int _chunk_size:
+        bytes read or written at once per file
+    @param int _fan_in:
+        most run files merged at once
+    @param int _run_size:
+        states per run file
+    @param int _files:
+        number of files created so far, to name new ones
+    """
+
+    def __init__(self, number_of_stools, number_of_cheeses, work_dir,
+                 memory_budget=DEFAULT_MEMORY_BUDGET):
+        """ Create a new ExternalBFS working under work_dir.
+
+        @type self: ExternalBFS
+        @type number_of_stools: int
+        @type number_of_cheeses: int
+        @type work_dir: str
+        @type memory_budget: int
+        @rtype: None
+
+        Half of the budget is left for the chunks of the runs merged at
+        once, and the rest covers the other files open during a merge:
+
+        >>> bfs = ExternalBFS(4, 8, '.', memory_budget=64 * 1024)
+        >>> bfs._chunk_size, bfs._fan_in
+        (4096, 8)
+        """
+        self.number_of_stools = number_of_stools
+        self.number_of_cheeses = number_of_cheeses
+        self.memory_budget = memory_budget
+        self._work_dir = work_dir
+        self._width = max(1, ((number_of_stools ** number_of_cheeses - 1)
+                              .bit_length() + 7) // 8)
+        chunk_size = min(IO_CHUNK, memory_budget // 10,
+                         max(MIN_IO_CHUNK, memory_budget // (2 * MAX_FAN_IN)))
+        self._chunk_size = max(self._width,
+                               chunk_size // self._width * self._width)
+        self._fan_in = max(2, min(MAX_FAN_IN,
+                                  memory_budget // (2 * self._chunk_size)))
+        self._run_size = max(1, (memory_budget - 2 * self._chunk_size) //
+                             BYTES_PER_STATE)
+        self._files = 0
+
+    def _new_path(self, kind):
+        """ Return the path of a new file in the work directory.
+
+        @type self: ExternalBFS
+        @type kind: str
+        @rtype: str
+        """
+        self._files += 1
+        return os.path.join(self._work_dir,
+                            '{}-{}.bin'.format(kind, self._files))
+
+    def _read(self, path):
+        """ Generate the state codes of the file at path.
+
+        @type self: ExternalBFS
+        @type path: str
+        @rtype: generator[int]
+        """
+        return _read_codes(path, self._width, self._chunk_size)
+
+    def _write(self, path, codes):
+        """ Write codes to the file at path and return how many there were.
+
+        @type self: ExternalBFS
+        @type path: str
+        @type codes: iterable[int]
+        @rtype: int
+        """
+        return _write_codes(path, codes, self._width, self._chunk_size)
+
+    def _write_run(self, buffer):
+        """ Sort buffer, write it as a run file without repeats, empty it
+        and return the path of the run.
+
+        @type self: ExternalBFS
+        @type buffer: list[int]
+        @rtype: str
+        """
+        buffer.sort()
+        path = self._new_path('run')
+        self._write(path, _unique(buffer))
+        del buffer[:]
+        return path
+
+    def _merge(self, runs):
+        """ Merge the run files down to at most _fan_in, deleting the runs
+        merged, and return the paths of the runs left.
+
+        @type self: ExternalBFS
+        @type runs: list[str]
+        @rtype: list[str]
+        """
+        while len(runs) > self._fan_in:
+            merged = []
+            for i in range(0, len(runs), self._fan_in):
+                group = runs[i:i + self._fan_in]
+                path = self._new_path('run')
+                self._write(path, _unique(heapq.merge(*[
+                    self._read(run) for run in group])))
+                for run in group:
+                    os.remove(run)
+                merged.append(path)
+            runs = merged
+        return runs
+
+    def _expand(self, frontier, previous):
+        """ Write the frontier after the one in the file frontier, whose
+        predecessor is in the file previous (or None), and return its path
+        and number of states.
+
+        @type self: ExternalBFS
+        @type frontier: str
+        @type previous: str | None
+        @rtype: tuple[str, int]
+        """
+        runs = []
+        buffer = []
+        for code in self._read(frontier):
+            buffer.extend(neighbours(code, self.number_of_stools,
+                                     self.number_of_cheeses))
+            if len(buffer) >= self._run_size:
+                runs.append(self._write_run(buffer))
+        if buffer:
+            runs.append(self._write_run(buffer))
+        runs = self._merge(runs)
+        reached = _unique(heapq.merge(*[self._read(run) for run in runs]))
+        reached = _subtract(reached, self._read(frontier))
+        if previous is not None:
+            reached = _subtract(reached, self._read(previous))
+        path = self._new_path('frontier')
+        count = self._write(path, reached)
+        for run in runs:
+            os.remove(run)
+        return path, count
+
+    def run(self, start=None):
+        """ Search from start, by default every cheese on the first stool,
+        and return the number of states at each distance and the distance
+        to the goal of every cheese on the last stool.
+
+        @type self: ExternalBFS
+        @type start: tuple[int] | None
+        @rtype: dict[str, object]
+
+        >>> import tempfile
+        >>> work_dir = tempfile.mkdtemp()
+        >>> result = ExternalBFS(3, 3, work_dir, memory_budget=480).run()
+        >>> result['distances'], result['goal_distance']
+        ([1, 2, 2, 4, 2, 4, 4, 8], 7)
+        >>> os.listdir(work_dir)
+        []
+        """
+        if start is None:
+            start = (0,) * self.number_of_cheeses
+        goal_code = self.number_of_stools ** self.number_of_cheeses - 1
+        frontier = self._new_path('frontier')
+        self._write(frontier, [encode_state(start, self.number_of_stools)])
+        previous = None
+        count = 1
+        distances = []
+        goal_distance = None
+        while count > 0:
+            if goal_distance is None and \
+                    _last_code(frontier, self._width) == goal_code:
+                goal_distance = len(distances)
+            distances.append(count)
+            following, count = self._expand(frontier, previous)
+            if previous is not None:
+                os.remove(previous)
+            previous, frontier = frontier, following
+        os.remove(previous)
+        os.remove(frontier)
+        return {'stools': self.number_of_stools,
+                'cheeses': self.number_of_cheeses,
+                'states': sum(distances),
+                'start': list(start),
+                'distances': distances,
+                'eccentricity': len(distances) - 1,
+                'goal_distance': goal_distance}
+
+
+def explore_external(number_of_stools, number_of_cheeses, start=None,
+                     work_dir=None, memory_budget=DEFAULT_MEMORY_BUDGET):
+    """ Return the statistics of an external-memory breadth first
+    search, as state_explorer.explore but without path counts, using a
+    temporary directory under work_dir that is removed afterwards.
+
+    @type number_of_stools: int
+    @type number_of_cheeses: int
+    @type start: tuple[int] | None
+    @type work_dir: str | None
+    @type memory_budget: int
+    @rtype: dict[str, object]
+
+    >>> explore_external(4, 4, memory_budget=1024)['goal_distance']
+    9
+    """
+    import shutil
+    import tempfile
+    directory = tempfile.mkdtemp(prefix='toah-bfs-', dir=work_dir)
+    try:
+        return ExternalBFS(number_of_stools, number_of_cheeses,
+                           directory, memory_budget).run(start)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def main(argv=None):
+    """ Run the external BFS command line and return its exit status.
+
+    @type argv: list[str] | None
+    @rtype: int
+    """
+    import argparse
+    import json
+    parser = argparse.ArgumentParser(
+        description='Breadth first search of a Tour of Anne Hoy state graph '
+                    'larger than memory.')
+    parser.add_argument('--stools', type=int, default=4)
+    parser.add_argument('--cheeses', type=int, default=18)
+    parser.add_argument('--memory-mb', type=int,
+                        default=DEFAULT_MEMORY_BUDGET // (1024 * 1024),
+                        help='memory budget for buffered states')
+    parser.add_argument('--work-dir', help='directory for frontier and run '
+                                           'files (default: system temp)')
+    parser.add_argument('--output', help='file to write the JSON results to')
+    args = parser.parse_args(argv)
+    if args.stools < 2 or args.cheeses < 1 or args.memory_mb < 1:
+        parser.error('need at least 2 stools, 1 cheese and 1 MB')
+    result = explore_external(args.stools, args.cheeses,
+                              work_dir=args.work_dir,
+                              memory_budget=args.memory_mb * 1024 * 1024)
+    text = json.dumps(result, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as output:
+            output.write(text + '\n')
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,349 @@
+"""
+FrameRecorder: MoveListener streaming the frames of a TOAHModel to a text
+animation file, and FramePlayer: seekable reader of such files.
+
+The file is an asciicast (version 2) recording: a JSON header line, then
+one JSON event line per frame. Frame 0 and every keyframe_interval-th
+frame after it are keyframes, which clear the terminal and draw the whole
+board as str(model) does, each preceded by a marker event labelled with
+the frame number. Every other frame is a delta that only redraws the two
+cells changed by a move, using cursor positioning. So the file plays in
+any asciicast player, and neither recording nor playing keeps more than
+one screen in memory, however long the tour.
+
+A FramePlayer seeks to a frame by binary searching the file for the last
+keyframe at or before it, then applying at most keyframe_interval - 1
+deltas.
+"""
+
+import json
+import os
+import re
+
+from toah_model import MoveListener
+
+DEFAULT_KEYFRAME_INTERVAL = 256
+DEFAULT_DELAY = 0.5
+STOOL_SPACING = 2
+CLEAR = '\x1b[H\x1b[2J'
+CURSOR = re.compile('\x1b\\[(\\d+);(\\d+)H([^\x1b]*)')
+MARKER = b', "m", '
+
+
+def _cell(size, width):
+    """ Return the text of a cheese of size (or of no cheese if size is 0)
+    in a stool column width characters wide, as in str(TOAHModel).
+
+    @type size: int
+    @type width: int
+    @rtype: str
+
+    >>> _cell(2, 7)
+    '  ---  '
+    >>> _cell(0, 3)
+    '   '
+    """
+    if size == 0:
+        return ' ' * width
+    cheese = '-' * (2 * size - 1)
+    filler = ' ' * ((width - len(cheese)) // 2)
+    return filler + cheese + filler
+
+
+class FrameRecorder(MoveListener):
+    """ MoveListener writing a keyframe or a delta to a text file after
+    every move, undo or reset of the TOAHModel it follows.
+
+    === Attributes ===
+    @param int keyframe_interval: frames from one keyframe to the next
+    @param float delay: seconds between frames when played
+
+    === Private Attributes ===
+    @param file _output:
+        text file the recording is written to
+    @param int _frames:
+        frames written so far
+    @param int _width:
+        characters across a stool column
+    @param int _rows:
+        rows of cheeses above the stools
+    """
+
+    def __init__(self, output, keyframe_interval=DEFAULT_KEYFRAME_INTERVAL,
+                 delay=DEFAULT_DELAY):
+        """ Create a new FrameRecorder writing to output, which is not yet
+        following a model.
+
+        @type self: FrameRecorder
+        @type output: file
+        @type keyframe_interval: int
+        @type delay: float
+        @rtype: None
+        """
+        if keyframe_interval < 1:
+            raise ValueError("keyframe_interval must be positive")
+        self.keyframe_interval = keyframe_interval
+        self.delay = delay
+        self._output = output
+        self._frames = 0
+        self._width = 1
+        self._rows = 0
+
+    def attach(self, model):
+        """ Write the header and first keyframe of model, and record its
+        frames from now on.
+
+        @type self: FrameRecorder
+        @type model: TOAHModel
+        @rtype: None
+
+        >>> import io
+        >>> from toah_model import TOAHModel
+        >>> M = TOAHModel(3)
+        >>> M.fill_first_stool(2)
+        >>> output = io.StringIO()
+        >>> FrameRecorder(output, keyframe_interval=2).attach(M)
+        >>> M.move(0, 1)
+        >>> M.move(0, 2)
+        >>> player = FramePlayer(io.BytesIO(output.getvalue().encode()))
+        >>> player.number_of_frames()
+        3
+        >>> player.frame_at(2) == str(M)
+        True
+        """
+        sizes = [cheese.size for stool in model.get_stool_list()
+                 for cheese in stool.get_cheese_stack()]
+        self._width = 2 * max(sizes, default=0) + 1
+        self._rows = model.get_number_of_cheeses()
+        header = {'version': 2,
+                  'width': (self._width + STOOL_SPACING) *
+                  model.get_number_of_stools(),
+                  'height': self._rows + 1,
+                  'title': 'Tour of Anne Hoy',
+                  'toah': {'stools': model.get_number_of_stools(),
+                           'cheeses': self._rows,
+                           'keyframe_interval': self.keyframe_interval}}
+        self._output.write(json.dumps(header) + '\n')
+        self._frames = 0
+        self._write_keyframe(model)
+        model.add_listener(self)
+
+    def number_of_frames(self):
+        """ Return the number of frames written so far.
+
+        @type self: FrameRecorder
+        @rtype: int
+        """
+        return self._frames
+
+    def on_move(self, model, source_stool, destination_stool):
+        """ Record the frame after a move (or redo) in model.
+
+        @type self: FrameRecorder
+        @type model: TOAHModel
+        @type source_stool: int
+        @type destination_stool: int
+        @rtype: None
+        """
+        self._write_frame(model, source_stool, destination_stool)
+
+    def on_undo(self, model, source_stool, destination_stool):
+        """ Record the frame after a move was taken back in model.
+
+        @type self: FrameRecorder
+        @type model: TOAHModel
+        @type source_stool: int
+        @type destination_stool: int
+        @rtype: None
+        """
+        self._write_frame(model, destination_stool, source_stool)
+
+    def on_reset(self, model):
+        """ Record the rearranged model as a keyframe.
+
+        @type self: FrameRecorder
+        @type model: TOAHModel
+        @rtype: None
+        """
+        self._write_keyframe(model)
+
+    def _write_event(self, kind, data):
+        """ Write an event of the current frame.
+
+        @type self: FrameRecorder
+        @type kind: str
+        @type data: str
+        @rtype: None
+        """
+        self._output.write(json.dumps(
+            [round(self._frames * self.delay, 6), kind, data]) + '\n')
+
+    def _write_keyframe(self, model):
+        """ Write the whole board of model as the next frame.
+
+        @type self: FrameRecorder
+        @type model: TOAHModel
+        @rtype: None
+        """
+        self._write_event('m', str(self._frames))
+        self._write_event('o', CLEAR + str(model).replace('\n', '\r\n'))
+        self._frames += 1
+
+    def _write_frame(self, model, emptied, filled):
+        """ Write the next frame of model, in which the top cheese of stool
+        emptied has just moved onto stool filled.
+
+        @type self: FrameRecorder
+        @type model: TOAHModel
+        @type emptied: int
+        @type filled: int
+        @rtype: None
+        """
+        if self._frames % self.keyframe_interval == 0:
+            self._write_keyframe(model)
+            return
+        stools = model.get_stool_list()
+        height = len(stools[emptied].get_cheese_stack())
+        parts = [self._position(emptied, height), _cell(0, self._width)]
+        height = len(stools[filled].get_cheese_stack()) - 1
+        parts.append(self._position(filled, height))
+        parts.append(_cell(stools[filled].get_top_cheese().size,
+                           self._width))
+        self._write_event('o', ''.join(parts))
+        self._frames += 1
+
+    def _position(self, stool, height):
+        """ Return the escape sequence moving the cursor to the cell of
+        stool at height (from 0 at the bottom).
+
+        @type self: FrameRecorder
+        @type stool: int
+        @type height: int
+        @rtype: str
+        """
+        return '\x1b[{};{}H'.format(self._rows - height,
+                                    stool * (self._width + STOOL_SPACING) + 1)
+
+
+class FramePlayer:
+    """ Reader of a recording written by FrameRecorder, which can start
+    from any frame.
+
+    === Attributes ===
+    @param dict header: the header of the recording
+
+    === Private Attributes ===
+    @param file _source:
+        binary file of the recording
+    @param int _start:
+        offset of the first event
+    @param int _end:
+        size of the recording
+    """
+
+    def __init__(self, source):
+        """ Create a new FramePlayer of the recording in the seekable
+        binary file source.
+
+        @type self: FramePlayer
+        @type source: file
+        @rtype: None
+        """
+        self._source = source
+        source.seek(0)
+        self.header = json.loads(source.readline().decode('utf-8'))
+        self._start = source.tell()
+        self._end = source.seek(0, os.SEEK_END)
+
+    def _next_keyframe(self, offset):
+        """ Return the frame number and offset of the first keyframe
+        marker starting at or after offset, or None if there is none.
+
+        @type self: FramePlayer
+        @type offset: int
+        @rtype: tuple[int] | None
+        """
+        self._source.seek(offset - 1)
+        self._source.readline()
+        while True:
+            offset = self._source.tell()
+            line = self._source.readline()
+            if not line:
+                return None
+            if MARKER in line:
+                return int(json.loads(line.decode('utf-8'))[2]), offset
+
+    def _seek_keyframe(self, frame):
+        """ Return the frame number and offset of the last keyframe marker
+        at or before frame, by binary search over the file.
+
+        @type self: FramePlayer
+        @type frame: int
+        @rtype: tuple[int]
+        """
+        best = (0, self._start)
+        low, high = self._start, self._end
+        while low < high:
+            middle = (low + high) // 2
+            found = self._next_keyframe(middle)
+            if found is None or found[0] > frame:
+                high = middle
+            else:
+                best = found
+                low = found[1] + 1
+        return best
+
+    def frames(self, start=0):
+        """ Generate the text of each frame from frame start on.
+
+        @type self: FramePlayer
+        @type start: int
+        @rtype: generator[str]
+        """
+        frame, offset = self._seek_keyframe(start)
+        self._source.seek(offset)
+        screen = []
+        while True:
+            line = self._source.readline()
+            if not line:
+                return
+            if MARKER in line:
+                continue
+            data = json.loads(line.decode('utf-8'))[2]
+            if data.startswith(CLEAR):
+                screen = data[len(CLEAR):].split('\r\n')
+            else:
+                for row, column, text in CURSOR.findall(data):
+                    row, column = int(row) - 1, int(column) - 1
+                    screen[row] = screen[row][:column] + text + \
+                        screen[row][column + len(text):]
+            if frame >= start:
+                yield '\n'.join(screen)
+            frame += 1
+
+    def frame_at(self, frame):
+        """ Return the text of frame, or None past the last frame.
+
+        @type self: FramePlayer
+        @type frame: int
+        @rtype: str | None
+        """
+        return next(self.frames(frame), None)
+
+    def number_of_frames(self):
+        """ Return the number of frames in the recording.
+
+        @type self: FramePlayer
+        @rtype: int
+        """
+        frame, offset = self._seek_keyframe(self._end)
+        self._source.seek(offset)
+        for line in self._source:
+            if MARKER not in line:
+                frame += 1
+        return frame
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod(verbose=True)
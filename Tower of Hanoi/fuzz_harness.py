@@ -0,0 +1,543 @@
+"""
+Differential fuzzing of the model backends and solvers against the
+reference TOAHModel.
+
+Backends: a stream of random operations (moves between random stools,
+legal or not and sometimes out of range, undos and redos) is run on a
+reference TOAHModel and on the backend in lockstep. The outcome of every
+operation, nothing or the exception raised (with its message for an
+IllegalMoveError), must agree, and every batch_size operations the two
+models are compared: state, moves made, can_undo, is_solved, top cheeses
+and str. A failing stream is shrunk by delta debugging to a minimal
+sequence of operations that still tells the two apart.
+
+Solvers: each solver is given random parameters (cheeses, stools and
+their relabelling), and its moves must all be legal on the reference from
+the start, reach its goal and, for tours, take tour_length moves. A
+failing case is shrunk to the fewest cheeses that still fail.
+
+Cases are spread over a process pool, one seed per task:
+
+    python3 fuzz_harness.py --seeds 32 --operations 200000 --processes 4
+
+The exit status is 1 if any case failed, and the shrunk failures are
+printed as JSON lines.
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import sys
+
+from concurrent_model import ConcurrentTOAHModel
+from move_codec import encode_moves, decode_moves
+from shared_model import SharedTOAHModel
+from toah_model import TOAHModel, IllegalMoveError, unpack_moves
+from tour import three_stool_moves, four_stool_moves, solve_moves, \
+    tour_length, tour_blocks, three_stool_blocks, distribute_blocks, \
+    distributed_state
+
+DEFAULT_BATCH_SIZE = 4096
+DEFAULT_OPERATIONS = 100000
+# Largest games fuzzed, so that each case stays quick.
+MAX_STOOLS = 6
+MAX_CHEESES = 12
+MAX_TOUR_CHEESES = 12
+
+
+def _reference(number_of_stools, number_of_cheeses):
+    """ Return a TOAHModel with number_of_cheeses on its first stool.
+
+    @type number_of_stools: int
+    @type number_of_cheeses: int
+    @rtype: TOAHModel
+    """
+    model = TOAHModel(number_of_stools)
+    model.fill_first_stool(number_of_cheeses)
+    return model
+
+
+def _concurrent(number_of_stools, number_of_cheeses):
+    """ Return a ConcurrentTOAHModel with number_of_cheeses on its first
+    stool.
+
+    @type number_of_stools: int
+    @type number_of_cheeses: int
+    @rtype: ConcurrentTOAHModel
+    """
+    model = ConcurrentTOAHModel(number_of_stools)
+    model.fill_first_stool(number_of_cheeses)
+    return model
+
+
+def _shared(number_of_stools, number_of_cheeses):
+    """ Return a SharedTOAHModel with number_of_cheeses on its first
+    stool.
+
+    @type number_of_stools: int
+    @type number_of_cheeses: int
+    @rtype: SharedTOAHModel
+    """
+    return SharedTOAHModel(bytearray(number_of_cheeses), number_of_stools)
+
+
+# Functions making a filled model of each backend.
+BACKENDS = {'concurrent': _concurrent,
+            'shared': _shared}
+
+
+def random_operations(rng, number_of_stools, count, redo=True):
+    """ Return count random operations: ('move', source, destination),
+    ('undo',) or, if redo, ('redo',).
+
+    @type rng: random.Random
+    @type number_of_stools: int
+    @type count: int
+    @type redo: bool
+    @rtype: list[tuple]
+
+    >>> operations = random_operations(random.Random(0), 3, 1000, False)
+    >>> len(operations), ('redo',) in operations
+    (1000, False)
+    """
+    operations = []
+    for _ in range(count):
+        roll = rng.random()
+        if roll < 0.1:
+            operations.append(('undo',))
+        elif roll < 0.15 and redo:
+            operations.append(('redo',))
+        elif roll < 0.17:
+            operations.append(('move',
+                               rng.randrange(-number_of_stools - 1,
+                                             number_of_stools + 1),
+                               rng.randrange(-number_of_stools - 1,
+                                             number_of_stools + 1)))
+        else:
+            operations.append(('move', rng.randrange(number_of_stools),
+                               rng.randrange(number_of_stools)))
+    return operations
+
+
+def _apply(model, operation):
+    """ Apply operation to model and return None, or what was raised.
+
+    @type model: TOAHModel | SharedTOAHModel
+    @type operation: tuple
+    @rtype: tuple | None
+
+    >>> _apply(_reference(3, 1), ('move', 1, 2))
+    ('IllegalMoveError', 'Selected stool has no cheese!')
+    >>> _apply(_reference(3, 1), ('move', 0, 5))
+    ('IndexError',)
+    """
+    try:
+        if operation[0] == 'move':
+            model.move(operation[1], operation[2])
+        elif operation[0] == 'undo':
+            model.undo()
+        else:
+            model.redo()
+    except IllegalMoveError as e:
+        return 'IllegalMoveError', str(e)
+    except Exception as e:
+        return type(e).__name__,
+    return None
+
+
+def _observe(model):
+    """ Return what can be seen of model from outside.
+
+    @type model: TOAHModel | SharedTOAHModel
+    @rtype: tuple
+    """
+    tops = []
+    for stool in range(model.get_number_of_stools()):
+        cheese = model.get_top_cheese(stool)
+        tops.append(None if cheese is None else cheese.size)
+    return (model.get_state(), model.number_of_moves(), model.can_undo(),
+            model.is_solved(), tuple(tops), str(model))
+
+
+def run_lockstep(backend, number_of_stools, number_of_cheeses, operations,
+                 batch_size=DEFAULT_BATCH_SIZE):
+    """ Run operations on the reference and on a model of backend, and
+    return None if they agree, or the number of operations run until
+    they disagreed and why.
+
+    @type backend: str
+    @type number_of_stools: int
+    @type number_of_cheeses: int
+    @type operations: list[tuple]
+    @type batch_size: int
+    @rtype: tuple[int, str] | None
+
+    >>> run_lockstep('shared', 3, 2, [('move', 0, 1), ('undo',)])
+    """
+    reference = _reference(number_of_stools, number_of_cheeses)
+    model = BACKENDS[backend](number_of_stools, number_of_cheeses)
+    for start in range(0, len(operations), batch_size):
+        batch = operations[start:start + batch_size]
+        for i in range(len(batch)):
+            expected = _apply(reference, batch[i])
+            found = _apply(model, batch[i])
+            if expected != found:
+                return start + i + 1, '{!r}: expected {!r}, got {!r}'.format(
+                    batch[i], expected, found)
+        expected = _observe(reference)
+        found = _observe(model)
+        if expected != found:
+            return start + len(batch), 'expected {!r}, got {!r}'.format(
+                expected[:5], found[:5])
+    return None
+
+
+def shrink(operations, fails):
+    """ Return a sublist of operations, which fails, such that removing
+    any one operation from it makes it pass (delta debugging).
+
+    @type operations: list[tuple]
+    @type fails: function
+        whether a list of operations fails
+    @rtype: list[tuple]
+
+    >>> shrink(list(range(20)), lambda ops: 3 in ops and 17 in ops)
+    [3, 17]
+    """
+    chunks = 2
+    while len(operations) >= 2:
+        size = -(-len(operations) // chunks)
+        for start in range(0, len(operations), size):
+            candidate = operations[:start] + operations[start + size:]
+            if fails(candidate):
+                operations = candidate
+                chunks = max(chunks - 1, 2)
+                break
+        else:
+            if size == 1:
+                break
+            chunks = min(chunks * 2, len(operations))
+    return operations
+
+
+def fuzz_backend(task):
+    """ Fuzz a backend with the random stream of seed, and return None or
+    the shrunk failure.
+
+    @type task: tuple[str, int, int, int]
+        backend, seed, number of operations and batch size
+    @rtype: dict | None
+
+    >>> fuzz_backend(('concurrent', 0, 2000, 500))
+    """
+    backend, seed, count, batch_size = task
+    rng = random.Random(seed)
+    number_of_stools = rng.randint(3, MAX_STOOLS)
+    number_of_cheeses = rng.randint(0, MAX_CHEESES)
+    redo = hasattr(BACKENDS[backend](number_of_stools, 0), 'redo')
+    operations = random_operations(rng, number_of_stools, count, redo)
+    failure = run_lockstep(backend, number_of_stools, number_of_cheeses,
+                           operations, batch_size)
+    if failure is None:
+        return None
+
+    def fails(candidate):
+        return run_lockstep(backend, number_of_stools, number_of_cheeses,
+                            candidate, 1) is not None
+    operations = shrink(operations[:failure[0]], fails)
+    return {'backend': backend, 'seed': seed, 'stools': number_of_stools,
+            'cheeses': number_of_cheeses, 'operations': operations,
+            'reason': run_lockstep(backend, number_of_stools,
+                                   number_of_cheeses, operations, 1)[1]}
+
+
+def _tour_case(rng, number_of_cheeses, roles):
+    """ Return a case for a tour of number_of_cheeses between roles
+    random distinct stools.
+
+    @type rng: random.Random
+    @type number_of_cheeses: int
+    @type roles: int
+    @rtype: dict
+    """
+    number_of_stools = rng.randint(roles, MAX_STOOLS)
+    stools = rng.sample(range(number_of_stools), roles)
+    return {'stools': number_of_stools, 'cheeses': number_of_cheeses,
+            'source': stools[0], 'roles': stools,
+            'goal': (stools[-1],) * number_of_cheeses,
+            'length': tour_length(number_of_cheeses, roles)}
+
+
+def _three_stool_moves(rng, number_of_cheeses):
+    """ Return a case of tour.three_stool_moves and its moves.
+
+    @type rng: random.Random
+    @type number_of_cheeses: int
+    @rtype: tuple[dict, iterable[tuple[int]]]
+    """
+    case = _tour_case(rng, number_of_cheeses, 3)
+    return case, three_stool_moves(number_of_cheeses, *case['roles'])
+
+
+def _four_stool_moves(rng, number_of_cheeses):
+    """ Return a case of tour.four_stool_moves and its moves.
+
+    @type rng: random.Random
+    @type number_of_cheeses: int
+    @rtype: tuple[dict, iterable[tuple[int]]]
+    """
+    case = _tour_case(rng, number_of_cheeses, 4)
+    return case, four_stool_moves(number_of_cheeses, *case['roles'])
+
+
+def _tour_blocks(rng, number_of_cheeses):
+    """ Return a case of tour.tour_blocks and its moves.
+
+    @type rng: random.Random
+    @type number_of_cheeses: int
+    @rtype: tuple[dict, iterable[tuple[int]]]
+    """
+    case = _tour_case(rng, number_of_cheeses, rng.choice((3, 4)))
+    return case, (move for block in tour_blocks(number_of_cheeses,
+                                                tuple(case['roles']))
+                  for move in unpack_moves(block))
+
+
+def _three_stool_blocks(rng, number_of_cheeses):
+    """ Return a case of tour.three_stool_blocks and its moves, or None
+    if NumPy is not installed.
+
+    @type rng: random.Random
+    @type number_of_cheeses: int
+    @rtype: tuple[dict, iterable[tuple[int]]] | None
+    """
+    try:
+        import numpy  # noqa: F401
+    except ImportError:
+        return None
+    case = _tour_case(rng, number_of_cheeses, 3)
+    source, base_stool, destination = case['roles']
+    blocks = three_stool_blocks(number_of_cheeses, 1 << rng.randint(0, 6),
+                                source, base_stool, destination)
+    return case, (move for sources, destinations in blocks
+                  for move in zip(sources.tolist(), destinations.tolist()))
+
+
+def _distribute_blocks(rng, number_of_cheeses):
+    """ Return a case of tour.distribute_blocks and its moves.
+
+    @type rng: random.Random
+    @type number_of_cheeses: int
+    @rtype: tuple[dict, iterable[tuple[int]]]
+    """
+    number_of_stools = rng.randint(3, MAX_STOOLS)
+    source = rng.randrange(number_of_stools)
+    segments = []
+    left = number_of_cheeses
+    while left > 0:
+        count = rng.randint(1, left)
+        segments.append((count, rng.randrange(number_of_stools)))
+        left -= count
+    case = {'stools': number_of_stools, 'cheeses': number_of_cheeses,
+            'source': source, 'segments': segments,
+            'goal': distributed_state(segments), 'length': None}
+    return case, (move for block in distribute_blocks(number_of_stools,
+                                                      source, segments)
+                  for move in unpack_moves(block))
+
+
+def _move_codec(rng, number_of_cheeses):
+    """ Return a case of a tour encoded and decoded by move_codec.
+
+    @type rng: random.Random
+    @type number_of_cheeses: int
+    @rtype: tuple[dict, iterable[tuple[int]]]
+    """
+    number_of_stools = rng.randint(3, 4)
+    moves = list(solve_moves(number_of_cheeses, number_of_stools))
+    case = {'stools': number_of_stools, 'cheeses': number_of_cheeses,
+            'source': 0, 'goal': (number_of_stools - 1,) * number_of_cheeses,
+            'length': len(moves)}
+    return case, decode_moves(encode_moves(moves, number_of_stools))
+
+
+# Functions making a random case of each solver, given the cheeses.
+SOLVERS = {'three_stool_moves': _three_stool_moves,
+           'four_stool_moves': _four_stool_moves,
+           'tour_blocks': _tour_blocks,
+           'three_stool_blocks': _three_stool_blocks,
+           'distribute_blocks': _distribute_blocks,
+           'move_codec': _move_codec}
+
+
+def check_solver(solver, seed, number_of_cheeses,
+                 batch_size=DEFAULT_BATCH_SIZE):
+    """ Return None if the case of solver for seed and number_of_cheeses
+    is solved correctly (or cannot be run), else the case and what went
+    wrong, which may be an exception raised by the solver itself.
+
+    @type solver: str
+    @type seed: int
+    @type number_of_cheeses: int
+    @type batch_size: int
+    @rtype: tuple[dict, str] | None
+
+    >>> check_solver('distribute_blocks', 3, 5)
+    """
+    try:
+        made = SOLVERS[solver](random.Random(seed), number_of_cheeses)
+    except Exception as e:
+        return {'cheeses': number_of_cheeses}, 'solver raised {!r}'.format(e)
+    if made is None:
+        return None
+    case, moves = made
+    model = TOAHModel(case['stools'])
+    model.fill_first_stool(number_of_cheeses, case['source'])
+    moves = iter(moves)
+    count = 0
+    while True:
+        try:
+            move = next(moves, None)
+        except Exception as e:
+            return case, 'solver raised {!r} after {} moves'.format(e, count)
+        if move is None:
+            break
+        count += 1
+        try:
+            model.move(move[0], move[1])
+        except (IllegalMoveError, IndexError) as e:
+            return case, 'move {} {!r}: {}'.format(count, move, e)
+        if model.number_of_moves() >= batch_size:
+            model.clear_history()
+    if model.get_state() != tuple(case['goal']):
+        return case, 'ended at {!r}'.format(model.get_state())
+    if case['length'] is not None and count != case['length']:
+        return case, 'took {} moves instead of {}'.format(count,
+                                                          case['length'])
+    return None
+
+
+def _failure_kind(reason):
+    """ Return reason from check_solver without the numbers and bracketed
+    values that change with the number of cheeses.
+
+    @type reason: str
+    @rtype: str
+
+    >>> _failure_kind("move 5 (0, 1): Cant move the cheese there!")
+    'move : Cant move the cheese there!'
+    >>> _failure_kind("ended at (2, 1)") == _failure_kind("ended at (0,)")
+    True
+    """
+    return ' '.join(re.sub(r'\([^()]*\)|\d+', '', reason).split())
+
+
+def fuzz_solver(task):
+    """ Check a solver on the random case of seed, and return None or the
+    failure with the fewest cheeses that fails the same way.
+
+    @type task: tuple[str, int, int]
+        solver, seed and batch size
+    @rtype: dict | None
+
+    >>> fuzz_solver(('tour_blocks', 0, 100))
+    >>> try:
+    ...     import numpy
+    ... except ImportError:
+    ...     numpy = None
+    >>> numpy is None or [fuzz_solver(('three_stool_blocks', seed, 100))
+    ...                   for seed in range(20)] == [None] * 20
+    True
+    """
+    solver, seed, batch_size = task
+    number_of_cheeses = random.Random(seed).randint(0, MAX_TOUR_CHEESES)
+    failure = check_solver(solver, seed, number_of_cheeses, batch_size)
+    if failure is None:
+        return None
+    kind = _failure_kind(failure[1])
+    for fewer in range(number_of_cheeses):
+        smaller = check_solver(solver, seed, fewer, batch_size)
+        if smaller is not None and _failure_kind(smaller[1]) == kind:
+            failure = smaller
+            break
+    case, reason = failure
+    case.update({'solver': solver, 'seed': seed, 'reason': reason})
+    return case
+
+
+def _run_task(task):
+    """ Run a backend or solver task.
+
+    @type task: tuple
+        'backend' or 'solver' and the task of fuzz_backend or fuzz_solver
+    @rtype: dict | None
+    """
+    if task[0] == 'backend':
+        return fuzz_backend(task[1])
+    return fuzz_solver(task[1])
+
+
+def fuzz(backends, solvers, seeds, operations=DEFAULT_OPERATIONS,
+         batch_size=DEFAULT_BATCH_SIZE, processes=1):
+    """ Fuzz each of backends and solvers with seeds 0 to seeds - 1 over
+    processes, and return the failures.
+
+    @type backends: list[str]
+    @type solvers: list[str]
+    @type seeds: int
+    @type operations: int
+    @type batch_size: int
+    @type processes: int
+    @rtype: list[dict]
+
+    >>> fuzz(['shared'], ['three_stool_moves'], 2, 1000, 100)
+    []
+    """
+    tasks = [('backend', (backend, seed, operations, batch_size))
+             for backend in backends for seed in range(seeds)]
+    tasks += [('solver', (solver, seed, batch_size))
+              for solver in solvers for seed in range(seeds)]
+    if processes > 1:
+        import multiprocessing
+        with multiprocessing.Pool(processes) as pool:
+            results = list(pool.imap_unordered(_run_task, tasks))
+    else:
+        results = [_run_task(task) for task in tasks]
+    return [result for result in results if result is not None]
+
+
+def main(argv=None):
+    """ Run the fuzzing command line and return its exit status.
+
+    @type argv: list[str] | None
+    @rtype: int
+    """
+    parser = argparse.ArgumentParser(
+        description='Differential fuzzing of model backends and solvers.')
+    parser.add_argument('--backends', nargs='*', choices=sorted(BACKENDS),
+                        default=sorted(BACKENDS))
+    parser.add_argument('--solvers', nargs='*', choices=sorted(SOLVERS),
+                        default=sorted(SOLVERS))
+    parser.add_argument('--seeds', type=int, default=8,
+                        help='random cases per backend and solver')
+    parser.add_argument('--operations', type=int, default=DEFAULT_OPERATIONS,
+                        help='operations per backend case')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                        help='operations between model comparisons')
+    parser.add_argument('--processes', type=int, default=os.cpu_count())
+    args = parser.parse_args(argv)
+    if args.seeds < 1 or args.batch_size < 1 or args.processes < 1:
+        parser.error('--seeds, --batch-size and --processes must be '
+                     'positive')
+    failures = fuzz(args.backends, args.solvers, args.seeds,
+                    args.operations, args.batch_size, args.processes)
+    for failure in failures:
+        print(json.dumps(failure, sort_keys=True))
+    print('{} failures'.format(len(failures)), file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
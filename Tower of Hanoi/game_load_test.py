@@ -0,0 +1,112 @@
+"""
+Load test for game_server: many concurrent clients each play the four
+stool tour, and the moves per second and latency percentiles of the
+server are reported.
+
+    python3 game_load_test.py --port 8766 --clients 200 --games 5
+
+Without --port, a GameServer is started in the same event loop.
+"""
+
+import argparse
+import asyncio
+import math
+import time
+
+from game_server import GameServer
+from tour import solve_moves
+
+
+def percentile(values, fraction):
+    """ Return the value below which the given fraction of the sorted
+    values lie.
+
+    @type values: list[float]
+    @type fraction: float
+    @rtype: float
+
+    >>> percentile([1, 2, 3, 4], 0.5)
+    2
+    >>> percentile([1, 2, 3, 4], 0.99)
+    4
+    """
+    return values[max(0, math.ceil(len(values) * fraction) - 1)]
+
+
+async def play(host, port, number_of_cheeses, games, latencies):
+    """ Connect to the server and play the four stool tour games times,
+    appending the latency of every move to latencies.
+
+    @type host: str
+    @type port: int
+    @type number_of_cheeses: int
+    @type games: int
+    @type latencies: list[float]
+    @rtype: None
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    await reader.readline()
+    commands = ['MOVE {} {}\n'.format(source + 1, destination + 1).encode()
+                for source, destination in solve_moves(number_of_cheeses, 4)]
+    new_game = 'NEW 4 {}\n'.format(number_of_cheeses).encode()
+    for _ in range(games):
+        writer.write(new_game)
+        await reader.readline()
+        for command in commands:
+            start = time.perf_counter()
+            writer.write(command)
+            reply = await reader.readline()
+            latencies.append(time.perf_counter() - start)
+            if not reply.startswith((b'OK', b'WON')):
+                raise RuntimeError(reply.decode().strip())
+    writer.write(b'QUIT\n')
+    writer.close()
+
+
+async def run(host, port, clients, games, number_of_cheeses):
+    """ Run the load test and return its results.
+
+    @type host: str
+    @type port: int | None
+        port of a running server, or None to start one in process
+    @type clients: int
+    @type games: int
+    @type number_of_cheeses: int
+    @rtype: dict[str, float]
+
+    >>> results = asyncio.run(run('127.0.0.1', None, 3, 1, 3))
+    >>> results['moves']
+    15
+    """
+    server = None
+    if port is None:
+        server = await GameServer(max_sessions=clients).start(host)
+        port = server.sockets[0].getsockname()[1]
+    latencies = []
+    start = time.perf_counter()
+    await asyncio.gather(*[play(host, port, number_of_cheeses, games,
+                                latencies) for _ in range(clients)])
+    elapsed = time.perf_counter() - start
+    if server is not None:
+        server.close()
+        await server.wait_closed()
+    latencies.sort()
+    return {'moves': len(latencies),
+            'seconds': elapsed,
+            'moves_per_second': len(latencies) / elapsed,
+            'p50_ms': percentile(latencies, 0.5) * 1000,
+            'p99_ms': percentile(latencies, 0.99) * 1000}
+
+
+if __name__ == '__main__':
+    PARSER = argparse.ArgumentParser(description='Load test game_server.')
+    PARSER.add_argument('--host', default='127.0.0.1')
+    PARSER.add_argument('--port', type=int)
+    PARSER.add_argument('--clients', type=int, default=100)
+    PARSER.add_argument('--games', type=int, default=5)
+    PARSER.add_argument('--cheeses', type=int, default=8)
+    ARGS = PARSER.parse_args()
+    RESULTS = asyncio.run(run(ARGS.host, ARGS.port, ARGS.clients, ARGS.games,
+                              ARGS.cheeses))
+    print('{moves} moves in {seconds:.2f}s: {moves_per_second:.0f} moves/s, '
+          'p50 {p50_ms:.2f} ms, p99 {p99_ms:.2f} ms'.format(**RESULTS))
@@ -0,0 +1,240 @@
+"""
+GameServer: asyncio TCP server hosting many console-style games at once.
+
+Every connection plays its own TOAHModel, with the same stool numbering,
+move validation and win detection as ConsoleController. The protocol is
+one command per line:
+
+    NEW <stools> <cheeses>   start a new game, of at most MAX_STOOLS
+                             stools and MAX_CHEESES cheeses
+    MOVE <origin> <dest>     move a cheese, stools numbered from 1
+    UNDO / REDO              take back or replay a move
+    BOARD                    show the board, ended by a line with a '.'
+    QUIT                     close the connection
+
+and every command is answered by a line starting with OK, WON or ERR.
+
+Each session awaits its writer before reading its next command, so a
+client that stops reading only stalls its own session, and sessions idle
+for longer than the idle timeout are closed.
+
+    python3 game_server.py --port 8766
+"""
+
+import argparse
+import asyncio
+
+from console_controller import parse_stool
+from toah_model import TOAHModel, IllegalMoveError
+
+DEFAULT_STOOLS = 4
+DEFAULT_CHEESES = 5
+MAX_LINE = 1024
+# Largest game a client can start, so that NEW cannot exhaust the memory.
+MAX_STOOLS = 16
+MAX_CHEESES = 64
+
+
+class GameSession:
+    """ One player's game on a GameServer.
+
+    === Attributes ===
+    @param TOAHModel model: the game being played
+    @param int number_of_stools: stools in the game
+    @param int number_of_cheeses: cheeses in the game
+    """
+
+    def __init__(self, number_of_stools=DEFAULT_STOOLS,
+                 number_of_cheeses=DEFAULT_CHEESES):
+        """ Create a new GameSession with a new game.
+
+        @type self: GameSession
+        @type number_of_stools: int
+        @type number_of_cheeses: int
+        @rtype: None
+        """
+        self.model = None
+        self.number_of_stools = 0
+        self.number_of_cheeses = 0
+        self.new_game(number_of_stools, number_of_cheeses)
+
+    def new_game(self, number_of_stools, number_of_cheeses):
+        """ Start a new game, discarding the current one.
+
+        @type self: GameSession
+        @type number_of_stools: int
+        @type number_of_cheeses: int
+        @rtype: None
+        """
+        self.model = TOAHModel(number_of_stools)
+        self.model.fill_first_stool(number_of_cheeses)
+        self.number_of_stools = number_of_stools
+        self.number_of_cheeses = number_of_cheeses
+
+    def _status(self):
+        """ Return the OK or WON reply for the current game.
+
+        @type self: GameSession
+        @rtype: str
+        """
+        if self.model.is_solved():
+            return 'WON moves={}'.format(self.model.number_of_moves())
+        return 'OK moves={}'.format(self.model.number_of_moves())
+
+    def handle(self, line):
+        """ Return the reply to the command line, or None to close the
+        connection.
+
+        @type self: GameSession
+        @type line: str
+        @rtype: str | None
+
+        >>> session = GameSession(3, 1)
+        >>> session.handle('MOVE 1 4')
+        'ERR Stool index out of range!'
+        >>> session.handle('MOVE 2 3')
+        'ERR Selected stool has no cheese!'
+        >>> session.handle('MOVE 1 3')
+        'WON moves=1'
+        >>> session.handle('UNDO')
+        'OK moves=0'
+        >>> session.handle('NEW 2 100000000')
+        'ERR You cannot play with that game!'
+        >>> session.handle('NEW 3 x'), session.handle('MOVE x 1')
+        ('ERR expected numbers', 'ERR expected numbers')
+        """
+        words = line.split()
+        command = words[0].upper() if words else ''
+        if command in ('MOVE', 'NEW'):
+            try:
+                for word in words[1:]:
+                    int(word)
+            except ValueError:
+                return 'ERR expected numbers'
+        try:
+            if command == 'MOVE' and len(words) == 3:
+                self.model.move(parse_stool(words[1], self.number_of_stools),
+                                parse_stool(words[2], self.number_of_stools))
+            elif command == 'UNDO' and len(words) == 1:
+                self.model.undo()
+            elif command == 'REDO' and len(words) == 1:
+                self.model.redo()
+            elif command == 'NEW' and len(words) == 3:
+                number_of_stools, number_of_cheeses = \
+                    int(words[1]), int(words[2])
+                if not (2 <= number_of_stools <= MAX_STOOLS and
+                        1 <= number_of_cheeses <= MAX_CHEESES):
+                    raise ValueError('You cannot play with that game!')
+                self.new_game(number_of_stools, number_of_cheeses)
+            elif command == 'BOARD' and len(words) == 1:
+                return '{}\n{}\n.'.format(self._status(), self.model)
+            elif command == 'QUIT' and len(words) == 1:
+                return None
+            else:
+                return 'ERR unknown command'
+        except (ValueError, IllegalMoveError) as e:
+            return 'ERR {}'.format(e)
+        return self._status()
+
+
+class GameServer:
+    """ asyncio TCP server running one GameSession per connection.
+
+    === Attributes ===
+    @param int max_sessions: most connections served at once
+    @param float idle_timeout: seconds of silence before a session is closed
+    @param int sessions: number of connections being served
+    @param int commands: number of commands handled so far
+    """
+
+    def __init__(self, max_sessions=1000, idle_timeout=300.0):
+        """ Create a new GameServer that is not yet listening.
+
+        @type self: GameServer
+        @type max_sessions: int
+        @type idle_timeout: float
+        @rtype: None
+        """
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.sessions = 0
+        self.commands = 0
+
+    async def start(self, host='127.0.0.1', port=0):
+        """ Start listening on host:port and return the asyncio server.
+
+        @type self: GameServer
+        @type host: str
+        @type port: int
+        @rtype: asyncio.AbstractServer
+        """
+        return await asyncio.start_server(self.serve, host, port,
+                                          limit=MAX_LINE)
+
+    async def serve(self, reader, writer):
+        """ Play one session over a connection.
+
+        @type self: GameServer
+        @type reader: asyncio.StreamReader
+        @type writer: asyncio.StreamWriter
+        @rtype: None
+        """
+        if self.sessions >= self.max_sessions:
+            writer.write(b'ERR server full\n')
+            await writer.drain()
+            writer.close()
+            return
+        self.sessions += 1
+        session = GameSession()
+        try:
+            writer.write('OK stools={} cheeses={}\n'.format(
+                session.number_of_stools, session.number_of_cheeses).encode())
+            await writer.drain()
+            while True:
+                try:
+                    line = await asyncio.wait_for(reader.readline(),
+                                                  self.idle_timeout)
+                except asyncio.TimeoutError:
+                    writer.write(b'ERR idle timeout\n')
+                    break
+                except ValueError:
+                    writer.write(b'ERR line too long\n')
+                    break
+                if not line:
+                    break
+                reply = session.handle(line.decode('ascii', 'replace'))
+                self.commands += 1
+                if reply is None:
+                    break
+                writer.write(reply.encode() + b'\n')
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.sessions -= 1
+            writer.close()
+
+
+async def _main(port, max_sessions, idle_timeout):
+    """ Serve games on port until cancelled.
+
+    @type port: int
+    @type max_sessions: int
+    @type idle_timeout: float
+    @rtype: None
+    """
+    server = await GameServer(max_sessions, idle_timeout).start(port=port)
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == '__main__':
+    PARSER = argparse.ArgumentParser(description='Host TOAH games over TCP.')
+    PARSER.add_argument('--port', type=int, default=8766)
+    PARSER.add_argument('--max-sessions', type=int, default=1000)
+    PARSER.add_argument('--idle-timeout', type=float, default=300.0)
+    ARGS = PARSER.parse_args()
+    try:
+        asyncio.run(_main(ARGS.port, ARGS.max_sessions, ARGS.idle_timeout))
+    except KeyboardInterrupt:
+        pass
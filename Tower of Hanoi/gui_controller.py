@@ -1,8 +1,14 @@
 """ GUIController: GUI window for manually solving Anne Hoy's problems.
+
+    python3 gui_controller.py --replay FILE
+
+shows the game recorded by the move script FILE instead, as
+console_controller.py --replay does.
 """
 
 import time
 import tkinter as tk
+from distance_oracle import DistanceOracle
 from gui_viewables import CheeseView, StoolView
 from toah_model import TOAHModel, IllegalMoveError
 
@@ -39,6 +45,7 @@ class GUIController:
         self._blinking = False
         self._number_of_stools = number_of_stools
         self.cheese_scale = cheese_scale
+        self._oracle = None
         self.root = tk.Tk()
         canvas = tk.Canvas(self.root,
                            background="blue",
@@ -47,6 +54,10 @@ class GUIController:
         self.moves_label = tk.Label(self.root)
         self.show_number_of_moves()
         self.moves_label.pack()
+        tk.Button(self.root, text="Undo", command=self.undo).pack(side=tk.LEFT)
+        tk.Button(self.root, text="Redo", command=self.redo).pack(side=tk.LEFT)
+        self.root.bind('<Control-z>', lambda _: self.undo())
+        self.root.bind('<Control-y>', lambda _: self.redo())
         # the dimensions of a stool are the same as a cheese that's
         # one size bigger than the biggest of the number_of_cheeses cheeses.
         for stool_ind in range(number_of_stools):
@@ -77,6 +88,10 @@ class GUIController:
                                 y_cent)
             self._model.add(cheese, 0)
             total_size += self.cheese_scale
+        if number_of_stools == 3:
+            self._oracle = DistanceOracle()
+            self._oracle.attach(self._model)
+            self.show_number_of_moves()
 
     def cheese_clicked(self, cheese):
         """ React to cheese being clicked: if not in the middle of blinking
@@ -186,6 +201,73 @@ class GUIController:
             self._cheese_to_move = None
             self.root.update()
 
+    def undo(self):
+        """ Take back the last move, if there is one.
+
+        @param GUIController self:
+        @rtype: None
+        """
+        if not self._blinking and self._model.can_undo():
+            self._model.undo()
+            self.show_model()
+
+    def redo(self):
+        """ Replay the last move taken back, if there is one.
+
+        @param GUIController self:
+        @rtype: None
+        """
+        if not self._blinking and self._model.can_redo():
+            self._model.redo()
+            self.show_model()
+
+    def show_model(self):
+        """ Place every cheese on screen where it is in the model, clear
+        any selection and update the number of moves.
+
+        @param GUIController self:
+        @rtype: None
+        """
+        if self._cheese_to_move is not None:
+            self._cheese_to_move.highlight(False)
+            self._cheese_to_move = None
+        for stool_index in range(self._number_of_stools):
+            stool = self._stools[stool_index]
+            stack = self._model.get_stool_at(stool_index).get_cheese_stack()
+            for height in range(len(stack)):
+                stack[height].place(stool.x_center, stool.y_center -
+                                    (height + 1) * self.cheese_scale)
+        self.show_number_of_moves()
+        self.root.update()
+
+    def replay(self, cursor):
+        """ Show the recorded game of cursor, scrubbing through it with
+        the Left, Right, Home and End keys.
+
+        The cursor must be over a game with the same number of stools and
+        cheeses as self.
+
+        @param GUIController self:
+        @param ReplayCursor cursor:
+        @rtype: None
+        """
+        def show(action):
+            try:
+                action()
+            except IndexError:
+                return
+            self._model.set_state(cursor.get_model().get_state())
+            self.show_model()
+            self.moves_label.config(text="Move {} of {}".format(
+                cursor.position(), cursor.length()))
+
+        self.root.bind('<Right>', lambda _: show(cursor.step))
+        self.root.bind('<Left>', lambda _: show(cursor.back))
+        self.root.bind('<Home>', lambda _: show(lambda: cursor.seek(0)))
+        self.root.bind('<End>', lambda _: show(
+            lambda: cursor.seek(cursor.length())))
+        show(lambda: None)
+
     def stool_index(self, stool):
         """ Return the index of stool.
 
@@ -203,13 +285,17 @@ class GUIController:
         return self._stools.index(stool)
 
     def show_number_of_moves(self):
-        """Show the number of moves so far.
+        """Show the number of moves so far, and on three stools the number
+        of moves left if played optimally.
 
         @param GUIController self:
         @rtype: None
         """
-        self.moves_label.config(text="Number of moves: " +
-                                str(self._model.number_of_moves()))
+        text = "Number of moves: " + str(self._model.number_of_moves())
+        if self._oracle is not None:
+            text += ", moves left if played optimally: " + \
+                str(self._oracle.distance())
+        self.moves_label.config(text=text)
 
     def get_stool(self, i):
         """ Return ith stool.
@@ -235,7 +321,26 @@ class GUIController:
         return self._model.get_top_cheese(i)
 
 if __name__ == "__main__":
-    gui = GUIController(5, 4, 1024, 320, 20)
+    import sys
+    if '--replay' in sys.argv:
+        import argparse
+        from replay import read_replay
+        parser = argparse.ArgumentParser(
+            description='Scrub through a recorded game.')
+        parser.add_argument('--replay', required=True,
+                            help='move script of the game to replay')
+        args = parser.parse_args()
+        try:
+            with open(args.replay) as script:
+                cursor = read_replay(script.read())
+        except (OSError, ValueError, IllegalMoveError) as e:
+            sys.exit(str(e))
+        replayed = cursor.get_model()
+        gui = GUIController(replayed.get_number_of_cheeses(),
+                            replayed.get_number_of_stools(), 1024, 320, 20)
+        gui.replay(cursor)
+    else:
+        gui = GUIController(5, 4, 1024, 320, 20)
     tk.mainloop()
     # Leave lines below so you can see what python_ta checks
     # File guicontroller_pyta.txt must be in same folder.
@@ -17,7 +17,6 @@ PlatformView objects receive a function to call in order to report to some
 UI object (e.g. GUIController) that their rectangle was clicked on.
 """
 
-from tkinter import Canvas
 from toah_model import Cheese
 
 class PlatformView:
@@ -0,0 +1,253 @@
+"""
+Instrumentation: opt-in call counters and cumulative timers for the hot
+paths of TOAHModel and the tour solvers.
+
+The hot paths are only wrapped while an Instrumentation is enabled, so
+there is no cost at all when it is disabled.
+
+    >>> from toah_model import TOAHModel
+    >>> import tour
+    >>> with Instrumentation() as inst:
+    ...     M = TOAHModel(4)
+    ...     M.fill_first_stool(5)
+    ...     tour.tour_of_four_stools(M)
+    >>> inst.stats()['TOAHModel.move']['calls']
+    13
+    >>> inst.stats()['tour.four_stool_solver']['calls']
+    1
+    >>> inst.stats()['tour.four_stool_moves']['calls']
+    3
+    >>> TOAHModel.move is inst.original('TOAHModel.move')
+    True
+"""
+
+import cProfile
+import inspect
+import json
+import pstats
+import time
+
+import tour
+from toah_model import TOAHModel
+
+# (owner, attribute) pairs wrapped while an Instrumentation is enabled.
+HOT_PATHS = [(TOAHModel, 'move'),
+             (TOAHModel, 'add'),
+             (TOAHModel, '__str__'),
+             (TOAHModel, 'get_cheese_location'),
+             (tour, 'three_stool_moves'),
+             (tour, 'four_stool_moves'),
+             (tour, 'three_stool_solver'),
+             (tour, 'four_stool_solver'),
+             (tour, 'tour_of_four_stools')]
+
+
+def _path_name(owner, attribute):
+    """ Return the name statistics for attribute of owner are kept under.
+
+    @type owner: type | module
+    @type attribute: str
+    @rtype: str
+
+    >>> _path_name(TOAHModel, 'move')
+    'TOAHModel.move'
+    >>> _path_name(tour, 'four_stool_solver')
+    'tour.four_stool_solver'
+    """
+    return '{}.{}'.format(owner.__name__, attribute)
+
+
+class Instrumentation:
+    """ Counters and cumulative timers around the hot paths.
+
+    Recursive calls are all counted, but only the outermost call of a
+    recursion adds to the cumulative time, as with cProfile's cumtime.
+    The time of a generator runs from its first move to its last, so it
+    includes the time its caller spends on each move.
+
+    === Private Attributes ===
+    @param dict[str, list] _stats:
+        [calls, seconds, depth] for each hot path name
+    @param dict[str, tuple] _originals:
+        (owner, attribute, original function) of each wrapped hot path
+    @param function|None _collector:
+        called with (name, seconds) after every outermost call
+    @param cProfile.Profile|None _profiler:
+        profiler running while self is enabled
+    """
+
+    def __init__(self, collector=None, profile=False):
+        """ Create a new, disabled Instrumentation.
+
+        @type self: Instrumentation
+        @type collector: function | None
+            called with (name, seconds) after every outermost call of a
+            hot path, e.g. to stream timings elsewhere
+        @type profile: bool
+            also run a cProfile profiler while enabled
+        @rtype: None
+
+        >>> Instrumentation().is_enabled()
+        False
+        """
+        self._stats = {}
+        self._originals = {}
+        self._collector = collector
+        self._profiler = cProfile.Profile() if profile else None
+        self.reset()
+
+    def is_enabled(self):
+        """ Return whether the hot paths are currently wrapped by self.
+
+        @type self: Instrumentation
+        @rtype: bool
+        """
+        return len(self._originals) > 0
+
+    def enable(self):
+        """ Wrap every hot path with counters and timers.
+
+        @type self: Instrumentation
+        @rtype: None
+        """
+        if self.is_enabled():
+            return
+        for owner, attribute in HOT_PATHS:
+            name = _path_name(owner, attribute)
+            original = getattr(owner, attribute)
+            self._originals[name] = (owner, attribute, original)
+            setattr(owner, attribute, self._wrap(name, original))
+        if self._profiler is not None:
+            self._profiler.enable()
+
+    def disable(self):
+        """ Restore the original hot paths.
+
+        @type self: Instrumentation
+        @rtype: None
+        """
+        if self._profiler is not None:
+            self._profiler.disable()
+        for owner, attribute, original in self._originals.values():
+            setattr(owner, attribute, original)
+        self._originals = {}
+
+    def original(self, name):
+        """ Return the unwrapped function of the hot path called name.
+
+        @type self: Instrumentation
+        @type name: str
+        @rtype: function
+        """
+        if name in self._originals:
+            return self._originals[name][2]
+        for owner, attribute in HOT_PATHS:
+            if _path_name(owner, attribute) == name:
+                return getattr(owner, attribute)
+        raise KeyError(name)
+
+    def reset(self):
+        """ Zero every counter and timer.
+
+        @type self: Instrumentation
+        @rtype: None
+        """
+        self._stats = {_path_name(owner, attribute): [0, 0.0, 0]
+                       for owner, attribute in HOT_PATHS}
+
+    def _wrap(self, name, function):
+        """ Return function wrapped to update the statistics of name.
+
+        @type self: Instrumentation
+        @type name: str
+        @type function: function
+        @rtype: function
+        """
+        entry = self._stats[name]
+        collector = self._collector
+        clock = time.perf_counter
+
+        def enter():
+            entry[0] += 1
+            entry[2] += 1
+            return clock()
+
+        def leave(start):
+            entry[2] -= 1
+            if entry[2] == 0:
+                elapsed = clock() - start
+                entry[1] += elapsed
+                if collector is not None:
+                    collector(name, elapsed)
+
+        if inspect.isgeneratorfunction(function):
+            def wrapper(*args, **kwargs):
+                start = enter()
+                try:
+                    return (yield from function(*args, **kwargs))
+                finally:
+                    leave(start)
+        else:
+            def wrapper(*args, **kwargs):
+                start = enter()
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    leave(start)
+        wrapper.__name__ = function.__name__
+        wrapper.__doc__ = function.__doc__
+        wrapper.__wrapped__ = function
+        return wrapper
+
+    def stats(self):
+        """ Return the calls and cumulative seconds of every hot path.
+
+        @type self: Instrumentation
+        @rtype: dict[str, dict]
+
+        >>> Instrumentation().stats()['TOAHModel.add']
+        {'calls': 0, 'seconds': 0.0}
+        """
+        return {name: {'calls': entry[0], 'seconds': entry[1]}
+                for name, entry in self._stats.items()}
+
+    def to_json(self):
+        """ Return the statistics of self as a JSON document.
+
+        @type self: Instrumentation
+        @rtype: str
+        """
+        return json.dumps(self.stats(), indent=2, sort_keys=True)
+
+    def profile_stats(self):
+        """ Return the statistics collected by the cProfile profiler.
+
+        @type self: Instrumentation
+        @rtype: pstats.Stats
+        """
+        if self._profiler is None:
+            raise ValueError('Instrumentation was created without profile')
+        return pstats.Stats(self._profiler)
+
+    def __enter__(self):
+        """ Enable self for the duration of a with block.
+
+        @type self: Instrumentation
+        @rtype: Instrumentation
+        """
+        self.enable()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """ Disable self at the end of a with block.
+
+        @type self: Instrumentation
+        @rtype: bool
+        """
+        self.disable()
+        return False
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod(verbose=True)
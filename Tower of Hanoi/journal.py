@@ -0,0 +1,327 @@
+"""
+MoveJournal: Append-only write-ahead journal of the moves made in a
+TOAHModel, for recovering long games and tours after a crash.
+
+The journal is a sequence of frames, each a kind byte, a payload length,
+a CRC-32 of the payload and the payload:
+
+    B (batch)     moves packed one byte each as in toah_model.pack_moves,
+                  with the byte UNDO standing for an undo
+    S (snapshot)  moves made, stools, cheeses and one byte per cheese
+
+Moves are buffered and written a batch at a time with a single fsync
+(group commit). A snapshot frame is written every snapshot_interval moves,
+and the offset of the latest one is kept in a small checkpoint file next
+to the journal, so recover only reads that snapshot and the frames after
+it. A torn or corrupt frame at the end of the journal is discarded.
+"""
+
+import os
+import struct
+import zlib
+
+from toah_model import TOAHModel, MoveListener, MAX_PACKED_STOOLS
+
+FRAME = struct.Struct('<cII')
+SNAPSHOT = struct.Struct('<QHI')
+CHECKPOINT = struct.Struct('<Q')
+BATCH = b'B'
+SNAPSHOT_KIND = b'S'
+# A move from stool 0 onto itself is never legal, so its byte marks undos.
+UNDO = 0
+
+
+def checkpoint_path(path):
+    """ Return the path of the checkpoint file of the journal at path.
+
+    @type path: str
+    @rtype: str
+
+    >>> checkpoint_path('game.journal')
+    'game.journal.ckpt'
+    """
+    return path + '.ckpt'
+
+
+class MoveJournal(MoveListener):
+    """ MoveListener appending every move, undo and redo of a TOAHModel
+    to a journal file.
+
+    === Private Attributes ===
+    @param str _path:
+        path of the journal file
+    @param file _file:
+        the journal, open for appending
+    @param int _group_size:
+        most moves buffered before they are written and synced
+    @param int _snapshot_interval:
+        moves between two snapshot frames
+    @param bytearray _buffer:
+        moves not yet written
+    @param int _tail:
+        net number of moves made since the latest snapshot frame
+    @param int _since_snapshot:
+        moves and undos journaled since the latest snapshot frame
+    @param int _offset:
+        moves made before the first move in the model's own history
+    """
+
+    def __init__(self, path, group_size=256, snapshot_interval=65536,
+                 append=False):
+        """ Create a new MoveJournal writing to path.
+
+        The journal is started afresh, unless append is True, in which
+        case it should just have been passed to recover.
+
+        @type self: MoveJournal
+        @type path: str
+        @type group_size: int
+        @type snapshot_interval: int
+        @type append: bool
+        @rtype: None
+        """
+        self._path = path
+        self._file = open(path, 'ab' if append else 'wb')
+        self._group_size = group_size
+        self._snapshot_interval = snapshot_interval
+        self._buffer = bytearray()
+        self._tail = 0
+        self._since_snapshot = 0
+        self._offset = 0
+
+    def attach(self, model, offset=0):
+        """ Write a snapshot of model and journal its moves from now on.
+
+        offset is the number of moves made before the first move in the
+        history of model, as returned by recover.
+
+        @type self: MoveJournal
+        @type model: TOAHModel
+        @type offset: int
+        @rtype: None
+        """
+        self._offset = offset
+        if model.get_number_of_stools() > MAX_PACKED_STOOLS:
+            raise ValueError("only games with at most {} stools can be "
+                             "journaled".format(MAX_PACKED_STOOLS))
+        self.snapshot(model)
+        model.add_listener(self)
+
+    def on_move(self, model, source_stool, destination_stool):
+        """ Journal a move (or redo) made in model.
+
+        @type self: MoveJournal
+        @type model: TOAHModel
+        @type source_stool: int
+        @type destination_stool: int
+        @rtype: None
+        """
+        self._buffer.append(source_stool * MAX_PACKED_STOOLS +
+                            destination_stool)
+        self._tail += 1
+        self._moved(model)
+
+    def on_undo(self, model, source_stool, destination_stool):
+        """ Journal an undo in model.
+
+        An undo reaching back before the latest snapshot is journaled as
+        a new snapshot.
+
+        @type self: MoveJournal
+        @type model: TOAHModel
+        @type source_stool: int
+        @type destination_stool: int
+        @rtype: None
+        """
+        if self._tail == 0:
+            self.snapshot(model)
+            return
+        self._buffer.append(UNDO)
+        self._tail -= 1
+        self._moved(model)
+
+    def on_reset(self, model):
+        """ Journal a rearrangement of model as a snapshot.
+
+        @type self: MoveJournal
+        @type model: TOAHModel
+        @rtype: None
+        """
+        self.snapshot(model)
+
+    def _moved(self, model):
+        """ Write the buffered moves or a snapshot if it is time to.
+
+        @type self: MoveJournal
+        @type model: TOAHModel
+        @rtype: None
+        """
+        self._since_snapshot += 1
+        if self._since_snapshot >= self._snapshot_interval:
+            self.snapshot(model)
+        elif len(self._buffer) >= self._group_size:
+            self.commit()
+
+    def _write_frame(self, kind, payload):
+        """ Append a frame to the journal file, without syncing it.
+
+        @type self: MoveJournal
+        @type kind: bytes
+        @type payload: bytes
+        @rtype: None
+        """
+        self._file.write(FRAME.pack(kind, len(payload), zlib.crc32(payload)))
+        self._file.write(payload)
+
+    def commit(self):
+        """ Write the buffered moves and sync the journal to disk.
+
+        @type self: MoveJournal
+        @rtype: None
+        """
+        if self._buffer:
+            self._write_frame(BATCH, bytes(self._buffer))
+            self._buffer = bytearray()
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def snapshot(self, model):
+        """ Commit the buffered moves, then write and sync a snapshot of
+        model and point the checkpoint file at it.
+
+        @type self: MoveJournal
+        @type model: TOAHModel
+        @rtype: None
+        """
+        self.commit()
+        state = model.get_state()
+        moves_made = self._offset + model.number_of_moves()
+        offset = self._file.tell()
+        self._write_frame(SNAPSHOT_KIND,
+                          SNAPSHOT.pack(moves_made,
+                                        model.get_number_of_stools(),
+                                        len(state)) + bytes(state))
+        self.commit()
+        temporary = checkpoint_path(self._path) + '.tmp'
+        with open(temporary, 'wb') as checkpoint_file:
+            checkpoint_file.write(CHECKPOINT.pack(offset))
+            checkpoint_file.flush()
+            os.fsync(checkpoint_file.fileno())
+        os.replace(temporary, checkpoint_path(self._path))
+        self._tail = 0
+        self._since_snapshot = 0
+
+    def close(self):
+        """ Commit the buffered moves and close the journal.
+
+        @type self: MoveJournal
+        @rtype: None
+        """
+        self.commit()
+        self._file.close()
+
+
+def _read_frames(journal_file):
+    """ Generate the (kind, payload, end offset) of the frames of
+    journal_file from its current position, up to the end or the first
+    torn or corrupt frame.
+
+    @type journal_file: file
+    @rtype: generator[tuple]
+    """
+    while True:
+        header = journal_file.read(FRAME.size)
+        if len(header) < FRAME.size:
+            return
+        kind, length, crc = FRAME.unpack(header)
+        payload = journal_file.read(length)
+        if len(payload) < length or zlib.crc32(payload) != crc or \
+                kind not in (BATCH, SNAPSHOT_KIND):
+            return
+        yield kind, payload, journal_file.tell()
+
+
+def _latest_snapshot_offset(path, journal_file):
+    """ Return the offset of the latest snapshot frame of journal_file,
+    from the checkpoint file if it is usable, or else by scanning.
+
+    @type path: str
+    @type journal_file: file
+    @rtype: int | None
+    """
+    try:
+        with open(checkpoint_path(path), 'rb') as checkpoint_file:
+            offset, = CHECKPOINT.unpack(checkpoint_file.read())
+        journal_file.seek(offset)
+        for kind, _, _ in _read_frames(journal_file):
+            if kind == SNAPSHOT_KIND:
+                return offset
+            break
+    except (OSError, struct.error):
+        pass
+    latest = None
+    journal_file.seek(0)
+    offset = 0
+    for kind, _, end in _read_frames(journal_file):
+        if kind == SNAPSHOT_KIND:
+            latest = offset
+        offset = end
+    return latest
+
+
+def recover(path):
+    """ Return the TOAHModel in the last consistent state journaled at
+    path, together with its offset: the number of moves made before the
+    first move in its history.
+
+    The model's own history only holds the moves made after the latest
+    snapshot, so the number of moves made to reach its state is the
+    offset plus model.number_of_moves(). The journal is truncated after
+    its last valid frame, so that a MoveJournal can carry on appending
+    to it with attach(model, offset).
+
+    @type path: str
+    @rtype: tuple[TOAHModel, int]
+
+    >>> import os, tempfile
+    >>> path = os.path.join(tempfile.mkdtemp(), 'game.journal')
+    >>> M = TOAHModel(3)
+    >>> M.fill_first_stool(3)
+    >>> journal = MoveJournal(path, snapshot_interval=2)
+    >>> journal.attach(M)
+    >>> for move in [(0, 2), (0, 1), (2, 1)]:
+    ...     M.move(move[0], move[1])
+    >>> M.undo()
+    >>> journal.close()
+    >>> recovered, offset = recover(path)
+    >>> recovered == M, offset + recovered.number_of_moves()
+    (True, 2)
+    """
+    with open(path, 'rb') as journal_file:
+        offset = _latest_snapshot_offset(path, journal_file)
+        if offset is None:
+            raise ValueError("the journal has no snapshot")
+        journal_file.seek(offset)
+        model = None
+        moves_made = end = 0
+        for kind, payload, frame_end in _read_frames(journal_file):
+            if kind == SNAPSHOT_KIND:
+                moves_made, number_of_stools, number_of_cheeses = \
+                    SNAPSHOT.unpack_from(payload)
+                model = TOAHModel(number_of_stools)
+                model.fill_first_stool(number_of_cheeses)
+                model.set_state(tuple(payload[SNAPSHOT.size:]))
+            else:
+                for byte in payload:
+                    if byte == UNDO:
+                        model.undo()
+                    else:
+                        model.move(*divmod(byte, MAX_PACKED_STOOLS))
+            end = frame_end
+    os.truncate(path, end)
+    return model, moves_made
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod(verbose=True)
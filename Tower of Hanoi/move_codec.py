@@ -0,0 +1,493 @@
+"""
+Compressed encoding of move sequences exploiting the structure of tours.
+
+An encoding is the magic bytes MAGIC followed by tokens:
+
+    LITERAL  count, then count moves packed as in toah_model.pack_moves
+    ZLITERAL count and size, then size bytes of count packed moves
+             compressed with zlib
+    TOUR3    k and stools (source, spare, destination): the moves of
+             tour.three_stool_moves(k, source, spare, destination)
+    TOUR4    k and stools (source, stool1, stool2, destination): the moves
+             of tour.four_stool_moves(k, source, stool1, stool2,
+             destination)
+
+with counts and k written as unsigned LEB128 varints. The encoder looks
+for the longest tour of either kind starting at each move, under any
+relabelling of the stools, so that whole tours compress to a few bytes,
+and stores the moves in between as literals, compressed when that pays
+off.
+
+Both directions stream. The tour of k cheeses starts with a relabelled
+tour of fewer cheeses, so the encoder only looks a few moves ahead for
+the shortest tour worth a token, then extends it one tour at a time by
+comparing the moves read, a block at a time, with the packed blocks of
+tour.tour_blocks that the longer tour would make. The moves read while an
+extension fails are those of the longer tour, so they are generated again
+rather than kept. Literals are written every
+LITERAL_MOVES moves. Decoding expands tours lazily and reads and
+decompresses literals in chunks.
+"""
+
+import io
+import zlib
+from collections import deque
+from itertools import chain, islice
+
+from toah_model import pack_moves, unpack_moves
+from tour import three_stool_moves, four_stool_moves, tour_length, \
+    tour_blocks
+
+MAGIC = b'TOMC'
+LITERAL = 0
+TOUR3 = 1
+TOUR4 = 2
+ZLITERAL = 3
+# Tours shorter than this are cheaper to store as literal moves.
+MIN_TOUR_MOVES = 7
+# Literal runs shorter than this are not worth compressing.
+MIN_ZLITERAL_MOVES = 64
+# Most moves of a literal token written by the encoder.
+LITERAL_MOVES = 64 * 1024
+READ_SIZE = 64 * 1024
+
+
+def _write_varint(out, value):
+    """ Append value to out as an unsigned LEB128 varint.
+
+    @type out: bytearray
+    @type value: int
+    @rtype: None
+
+    >>> out = bytearray()
+    >>> _write_varint(out, 300)
+    >>> bytes(out)
+    b'\\xac\\x02'
+    """
+    while value >= 0x80:
+        out.append(value & 0x7f | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_varint(stream):
+    """ Read an unsigned LEB128 varint from stream.
+
+    @type stream: file
+    @rtype: int
+
+    >>> _read_varint(io.BytesIO(b'\\xac\\x02'))
+    300
+    """
+    value = 0
+    shift = 0
+    while True:
+        byte = stream.read(1)
+        if not byte:
+            raise ValueError("truncated move encoding")
+        value |= (byte[0] & 0x7f) << shift
+        if byte[0] < 0x80:
+            return value
+        shift += 7
+
+
+def _match(canonical, roles, moves, start, number_of_stools):
+    """ Return the stools standing for roles 0 to roles - 1 of the
+    canonical moves so that they are exactly the moves from start in
+    moves, or None if there is no such relabelling, together with the
+    number of canonical moves matched before telling.
+
+    @type canonical: iterable[tuple[int]]
+        moves of a tour between stools labelled by role
+    @type roles: int
+    @type moves: list[tuple[int]]
+    @type start: int
+    @type number_of_stools: int
+    @rtype: tuple[list[int] | None, int]
+
+    >>> _match([(0, 1), (0, 2), (1, 2)], 3, [(2, 0), (2, 1), (0, 1)], 0, 3)
+    ([2, 0, 1], 3)
+    >>> _match([(0, 1), (0, 2), (1, 2)], 3, [(2, 0), (2, 1), (1, 0)], 0, 3)
+    (None, 2)
+    >>> _match([(0, 2)], 3, [(1, 0)], 0, 3)
+    ([1, 2, 0], 1)
+    """
+    stools = [None] * roles
+    used = set()
+    index = start
+    for move in canonical:
+        if index >= len(moves):
+            return None, index - start
+        for role, stool in zip(move, moves[index]):
+            if stools[role] is None and stool not in used:
+                stools[role] = stool
+                used.add(stool)
+            elif stools[role] != stool:
+                return None, index - start
+        index += 1
+    free = [stool for stool in range(number_of_stools) if stool not in used]
+    for role in range(roles):
+        if stools[role] is None:
+            if not free:
+                return None, index - start
+            stools[role] = free.pop(0)
+    return stools, index - start
+
+
+class _Lookahead:
+    """ Moves read from an iterator, which can be looked ahead at and put
+    back.
+
+    === Private Attributes ===
+    @param collections.deque _ahead:
+        moves looked ahead at, which come first
+    @param list[iterator] _sources:
+        iterators of the moves after those, the last one first
+    """
+
+    def __init__(self, moves):
+        """ Create a new _Lookahead at the start of moves.
+
+        @type self: _Lookahead
+        @type moves: iterable[tuple[int]]
+        @rtype: None
+        """
+        self._ahead = deque()
+        self._sources = [iter(moves)]
+
+    def _pull(self):
+        """ Return the next move from the sources, or None at the end.
+
+        @type self: _Lookahead
+        @rtype: tuple[int] | None
+        """
+        while self._sources:
+            move = next(self._sources[-1], None)
+            if move is not None:
+                return tuple(move)
+            self._sources.pop()
+        return None
+
+    def peek(self, count):
+        """ Return the next count moves, or fewer at the end.
+
+        @type self: _Lookahead
+        @type count: int
+        @rtype: list[tuple[int]]
+
+        >>> moves = _Lookahead([(0, 1), (1, 2)])
+        >>> moves.peek(3), moves.next(), moves.peek(3)
+        ([(0, 1), (1, 2)], (0, 1), [(1, 2)])
+        """
+        while len(self._ahead) < count:
+            move = self._pull()
+            if move is None:
+                break
+            self._ahead.append(move)
+        return list(islice(self._ahead, count))
+
+    def next(self):
+        """ Return and consume the next move, or None at the end.
+
+        @type self: _Lookahead
+        @rtype: tuple[int] | None
+        """
+        if self._ahead:
+            return self._ahead.popleft()
+        return self._pull()
+
+    def take(self, count):
+        """ Return and consume the next count moves, or fewer at the end.
+
+        @type self: _Lookahead
+        @type count: int
+        @rtype: list[tuple[int]]
+
+        >>> moves = _Lookahead([(0, 1), (1, 2), (2, 0)])
+        >>> moves.peek(1), moves.take(2), moves.take(2)
+        ([(0, 1)], [(0, 1), (1, 2)], [(2, 0)])
+        """
+        taken = []
+        while self._ahead and len(taken) < count:
+            taken.append(self._ahead.popleft())
+        while self._sources and len(taken) < count:
+            before = len(taken)
+            taken.extend(islice(self._sources[-1], count - len(taken)))
+            if len(taken) - before < count - before:
+                self._sources.pop()
+        return taken
+
+    def put_back(self, moves):
+        """ Make moves, an iterator, the next moves.
+
+        @type self: _Lookahead
+        @type moves: iterator[tuple[int]]
+        @rtype: None
+
+        >>> moves = _Lookahead([(0, 1)])
+        >>> moves.put_back(iter([(1, 2)]))
+        >>> moves.next(), moves.next(), moves.next()
+        ((1, 2), (0, 1), None)
+        """
+        if self._ahead:
+            self._sources.append(iter(self._ahead))
+            self._ahead = deque()
+        self._sources.append(moves)
+
+
+def _tour_kinds(number_of_stools):
+    """ Return (kind, roles, step, bases) for each kind of tour usable
+    with number_of_stools, where bases maps the cheeses of each shortest
+    tour worth a token, one per residue of the cheeses modulo step, to
+    its moves.
+
+    Every longer tour of the kind starts with one of the bases,
+    relabelled, and is reached by extending it step cheeses at a time.
+
+    @type number_of_stools: int
+    @rtype: list[tuple]
+
+    >>> [sorted(kind[3]) for kind in _tour_kinds(4)]
+    [[3], [4, 5, 6]]
+    """
+    kinds = [(TOUR3, 3, 1, three_stool_moves)]
+    if number_of_stools >= 4:
+        kinds.append((TOUR4, 4, 3, four_stool_moves))
+    tables = []
+    for kind, roles, step, moves_of in kinds:
+        k = 1
+        while tour_length(k, roles) < MIN_TOUR_MOVES:
+            k += 1
+        bases = {base: list(moves_of(base, *range(roles)))
+                 for base in range(k, k + step)}
+        tables.append((kind, roles, step, bases))
+    return tables
+
+
+def _extension(kind, k, stools):
+    """ Return the stools of the next longer tour of kind that starts
+    with the tour of k cheeses between stools, and the moves that follow
+    that start, packed in blocks as by tour.tour_blocks.
+
+    The three stool tour of k + 1 cheeses from s to d is the tour of k
+    cheeses from s to the spare b, the move (s, d) and the tour of k
+    cheeses from b to d; the four stool tour of k + 3 cheeses wraps the
+    three stool tour of 3 cheeses in tours of k cheeses likewise.
+
+    @type kind: int
+    @type k: int
+    @type stools: list[int]
+    @rtype: tuple[list[int], iterator[bytes]]
+
+    >>> stools, rest = _extension(TOUR3, 1, [0, 2, 1])
+    >>> stools, list(unpack_moves(b''.join(rest)))
+    ([0, 1, 2], [(0, 2), (1, 2)])
+    """
+    if kind == TOUR3:
+        source, destination, spare = stools
+        return [source, spare, destination], chain(
+            [pack_moves([(source, destination)])],
+            tour_blocks(k, (spare, source, destination)))
+    source, stool2, destination, stool1 = stools
+    return [source, stool1, stool2, destination], chain(
+        tour_blocks(3, (source, stool2, destination)),
+        tour_blocks(k, (stool1, stool2, source, destination)))
+
+
+def _base_tour(moves, number_of_stools, kinds):
+    """ Return the token (kind, k, stools) of the longest base tour of
+    kinds that the moves ahead start with, or None.
+
+    @type moves: _Lookahead
+    @type number_of_stools: int
+    @type kinds: list[tuple]
+        as returned by _tour_kinds
+    @rtype: tuple | None
+
+    >>> from tour import three_stool_moves
+    >>> moves = _Lookahead(list(three_stool_moves(3, 2, 0, 1)))
+    >>> _base_tour(moves, 3, _tour_kinds(3))
+    (1, 3, [2, 0, 1])
+    """
+    ahead = moves.peek(max(len(base) for kind in kinds
+                           for base in kind[3].values()))
+    best = None
+    best_length = 0
+    for kind, roles, _, bases in kinds:
+        for k, base in bases.items():
+            if best_length < len(base) <= len(ahead):
+                stools, _ = _match(base, roles, ahead, 0, number_of_stools)
+                if stools is not None:
+                    best = (kind, k, stools)
+                    best_length = len(base)
+    return best
+
+
+def _longest_tour(moves, number_of_stools, kinds):
+    """ Consume the longest tour of at least MIN_TOUR_MOVES moves that the
+    moves ahead start with and return its token (kind, k, stools), or
+    return None and consume nothing.
+
+    @type moves: _Lookahead
+    @type number_of_stools: int
+    @type kinds: list[tuple]
+        as returned by _tour_kinds
+    @rtype: tuple | None
+
+    >>> from tour import three_stool_moves
+    >>> moves = _Lookahead(list(three_stool_moves(5, 0, 1, 2)) + [(0, 1)])
+    >>> _longest_tour(moves, 3, _tour_kinds(3)), moves.next()
+    ((1, 5, [0, 1, 2]), (0, 1))
+    """
+    token = _base_tour(moves, number_of_stools, kinds)
+    if token is None:
+        return None
+    kind, k, stools = token
+    step = 1 if kind == TOUR3 else 3
+    moves.take(tour_length(k, 3 if kind == TOUR3 else 4))
+    while True:
+        longer, rest = _extension(kind, k, stools)
+        matched = 0
+        for expected in rest:
+            taken = moves.take(len(expected))
+            packed = pack_moves(taken)
+            if packed != expected:
+                index = 0
+                while index < len(packed) and packed[index] == expected[index]:
+                    index += 1
+                _, rest = _extension(kind, k, stools)
+                again = chain.from_iterable(map(unpack_moves, rest))
+                moves.put_back(chain(islice(again, matched + index),
+                                     taken[index:]))
+                return kind, k, stools
+            matched += len(expected)
+        k += step
+        stools = longer
+
+
+def encode_moves(moves, number_of_stools):
+    """ Return the compressed encoding of moves, read one at a time.
+
+    @type moves: iterable[tuple[int]]
+    @type number_of_stools: int
+    @rtype: bytes
+
+    >>> from tour import solve_moves
+    >>> len(encode_moves(solve_moves(16, 3), 3))
+    9
+    >>> moves = [(0, 1), (1, 2)] + list(solve_moves(10, 4))
+    >>> data = encode_moves(moves, 4)
+    >>> len(data), list(decode_moves(data)) == moves
+    (14, True)
+    """
+    kinds = _tour_kinds(number_of_stools)
+    moves = _Lookahead(moves)
+    out = bytearray(MAGIC)
+    literal = []
+    while True:
+        token = _longest_tour(moves, number_of_stools, kinds)
+        if token is None:
+            move = moves.next()
+            if move is None:
+                break
+            literal.append(move)
+            if len(literal) == LITERAL_MOVES:
+                _write_literal(out, literal)
+                literal = []
+            continue
+        _write_literal(out, literal)
+        literal = []
+        kind, k, stools = token
+        out.append(kind)
+        _write_varint(out, k)
+        out.extend(stools)
+    _write_literal(out, literal)
+    return bytes(out)
+
+
+def _write_literal(out, moves):
+    """ Append a LITERAL or ZLITERAL token of moves to out, whichever is
+    shorter, if there are any moves.
+
+    @type out: bytearray
+    @type moves: list[tuple[int]]
+    @rtype: None
+    """
+    if not moves:
+        return
+    packed = pack_moves(moves)
+    if len(moves) >= MIN_ZLITERAL_MOVES:
+        compressed = zlib.compress(packed, 9)
+        if len(compressed) < len(packed):
+            out.append(ZLITERAL)
+            _write_varint(out, len(moves))
+            _write_varint(out, len(compressed))
+            out.extend(compressed)
+            return
+    out.append(LITERAL)
+    _write_varint(out, len(moves))
+    out.extend(packed)
+
+
+def _read_zliteral(stream, size):
+    """ Generate the moves of a ZLITERAL token of size compressed bytes,
+    decompressing at most READ_SIZE moves at a time.
+
+    @type stream: file
+    @type size: int
+    @rtype: generator[tuple[int]]
+    """
+    decompressor = zlib.decompressobj()
+    while size > 0:
+        chunk = stream.read(min(size, READ_SIZE))
+        if not chunk:
+            raise ValueError("truncated move encoding")
+        size -= len(chunk)
+        while chunk:
+            yield from unpack_moves(decompressor.decompress(chunk, READ_SIZE))
+            chunk = decompressor.unconsumed_tail
+    yield from unpack_moves(decompressor.flush())
+
+
+def decode_moves(data):
+    """ Generate the moves encoded in data, which may be bytes or a
+    binary file positioned at the start of an encoding.
+
+    @type data: bytes | file
+    @rtype: generator[tuple[int]]
+
+    >>> list(decode_moves(encode_moves([(0, 1), (1, 0)], 2)))
+    [(0, 1), (1, 0)]
+    """
+    stream = io.BytesIO(data) if isinstance(data, (bytes, bytearray)) \
+        else data
+    if stream.read(len(MAGIC)) != MAGIC:
+        raise ValueError("not a move encoding")
+    while True:
+        kind = stream.read(1)
+        if not kind:
+            return
+        if kind[0] == LITERAL:
+            count = _read_varint(stream)
+            while count > 0:
+                chunk = stream.read(min(count, READ_SIZE))
+                if not chunk:
+                    raise ValueError("truncated move encoding")
+                count -= len(chunk)
+                yield from unpack_moves(chunk)
+        elif kind[0] == ZLITERAL:
+            _read_varint(stream)
+            yield from _read_zliteral(stream, _read_varint(stream))
+        elif kind[0] == TOUR3:
+            k = _read_varint(stream)
+            yield from three_stool_moves(k, *stream.read(3))
+        elif kind[0] == TOUR4:
+            k = _read_varint(stream)
+            yield from four_stool_moves(k, *stream.read(4))
+        else:
+            raise ValueError("unknown token in move encoding")
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod(verbose=True)
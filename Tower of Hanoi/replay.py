@@ -0,0 +1,210 @@
+"""
+ReplayCursor: Seekable position within a recorded MoveSequence.
+
+read_replay opens a move script, as written for
+console_controller.py --script, for replay. Both controllers scrub
+through one with
+
+    python3 console_controller.py --replay FILE
+    python3 gui_controller.py --replay FILE
+"""
+
+from math import isqrt
+
+from console_controller import read_script_header, parse_move_script
+from toah_model import TOAHModel
+
+
+class ReplayCursor:
+    """ A position within a recorded MoveSequence that can be moved back
+    and forth, with a TOAHModel showing the game at that position.
+
+    A checkpoint of the model state is kept every interval moves (about
+    the square root of the number of moves by default), so any seek
+    applies at most interval moves while keeping only
+    length / interval checkpoints. Checkpoints are taken the first time
+    the cursor passes them.
+
+    === Private Attributes ===
+    @param MoveSequence _move_seq:
+        the recorded moves
+    @param int _interval:
+        number of moves between two checkpoints
+    @param list[tuple[int]] _checkpoints:
+        state of the model after 0, interval, 2 * interval, ... moves
+    @param int _position:
+        number of recorded moves applied to the model
+    @param TOAHModel _model:
+        the game after the first _position recorded moves; its own move
+        history only goes back to the last checkpoint passed
+    """
+
+    def __init__(self, move_seq, number_of_stools, number_of_cheeses,
+                 interval=None):
+        """ Create a new ReplayCursor at the start of move_seq.
+
+        @type self: ReplayCursor
+        @type move_seq: MoveSequence
+        @type number_of_stools: int
+        @type number_of_cheeses: int
+        @type interval: int | None
+            number of moves between two checkpoints, by default the
+            square root of the number of moves
+        @rtype: None
+
+        >>> from toah_model import MoveSequence
+        >>> cursor = ReplayCursor(MoveSequence([(0, 1)]), 3, 2)
+        >>> cursor.position(), cursor.length()
+        (0, 1)
+        """
+        self._move_seq = move_seq
+        if interval is None:
+            interval = max(1, isqrt(move_seq.length()))
+        self._interval = interval
+        self._model = TOAHModel(number_of_stools)
+        self._model.fill_first_stool(number_of_cheeses)
+        self._checkpoints = [self._model.get_state()]
+        self._position = 0
+
+    def get_model(self):
+        """ Return the TOAHModel showing the game at the cursor.
+
+        Listeners added to this model are told about every step, back
+        and seek of the cursor.
+
+        @type self: ReplayCursor
+        @rtype: TOAHModel
+        """
+        return self._model
+
+    def position(self):
+        """ Return the number of recorded moves before the cursor.
+
+        @type self: ReplayCursor
+        @rtype: int
+        """
+        return self._position
+
+    def length(self):
+        """ Return the number of recorded moves.
+
+        @type self: ReplayCursor
+        @rtype: int
+        """
+        return self._move_seq.length()
+
+    def step(self):
+        """ Apply the recorded move after the cursor.
+
+        Raises IndexError at the end of the recording, and IllegalMoveError
+        if the recorded move is not legal.
+
+        @type self: ReplayCursor
+        @rtype: None
+
+        >>> from toah_model import MoveSequence
+        >>> cursor = ReplayCursor(MoveSequence([(0, 1), (0, 2)]), 3, 2)
+        >>> cursor.step()
+        >>> cursor.position(), cursor.get_model().get_state()
+        (1, (1, 0))
+        """
+        if self._position >= self.length():
+            raise IndexError("end of the recorded moves")
+        move = self._move_seq.get_move(self._position)
+        self._model.move(move[0], move[1])
+        self._position += 1
+        if self._position % self._interval == 0:
+            self._model.clear_history()
+            if self._position // self._interval == len(self._checkpoints):
+                self._checkpoints.append(self._model.get_state())
+
+    def back(self):
+        """ Take back the recorded move before the cursor.
+
+        Raises IndexError at the start of the recording.
+
+        @type self: ReplayCursor
+        @rtype: None
+
+        >>> from toah_model import MoveSequence
+        >>> cursor = ReplayCursor(MoveSequence([(0, 1), (0, 2)]), 3, 2, 1)
+        >>> cursor.seek(2)
+        >>> cursor.back()
+        >>> cursor.position(), cursor.get_model().get_state()
+        (1, (1, 0))
+        """
+        if self._position == 0:
+            raise IndexError("start of the recorded moves")
+        if self._model.can_undo():
+            self._model.undo()
+            self._position -= 1
+        else:
+            self.seek(self._position - 1)
+
+    def seek(self, index):
+        """ Move the cursor so that exactly index recorded moves have been
+        applied.
+
+        @type self: ReplayCursor
+        @type index: int
+        @rtype: None
+
+        >>> from toah_model import MoveSequence
+        >>> moves = MoveSequence([(0, 2), (0, 1), (2, 1), (0, 2)])
+        >>> cursor = ReplayCursor(moves, 3, 3)
+        >>> cursor.seek(4)
+        >>> cursor.get_model().get_state()
+        (1, 1, 2)
+        >>> cursor.seek(1)
+        >>> cursor.get_model().get_state()
+        (2, 0, 0)
+        """
+        if not 0 <= index <= self.length():
+            raise IndexError("move index out of range")
+        checkpoint = min(index // self._interval, len(self._checkpoints) - 1)
+        checkpoint_index = checkpoint * self._interval
+        if not checkpoint_index <= self._position <= index:
+            self._model.set_state(self._checkpoints[checkpoint])
+            self._position = checkpoint_index
+        while self._position < index:
+            self.step()
+
+
+def read_replay(text):
+    """ Return a ReplayCursor at the start of the game recorded by the
+    move script text, which must have a "# toah stools=K cheeses=N"
+    header.
+
+    Undo and redo lines of the script are applied, so the recording is
+    of the moves left in the end. Raises ValueError if the script cannot
+    be read, and IllegalMoveError if one of its moves is illegal.
+
+    @type text: str
+    @rtype: ReplayCursor
+
+    >>> script = '# toah stools=3 cheeses=2\\n1 2\\n2 3\\nu\\n1 3\\n'
+    >>> cursor = read_replay(script)
+    >>> cursor.length(), cursor.get_model().get_number_of_cheeses()
+    (2, 2)
+    """
+    header = read_script_header(text)
+    if header is None:
+        raise ValueError('the script has no "# toah stools=K cheeses=N"'
+                         ' header')
+    number_of_stools, number_of_cheeses = header
+    model = TOAHModel(number_of_stools)
+    model.fill_first_stool(number_of_cheeses)
+    for move in parse_move_script(text, number_of_stools):
+        if move == 'u':
+            model.undo()
+        elif move == 'r':
+            model.redo()
+        else:
+            model.move(move[0], move[1])
+    return ReplayCursor(model.get_move_seq(), number_of_stools,
+                        number_of_cheeses)
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod(verbose=True)
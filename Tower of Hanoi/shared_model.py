@@ -0,0 +1,459 @@
+"""
+SharedTOAHModel: a Tour of Anne Hoy game whose state is a few bytes of
+memory shared between processes, and SharedPositions: a block of such
+states in multiprocessing.shared_memory.
+
+A SharedTOAHModel keeps nothing but one byte per cheese, the stool of
+each cheese from the smallest to the largest as in TOAHModel.get_state,
+in a buffer it does not own, and makes its moves there in place. Its move
+history stays in the process making the moves.
+
+A coordinator puts a position in a slot of a SharedPositions and starts
+workers that attach to the block once by its name. A task is then a
+few integers, such as a move and a depth, and a worker reads the
+position with no copy: parallel_perft copies the root into the slot of
+each worker and counts the subtree under a root move in place there.
+
+Unlike concurrent_model.SharedBoard, which keeps its game in
+SharedPositions too and moves with move_cheese under per-stool locks, a
+slot has no locks, so each slot should only be moved on by one process
+at a time.
+"""
+
+from toah_model import TOAHModel, Cheese, IllegalMoveError
+
+# The SharedPositions and slot of this worker process, once attached.
+_worker = None
+
+
+def move_cheese(state, stools, source_stool, destination_stool):
+    """ Move the top cheese of source_stool onto destination_stool in
+    state, the stool of each cheese from the smallest to the largest.
+
+    Raises IllegalMoveError as TOAHModel.move if the move is not valid,
+    and IndexError if a stool is not in stools.
+
+    @type state: memoryview | bytearray
+    @type stools: range
+        the stool indices, which turns negative ones into these
+    @type source_stool: int
+    @type destination_stool: int
+    @rtype: None
+
+    >>> state = bytearray(2)
+    >>> move_cheese(state, range(3), 0, -1)
+    >>> try:
+    ...     move_cheese(state, range(3), 0, 2)
+    ... except IllegalMoveError as e:
+    ...     print(e)
+    Cant move the cheese there!
+    >>> tuple(state)
+    (2, 0)
+    """
+    source = stools[source_stool]
+    destination = stools[destination_stool]
+    positions = bytes(state)
+    cheese = positions.find(source)
+    if cheese < 0:
+        raise IllegalMoveError("Selected stool has no cheese!")
+    top = positions.find(destination)
+    if 0 <= top <= cheese:
+        raise IllegalMoveError("Cant move the cheese there!")
+    state[cheese] = destination
+
+
+class SharedTOAHModel:
+    """ A game stored as the stool of each cheese in a writable buffer,
+    with the moves and queries of a TOAHModel.
+
+    === Private Attributes ===
+    @param memoryview _state:
+        stool of each cheese, from the smallest to the largest
+    @param int _number_of_stools:
+        stools in the game
+    @param range _stools:
+        the stool indices, which also turns negative ones into these and
+        raises IndexError for others, as the stool list of a TOAHModel
+    @param list[tuple[int]] _history:
+        moves made through this object, for undo
+    """
+
+    def __init__(self, buffer, number_of_stools):
+        """ Create a new SharedTOAHModel playing on the game in buffer.
+
+        @type self: SharedTOAHModel
+        @type buffer: memoryview | bytearray
+        @type number_of_stools: int
+        @rtype: None
+
+        >>> M = SharedTOAHModel(bytearray(3), 3)
+        >>> M.move(0, 2)
+        >>> M.get_state(), M.get_top_cheese(0).size
+        ((2, 0, 0), 2)
+        """
+        self._state = memoryview(buffer)
+        self._number_of_stools = number_of_stools
+        self._stools = range(number_of_stools)
+        self._history = []
+
+    def get_number_of_stools(self):
+        """ Return the number of stools.
+
+        @type self: SharedTOAHModel
+        @rtype: int
+        """
+        return self._number_of_stools
+
+    def get_number_of_cheeses(self):
+        """ Return the number of cheeses.
+
+        @type self: SharedTOAHModel
+        @rtype: int
+        """
+        return len(self._state)
+
+    def get_state(self):
+        """ Return the stool of every cheese, from the smallest to the
+        largest.
+
+        @type self: SharedTOAHModel
+        @rtype: tuple[int]
+        """
+        return tuple(self._state)
+
+    def set_state(self, state):
+        """ Put the ith smallest cheese on stool state[i], keeping the
+        move history.
+
+        @type self: SharedTOAHModel
+        @type state: tuple[int]
+        @rtype: None
+        """
+        self._state[:] = bytes(state)
+
+    def get_top_cheese(self, stool_index):
+        """ Return the cheese on top of stool_index, or None.
+
+        @type self: SharedTOAHModel
+        @type stool_index: int
+        @rtype: Cheese | None
+        """
+        cheese = self._state.tobytes().find(self._stools[stool_index])
+        return None if cheese < 0 else Cheese(cheese + 1)
+
+    def is_solved(self):
+        """ Return whether every cheese is on the last stool.
+
+        @type self: SharedTOAHModel
+        @rtype: bool
+        """
+        return self._state.tobytes().count(self._number_of_stools - 1) == \
+            len(self._state)
+
+    def move(self, source_stool, destination_stool):
+        """ Move the top cheese from source_stool onto destination_stool.
+
+        Raises IllegalMoveError as TOAHModel.move if the move is not
+        valid.
+
+        @type self: SharedTOAHModel
+        @type source_stool: int
+        @type destination_stool: int
+        @rtype: None
+
+        >>> M = SharedTOAHModel(bytearray(2), 3)
+        >>> try:
+        ...     M.move(1, 2)
+        ... except IllegalMoveError as e:
+        ...     print(e)
+        Selected stool has no cheese!
+        """
+        move_cheese(self._state, self._stools, source_stool, destination_stool)
+        self._history.append((source_stool, destination_stool))
+
+    def legal_moves(self):
+        """ Return every legal move.
+
+        @type self: SharedTOAHModel
+        @rtype: list[tuple[int]]
+
+        >>> SharedTOAHModel(bytearray(2), 3).legal_moves()
+        [(0, 1), (0, 2)]
+        """
+        state = self._state.tobytes()
+        tops = [state.find(stool) for stool in range(self._number_of_stools)]
+        return [(source, destination)
+                for source in range(self._number_of_stools)
+                if tops[source] >= 0
+                for destination in range(self._number_of_stools)
+                if tops[destination] < 0 or tops[destination] > tops[source]]
+
+    def number_of_moves(self):
+        """ Return the number of moves made through this object and not
+        undone.
+
+        @type self: SharedTOAHModel
+        @rtype: int
+        """
+        return len(self._history)
+
+    def can_undo(self):
+        """ Return whether there is a move that undo can take back.
+
+        @type self: SharedTOAHModel
+        @rtype: bool
+        """
+        return len(self._history) > 0
+
+    def undo(self):
+        """ Take back the last move made through this object.
+
+        Raises IllegalMoveError if there is no move to take back.
+
+        @type self: SharedTOAHModel
+        @rtype: None
+        """
+        if not self._history:
+            raise IllegalMoveError("There is no move to undo!")
+        source_stool, destination_stool = self._history.pop()
+        cheese = self._state.tobytes().find(self._stools[destination_stool])
+        self._state[cheese] = self._stools[source_stool]
+
+    def to_model(self):
+        """ Return a TOAHModel of the current position, with no moves.
+
+        @type self: SharedTOAHModel
+        @rtype: TOAHModel
+        """
+        model = TOAHModel(self._number_of_stools)
+        model.fill_first_stool(len(self._state))
+        model.set_state(self.get_state())
+        return model
+
+    def release(self):
+        """ Release the buffer of this game, which cannot be played on
+        afterwards.
+
+        @type self: SharedTOAHModel
+        @rtype: None
+
+        >>> M = SharedTOAHModel(bytearray(3), 3)
+        >>> M.release()
+        >>> try:
+        ...     M.move(0, 1)
+        ... except ValueError as e:
+        ...     print(e)
+        operation forbidden on released memoryview object
+        """
+        self._state.release()
+
+    def __str__(self):
+        """ Depict the stools and cheeses as str(TOAHModel) does.
+
+        @type self: SharedTOAHModel
+        @rtype: str
+        """
+        return str(self.to_model())
+
+
+class SharedPositions:
+    """ Slots of shared memory, each holding the state of a game with the
+    same stools and cheeses.
+
+    === Attributes ===
+    @param int number_of_stools: stools in each game
+    @param int number_of_cheeses: cheeses in each game
+    @param int slots: number of games held
+
+    === Private Attributes ===
+    @param multiprocessing.shared_memory.SharedMemory _memory:
+        the slots, one after the other
+    @param bool _owner:
+        whether this process created the memory and should free it
+    """
+
+    def __init__(self, number_of_stools, number_of_cheeses, slots=1,
+                 name=None):
+        """ Create new SharedPositions with every cheese on the first
+        stool in every slot, or attach to the existing block called name.
+
+        @type self: SharedPositions
+        @type number_of_stools: int
+        @type number_of_cheeses: int
+        @type slots: int
+        @type name: str | None
+        @rtype: None
+        """
+        from multiprocessing import shared_memory
+        if not 0 < number_of_stools <= 256:
+            raise ValueError("shared positions hold 1 to 256 stools")
+        self.number_of_stools = number_of_stools
+        self.number_of_cheeses = number_of_cheeses
+        self.slots = slots
+        self._owner = name is None
+        if name is None:
+            self._memory = shared_memory.SharedMemory(
+                create=True, size=max(1, slots * number_of_cheeses))
+            self._memory.buf[:slots * number_of_cheeses] = \
+                bytes(slots * number_of_cheeses)
+        else:
+            self._memory = shared_memory.SharedMemory(name)
+
+    def handle(self):
+        """ Return what another process needs to attach to these
+        positions, as SharedPositions(*handle).
+
+        @type self: SharedPositions
+        @rtype: tuple
+        """
+        return (self.number_of_stools, self.number_of_cheeses, self.slots,
+                self._memory.name)
+
+    def buffer(self, slot):
+        """ Return the memory of the game in slot, the stool of each cheese
+        from the smallest to the largest.
+
+        @type self: SharedPositions
+        @type slot: int
+        @rtype: memoryview
+        """
+        if not 0 <= slot < self.slots:
+            raise IndexError("slot out of range")
+        start = slot * self.number_of_cheeses
+        return self._memory.buf[start:start + self.number_of_cheeses]
+
+    def model(self, slot):
+        """ Return a SharedTOAHModel playing in place on the game in slot.
+
+        @type self: SharedPositions
+        @type slot: int
+        @rtype: SharedTOAHModel
+
+        >>> positions = SharedPositions(3, 2, slots=2)
+        >>> positions.model(1).move(0, 1)
+        >>> positions.model(0).get_state(), positions.model(1).get_state()
+        ((0, 0), (1, 0))
+        >>> positions.close()
+        """
+        return SharedTOAHModel(self.buffer(slot), self.number_of_stools)
+
+    def copy(self, source_slot, destination_slot):
+        """ Copy the game in source_slot to destination_slot.
+
+        @type self: SharedPositions
+        @type source_slot: int
+        @type destination_slot: int
+        @rtype: None
+        """
+        size = self.number_of_cheeses
+        self._memory.buf[destination_slot * size:
+                         (destination_slot + 1) * size] = \
+            self._memory.buf[source_slot * size:(source_slot + 1) * size]
+
+    def close(self):
+        """ Stop using the shared memory, freeing it if this process
+        created it. Models and buffers of the slots must have been dropped
+        or released first.
+
+        @type self: SharedPositions
+        @rtype: None
+        """
+        self._memory.close()
+        if self._owner:
+            self._memory.unlink()
+
+
+def perft(model, depth):
+    """ Return the number of sequences of depth legal moves from the
+    position of model, making and taking back the moves in place.
+
+    @type model: SharedTOAHModel
+    @type depth: int
+    @rtype: int
+
+    >>> perft(SharedTOAHModel(bytearray(3), 3), 2)
+    6
+    """
+    if depth == 0:
+        return 1
+    count = 0
+    for source, destination in model.legal_moves():
+        model.move(source, destination)
+        count += perft(model, depth - 1)
+        model.undo()
+    return count
+
+
+def _attach(handle, next_slot):
+    """ Attach this worker process to the positions of handle, taking
+    the next free slot.
+
+    @type handle: tuple
+    @type next_slot: multiprocessing.Value
+    @rtype: None
+    """
+    global _worker
+    with next_slot.get_lock():
+        next_slot.value += 1
+        slot = next_slot.value
+    _worker = (SharedPositions(*handle), slot)
+
+
+def _perft_task(task):
+    """ Return perft of depth under move from the position in slot 0,
+    counted in the slot of this worker.
+
+    @type task: tuple[int, int, int]
+        source stool, destination stool and depth
+    @rtype: int
+    """
+    positions, slot = _worker
+    source, destination, depth = task
+    positions.copy(0, slot)
+    model = positions.model(slot)
+    model.move(source, destination)
+    return perft(model, depth - 1)
+
+
+def parallel_perft(model, depth, processes=2):
+    """ Return perft of the position of model (a TOAHModel or
+    SharedTOAHModel) to depth, splitting the root moves over processes
+    that share the position.
+
+    @type model: TOAHModel | SharedTOAHModel
+    @type depth: int
+    @type processes: int
+    @rtype: int
+
+    >>> M = TOAHModel(4)
+    >>> M.fill_first_stool(3)
+    >>> parallel_perft(M, 4) == perft(SharedTOAHModel(bytearray(3), 4), 4)
+    True
+    >>> parallel_perft(M, 0)
+    1
+    """
+    import multiprocessing
+    if depth == 0:
+        return 1
+    state = model.get_state()
+    positions = SharedPositions(model.get_number_of_stools(), len(state),
+                                slots=processes + 1)
+    try:
+        root = positions.model(0)
+        try:
+            root.set_state(state)
+            tasks = [move + (depth,) for move in root.legal_moves()]
+        finally:
+            root.release()
+        with multiprocessing.Pool(processes, initializer=_attach,
+                                  initargs=(positions.handle(),
+                                            multiprocessing.Value('i', 0))) \
+                as pool:
+            return sum(pool.map(_perft_task, tasks))
+    finally:
+        positions.close()
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod(verbose=True)
@@ -0,0 +1,173 @@
+"""
+Snapshot: Compact binary snapshot of a TOAHModel.
+
+A snapshot file holds, in order:
+
+    a header      magic, version, number of stools, number of cheeses and
+                  number of moves made (the offset into the move log)
+    positions     one byte per cheese, the stool of each cheese from the
+                  smallest to the largest
+    history       optionally, the moves made so far packed with
+                  toah_model.pack_moves and compressed with zlib
+
+Saving and loading the game itself is O(cheeses) whatever the number of
+moves made. The history is only read from the file when asked for.
+"""
+
+import os
+import struct
+import zlib
+
+from toah_model import TOAHModel, MoveSequence, pack_moves, unpack_moves
+
+MAGIC = b'TOAHSNAP'
+VERSION = 1
+# magic, version, stools, cheeses, moves made, history flag
+HEADER = struct.Struct('<8sBHIQB')
+# size of the compressed history
+HISTORY_SIZE = struct.Struct('<Q')
+
+
+def save_snapshot(model, path, include_history=False):
+    """ Save a snapshot of model to the file at path.
+
+    The file is replaced atomically, so a crash while saving leaves the
+    previous snapshot intact.
+
+    @type model: TOAHModel
+    @type path: str
+    @type include_history: bool
+        also save the moves made so far
+    @rtype: None
+    """
+    state = model.get_state()
+    if model.get_number_of_stools() > 256:
+        raise ValueError("snapshots hold at most 256 stools")
+    parts = [HEADER.pack(MAGIC, VERSION, model.get_number_of_stools(),
+                         len(state), model.number_of_moves(),
+                         1 if include_history else 0),
+             bytes(state)]
+    if include_history:
+        history = zlib.compress(pack_moves(model.get_move_seq()))
+        parts.append(HISTORY_SIZE.pack(len(history)))
+        parts.append(history)
+    temporary = path + '.tmp'
+    with open(temporary, 'wb') as snapshot_file:
+        snapshot_file.write(b''.join(parts))
+        snapshot_file.flush()
+        os.fsync(snapshot_file.fileno())
+    os.replace(temporary, path)
+
+
+def load_snapshot(path):
+    """ Return the Snapshot saved in the file at path, reading only its
+    header and cheese positions.
+
+    @type path: str
+    @rtype: Snapshot
+
+    >>> import os, tempfile
+    >>> path = os.path.join(tempfile.mkdtemp(), 'game.snap')
+    >>> M = TOAHModel(4)
+    >>> M.fill_first_stool(5)
+    >>> M.move(0, 1)
+    >>> save_snapshot(M, path, include_history=True)
+    >>> snapshot = load_snapshot(path)
+    >>> snapshot.number_of_moves, snapshot.model() == M
+    (1, True)
+    >>> snapshot.model(with_history=True).get_move_seq().get_move(0)
+    (0, 1)
+    """
+    with open(path, 'rb') as snapshot_file:
+        header = snapshot_file.read(HEADER.size)
+        if len(header) < HEADER.size:
+            raise ValueError("truncated snapshot")
+        magic, version, number_of_stools, number_of_cheeses, \
+            number_of_moves, has_history = HEADER.unpack(header)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("not a TOAH snapshot")
+        state = tuple(snapshot_file.read(number_of_cheeses))
+        if len(state) < number_of_cheeses:
+            raise ValueError("truncated snapshot")
+    history_offset = HEADER.size + number_of_cheeses if has_history else None
+    return Snapshot(number_of_stools, state, number_of_moves, path,
+                    history_offset)
+
+
+class Snapshot:
+    """ A TOAHModel snapshot loaded from a file.
+
+    === Attributes ===
+    @param int number_of_stools: stools in the game
+    @param tuple[int] state: TOAHModel.get_state() of the game
+    @param int number_of_moves: moves made when the snapshot was saved
+
+    === Private Attributes ===
+    @param str _path:
+        file the snapshot was loaded from
+    @param int|None _history_offset:
+        where the history starts in the file, or None if not saved
+    """
+
+    def __init__(self, number_of_stools, state, number_of_moves, path,
+                 history_offset):
+        """ Create a new Snapshot.
+
+        @type self: Snapshot
+        @type number_of_stools: int
+        @type state: tuple[int]
+        @type number_of_moves: int
+        @type path: str
+        @type history_offset: int | None
+        @rtype: None
+        """
+        self.number_of_stools = number_of_stools
+        self.state = state
+        self.number_of_moves = number_of_moves
+        self._path = path
+        self._history_offset = history_offset
+
+    def has_history(self):
+        """ Return whether the moves made were saved with the snapshot.
+
+        @type self: Snapshot
+        @rtype: bool
+        """
+        return self._history_offset is not None
+
+    def history(self):
+        """ Read and return the moves made so far from the file.
+
+        Raises ValueError if the history was not saved.
+
+        @type self: Snapshot
+        @rtype: MoveSequence
+        """
+        if not self.has_history():
+            raise ValueError("the snapshot has no history")
+        with open(self._path, 'rb') as snapshot_file:
+            snapshot_file.seek(self._history_offset)
+            size, = HISTORY_SIZE.unpack(snapshot_file.read(HISTORY_SIZE.size))
+            packed = zlib.decompress(snapshot_file.read(size))
+        return MoveSequence(list(unpack_moves(packed)))
+
+    def model(self, with_history=False):
+        """ Return a new TOAHModel in the saved state.
+
+        Unless with_history is True, the model starts with no moves made.
+
+        @type self: Snapshot
+        @type with_history: bool
+        @rtype: TOAHModel
+        """
+        model = TOAHModel(self.number_of_stools)
+        model.fill_first_stool(len(self.state))
+        model.set_state(self.state)
+        if with_history:
+            model.load_history(self.history())
+        return model
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod(verbose=True)
@@ -0,0 +1,335 @@
+"""
+SolverService: Local HTTP service serving packed TOAH tours.
+
+Concurrent identical requests are coalesced into a single computation, and
+results are kept in a size-bounded LRU cache of packed move sequences (see
+toah_model.pack_moves). Responses are sent with chunked transfer encoding,
+so tours too large for the cache are streamed straight from the solver
+without being buffered in full.
+
+Start the service with
+
+    python3 solver_service.py --port 8765
+    python3 solver_service.py --socket /tmp/toah.sock
+
+and request a tour with GET /solve?cheeses=N&stools=K, of at most
+--max-moves moves. GET /stats returns the cache statistics as JSON.
+"""
+
+import argparse
+import json
+import socketserver
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from itertools import islice
+from urllib.parse import parse_qs, urlsplit
+
+from toah_model import pack_moves
+from tour import solve_moves, tour_length
+
+DEFAULT_CACHE_BYTES = 64 * 1024 * 1024
+CHUNK_MOVES = 64 * 1024
+# Most moves of a tour served, so that no request holds a worker for long.
+DEFAULT_MAX_MOVES = 1 << 30
+
+
+class _Pending:
+    """ A computation other requests for the same tour can wait on.
+
+    === Attributes ===
+    @param threading.Event done: set once the computation is over
+    @param bytes|None result: the packed tour, if computed
+    @param Exception|None error: the exception raised, if any
+    """
+
+    def __init__(self):
+        """ Create a new, unfinished _Pending.
+
+        @type self: _Pending
+        @rtype: None
+        """
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SolverService:
+    """ Packed tours, computed once per (cheeses, stools) and cached.
+
+    === Private Attributes ===
+    @param int _max_bytes:
+        most bytes of packed tours kept in the cache
+    @param int _max_moves:
+        most moves of a tour served
+    @param OrderedDict _cache:
+        packed tour of each cached (cheeses, stools), least recently used
+        first
+    @param int _cache_bytes:
+        total size of the packed tours in _cache
+    @param dict[tuple, _Pending] _pending:
+        computations in progress
+    @param dict[str, int] _stats:
+        counts of cache hits, misses, coalesced and streamed requests
+    @param threading.Lock _lock:
+        protects all of the above
+    """
+
+    def __init__(self, max_bytes=DEFAULT_CACHE_BYTES,
+                 max_moves=DEFAULT_MAX_MOVES):
+        """ Create a new SolverService with an empty cache.
+
+        @type self: SolverService
+        @type max_bytes: int
+        @type max_moves: int
+        @rtype: None
+
+        >>> SolverService().stats()['cached_tours']
+        0
+        """
+        self._max_bytes = max_bytes
+        self._max_moves = max_moves
+        self._cache = OrderedDict()
+        self._cache_bytes = 0
+        self._pending = {}
+        self._stats = {'hits': 0, 'misses': 0, 'coalesced': 0,
+                       'streamed': 0}
+        self._lock = threading.Lock()
+
+    def stats(self):
+        """ Return the cache statistics of self.
+
+        @type self: SolverService
+        @rtype: dict[str, int]
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats['cached_tours'] = len(self._cache)
+            stats['cached_bytes'] = self._cache_bytes
+        return stats
+
+    def get_tour(self, number_of_cheeses, number_of_stools):
+        """ Generate the packed tour of number_of_cheeses cheeses on
+        number_of_stools stools, as chunks of bytes.
+
+        Raises ValueError if there is no tour for number_of_stools, or if
+        it is longer than the most moves self serves.
+
+        @type self: SolverService
+        @type number_of_cheeses: int
+        @type number_of_stools: int
+        @rtype: iterator[bytes]
+
+        >>> service = SolverService()
+        >>> b''.join(service.get_tour(2, 3))
+        b'\\x01\\x02\\x12'
+        >>> b''.join(service.get_tour(2, 3))
+        b'\\x01\\x02\\x12'
+        >>> service.stats()['hits'], service.stats()['misses']
+        (1, 1)
+        >>> SolverService(max_moves=1000).get_tour(10, 3)
+        Traceback (most recent call last):
+        ...
+        ValueError: the tour has 1023 moves, more than the 1000 served
+        """
+        length = tour_length(number_of_cheeses, number_of_stools)
+        if length > self._max_moves:
+            raise ValueError('the tour has {} moves, more than the {} served'
+                             .format(length, self._max_moves))
+        if length > self._max_bytes:
+            with self._lock:
+                self._stats['streamed'] += 1
+            return self._stream(number_of_cheeses, number_of_stools)
+        return iter([self._cached_tour(number_of_cheeses, number_of_stools)])
+
+    def _stream(self, number_of_cheeses, number_of_stools):
+        """ Generate the packed tour in chunks straight from the solver.
+
+        @type self: SolverService
+        @type number_of_cheeses: int
+        @type number_of_stools: int
+        @rtype: generator[bytes]
+        """
+        moves = solve_moves(number_of_cheeses, number_of_stools)
+        chunk = pack_moves(islice(moves, CHUNK_MOVES))
+        while chunk:
+            yield chunk
+            chunk = pack_moves(islice(moves, CHUNK_MOVES))
+
+    def _cached_tour(self, number_of_cheeses, number_of_stools):
+        """ Return the packed tour from the cache, from a computation
+        already in progress, or from a new computation.
+
+        @type self: SolverService
+        @type number_of_cheeses: int
+        @type number_of_stools: int
+        @rtype: bytes
+        """
+        key = (number_of_cheeses, number_of_stools)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                self._stats['hits'] += 1
+                return self._cache[key]
+            pending = self._pending.get(key)
+            leader = pending is None
+            if leader:
+                pending = _Pending()
+                self._pending[key] = pending
+                self._stats['misses'] += 1
+            else:
+                self._stats['coalesced'] += 1
+
+        if not leader:
+            pending.done.wait()
+            if pending.error is not None:
+                raise pending.error
+            return pending.result
+
+        try:
+            pending.result = pack_moves(solve_moves(number_of_cheeses,
+                                                    number_of_stools))
+        except Exception as e:
+            pending.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._pending[key]
+                if pending.error is None:
+                    self._store(key, pending.result)
+            pending.done.set()
+        return pending.result
+
+    def _store(self, key, packed):
+        """ Cache packed under key, evicting the least recently used tours
+        to stay within the byte budget. Call with self._lock held.
+
+        @type self: SolverService
+        @type key: tuple[int]
+        @type packed: bytes
+        @rtype: None
+        """
+        self._cache[key] = packed
+        self._cache_bytes += len(packed)
+        while self._cache_bytes > self._max_bytes:
+            _, evicted = self._cache.popitem(last=False)
+            self._cache_bytes -= len(evicted)
+
+
+class SolverRequestHandler(BaseHTTPRequestHandler):
+    """ HTTP handler for /solve and /stats, served by a SolverService
+    stored as the service attribute of the server.
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        """ Answer a GET request.
+
+        @type self: SolverRequestHandler
+        @rtype: None
+        """
+        url = urlsplit(self.path)
+        if url.path == '/stats':
+            self._send_json(200, self.server.service.stats())
+        elif url.path == '/solve':
+            self._solve(parse_qs(url.query))
+        else:
+            self._send_json(404, {'error': 'unknown path'})
+
+    def _solve(self, query):
+        """ Stream the packed tour asked for by query.
+
+        @type self: SolverRequestHandler
+        @type query: dict[str, list[str]]
+        @rtype: None
+        """
+        try:
+            number_of_cheeses = int(query['cheeses'][0])
+            number_of_stools = int(query.get('stools', ['4'])[0])
+            if number_of_cheeses < 0:
+                raise ValueError('cheeses must not be negative')
+            chunks = self.server.service.get_tour(number_of_cheeses,
+                                                  number_of_stools)
+        except (KeyError, ValueError) as e:
+            self._send_json(400, {'error': str(e)})
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.send_header('X-Moves', str(tour_length(number_of_cheeses,
+                                                    number_of_stools)))
+        self.end_headers()
+        for chunk in chunks:
+            for start in range(0, len(chunk), CHUNK_MOVES):
+                part = chunk[start:start + CHUNK_MOVES]
+                self.wfile.write('{:x}\r\n'.format(len(part)).encode())
+                self.wfile.write(part)
+                self.wfile.write(b'\r\n')
+        self.wfile.write(b'0\r\n\r\n')
+
+    def _send_json(self, status, document):
+        """ Send document as a JSON response with the given status.
+
+        @type self: SolverRequestHandler
+        @type status: int
+        @type document: dict
+        @rtype: None
+        """
+        body = json.dumps(document).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self):
+        """ Return the client address for log messages, which is empty
+        over a Unix socket.
+
+        @type self: SolverRequestHandler
+        @rtype: str
+        """
+        if isinstance(self.client_address, tuple):
+            return self.client_address[0]
+        return 'local'
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn,
+                     socketserver.UnixStreamServer):
+    """ Threaded HTTP server listening on a Unix socket.
+    """
+    daemon_threads = True
+
+
+def make_server(service, port=None, socket_path=None):
+    """ Return an HTTP server for service on localhost:port, or on the
+    Unix socket at socket_path if given.
+
+    @type service: SolverService
+    @type port: int | None
+    @type socket_path: str | None
+    @rtype: socketserver.BaseServer
+    """
+    if socket_path is not None:
+        server = UnixHTTPServer(socket_path, SolverRequestHandler)
+    else:
+        server = ThreadingHTTPServer(('127.0.0.1', port or 0),
+                                     SolverRequestHandler)
+    server.service = service
+    return server
+
+
+if __name__ == '__main__':
+    PARSER = argparse.ArgumentParser(description='Serve packed TOAH tours.')
+    PARSER.add_argument('--port', type=int, default=8765)
+    PARSER.add_argument('--socket', help='listen on this Unix socket instead')
+    PARSER.add_argument('--cache-bytes', type=int, default=DEFAULT_CACHE_BYTES)
+    PARSER.add_argument('--max-moves', type=int, default=DEFAULT_MAX_MOVES,
+                        help='most moves of a tour served')
+    ARGS = PARSER.parse_args()
+    SERVER = make_server(SolverService(ARGS.cache_bytes, ARGS.max_moves),
+                         ARGS.port, ARGS.socket)
+    try:
+        SERVER.serve_forever()
+    except KeyboardInterrupt:
+        SERVER.server_close()
@@ -0,0 +1,313 @@
+"""
+Exhaustive exploration of the state graph of a Tour of Anne Hoy game.
+
+Every arrangement of the cheeses is legal once each stool is sorted, so a
+game with k stools and n cheeses has k ** n states. A state is encoded as
+the integer whose base k digit i is the stool of the ith smallest cheese,
+as in TOAHModel.get_state.
+
+explore runs a frontier-by-frontier breadth first search from a start
+state, marking visited states in a bit-packed set of k ** n bits, and
+counts the states at each distance and the number of optimal paths to
+the goal of every cheese on the last stool. With several processes, large
+frontiers are split by state prefix (the stools of the largest cheeses)
+and expanded in a process pool. eccentricities runs the search from every
+state, spreading the start states over the pool the same way, to find the
+diameter of the graph.
+
+    python3 state_explorer.py --stools 4 --cheeses 6 --processes 4
+
+multiprocessing and the command line modules are only imported when
+needed, so that importing the search functions stays cheap.
+
+For games too large for memory, --external searches with external_bfs,
+keeping frontiers on disk instead.
+"""
+
+import sys
+
+# Frontiers smaller than this are expanded in process.
+PARALLEL_FRONTIER = 4096
+# Chunks per process, so that uneven prefixes still balance.
+CHUNKS_PER_PROCESS = 4
+
+
+def encode_state(state, number_of_stools):
+    """ Return the integer encoding of state, a tuple of stool indices
+    from the smallest cheese to the largest.
+
+    @type state: tuple[int]
+    @type number_of_stools: int
+    @rtype: int
+
+    >>> encode_state((2, 0, 1), 3)
+    11
+    """
+    code = 0
+    for stool in reversed(state):
+        code = code * number_of_stools + stool
+    return code
+
+
+def decode_state(code, number_of_stools, number_of_cheeses):
+    """ Return the state encoded by code.
+
+    @type code: int
+    @type number_of_stools: int
+    @type number_of_cheeses: int
+    @rtype: tuple[int]
+
+    >>> decode_state(11, 3, 3)
+    (2, 0, 1)
+    """
+    state = []
+    for _ in range(number_of_cheeses):
+        code, stool = divmod(code, number_of_stools)
+        state.append(stool)
+    return tuple(state)
+
+
+def neighbours(code, number_of_stools, number_of_cheeses):
+    """ Generate the states one legal move away from the state code.
+
+    @type code: int
+    @type number_of_stools: int
+    @type number_of_cheeses: int
+    @rtype: generator[int]
+
+    >>> sorted(neighbours(encode_state((0, 0), 3), 3, 2))
+    [1, 2]
+    >>> sorted(decode_state(c, 3, 2) for c in neighbours(1, 3, 2))
+    [(0, 0), (1, 2), (2, 0)]
+    """
+    tops = [-1] * number_of_stools
+    found = 0
+    rest = code
+    for cheese in range(number_of_cheeses):
+        rest, stool = divmod(rest, number_of_stools)
+        if tops[stool] < 0:
+            tops[stool] = cheese
+            found += 1
+            if found == number_of_stools:
+                break
+    weight = [number_of_stools ** cheese if cheese >= 0 else 0
+              for cheese in tops]
+    for source in range(number_of_stools):
+        cheese = tops[source]
+        if cheese < 0:
+            continue
+        for destination in range(number_of_stools):
+            top = tops[destination]
+            if top < 0 or top > cheese:
+                yield code + (destination - source) * weight[source]
+
+
+def _expand(task):
+    """ Return the neighbours of a chunk of frontier states, mapped to
+    the sum of the path counts of the states they neighbour.
+
+    @type task: tuple[int, int, list[tuple[int]]]
+        stools, cheeses and (state, path count) pairs
+    @rtype: dict[int, int]
+    """
+    number_of_stools, number_of_cheeses, items = task
+    reached = {}
+    for code, paths in items:
+        for neighbour in neighbours(code, number_of_stools,
+                                    number_of_cheeses):
+            reached[neighbour] = reached.get(neighbour, 0) + paths
+    return reached
+
+
+def _chunks(items, number_of_chunks):
+    """ Split items, sorted by state, into at most number_of_chunks runs
+    of consecutive states, so that each run shares a state prefix.
+
+    @type items: list[tuple[int]]
+    @type number_of_chunks: int
+    @rtype: list[list[tuple[int]]]
+
+    >>> _chunks([(1, 1), (2, 1), (3, 1)], 2)
+    [[(1, 1), (2, 1)], [(3, 1)]]
+    """
+    size = -(-len(items) // number_of_chunks)
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def explore(number_of_stools, number_of_cheeses, start=None, pool=None,
+            processes=1):
+    """ Return the statistics of a breadth first search of the state graph
+    from start, by default every cheese on the first stool.
+
+    The result holds the number of states at each distance from start,
+    the distance to the goal of every cheese on the last stool and the
+    number of distinct optimal paths reaching it.
+
+    @type number_of_stools: int
+    @type number_of_cheeses: int
+    @type start: tuple[int] | None
+    @type pool: multiprocessing.pool.Pool | None
+        pool to expand large frontiers in
+    @type processes: int
+        number of processes in pool
+    @rtype: dict[str, object]
+
+    >>> result = explore(3, 3)
+    >>> result['distances'], result['goal_distance'], result['optimal_paths']
+    ([1, 2, 2, 4, 2, 4, 4, 8], 7, 1)
+    >>> explore(4, 2)['optimal_paths']
+    2
+    """
+    if start is None:
+        start = (0,) * number_of_cheeses
+    start_code = encode_state(start, number_of_stools)
+    goal_code = number_of_stools ** number_of_cheeses - 1
+    visited = bytearray(-(-number_of_stools ** number_of_cheeses // 8))
+    visited[start_code >> 3] |= 1 << (start_code & 7)
+    frontier = {start_code: 1}
+    distances = []
+    goal_distance = optimal_paths = None
+    while frontier:
+        if goal_code in frontier:
+            goal_distance = len(distances)
+            optimal_paths = frontier[goal_code]
+        distances.append(len(frontier))
+        items = sorted(frontier.items())
+        if pool is not None and len(items) >= PARALLEL_FRONTIER:
+            parts = pool.map(_expand, [
+                (number_of_stools, number_of_cheeses, chunk)
+                for chunk in _chunks(items,
+                                     processes * CHUNKS_PER_PROCESS)])
+        else:
+            parts = [_expand((number_of_stools, number_of_cheeses, items))]
+        frontier = {}
+        for reached in parts:
+            for code, paths in reached.items():
+                if not visited[code >> 3] & (1 << (code & 7)):
+                    frontier[code] = frontier.get(code, 0) + paths
+        for code in frontier:
+            visited[code >> 3] |= 1 << (code & 7)
+    return {'stools': number_of_stools,
+            'cheeses': number_of_cheeses,
+            'states': sum(distances),
+            'start': list(start),
+            'distances': distances,
+            'eccentricity': len(distances) - 1,
+            'goal_distance': goal_distance,
+            'optimal_paths': optimal_paths}
+
+
+def _eccentricities(task):
+    """ Return a histogram of the eccentricities of a range of start
+    states.
+
+    @type task: tuple[int, int, int, int]
+        stools, cheeses and the first and last + 1 start states
+    @rtype: dict[int, int]
+    """
+    number_of_stools, number_of_cheeses, first, last = task
+    histogram = {}
+    for code in range(first, last):
+        eccentricity = explore(number_of_stools, number_of_cheeses,
+                               decode_state(code, number_of_stools,
+                                            number_of_cheeses))['eccentricity']
+        histogram[eccentricity] = histogram.get(eccentricity, 0) + 1
+    return histogram
+
+
+def eccentricities(number_of_stools, number_of_cheeses, pool=None,
+                   processes=1):
+    """ Return a histogram of the eccentricities of all states, searching
+    from every state; its largest key is the diameter of the graph.
+
+    @type number_of_stools: int
+    @type number_of_cheeses: int
+    @type pool: multiprocessing.pool.Pool | None
+    @type processes: int
+    @rtype: dict[int, int]
+
+    >>> eccentricities(3, 2)
+    {3: 9}
+    """
+    states = number_of_stools ** number_of_cheeses
+    size = -(-states // (processes * CHUNKS_PER_PROCESS))
+    tasks = [(number_of_stools, number_of_cheeses, first,
+              min(first + size, states)) for first in range(0, states, size)]
+    parts = pool.map(_eccentricities, tasks) if pool is not None \
+        else [_eccentricities(task) for task in tasks]
+    histogram = {}
+    for part in parts:
+        for eccentricity, count in part.items():
+            histogram[eccentricity] = histogram.get(eccentricity, 0) + count
+    return dict(sorted(histogram.items()))
+
+
+def _explore_in_memory(args):
+    """ Return the results of explore, and of eccentricities if asked for,
+    for the parsed command line args.
+
+    @type args: argparse.Namespace
+    @rtype: dict[str, object]
+    """
+    pool = None
+    if args.processes > 1:
+        import multiprocessing
+        pool = multiprocessing.Pool(args.processes)
+    try:
+        result = explore(args.stools, args.cheeses, pool=pool,
+                         processes=args.processes)
+        if args.diameter:
+            histogram = eccentricities(args.stools, args.cheeses, pool,
+                                       args.processes)
+            result['eccentricities'] = histogram
+            result['diameter'] = max(histogram)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    return result
+
+
+def main(argv=None):
+    """ Run the state explorer command line and return its exit status.
+
+    @type argv: list[str] | None
+    @rtype: int
+    """
+    import argparse
+    import json
+    parser = argparse.ArgumentParser(
+        description='Explore the state graph of a Tour of Anne Hoy game.')
+    parser.add_argument('--stools', type=int, default=4)
+    parser.add_argument('--cheeses', type=int, default=5)
+    parser.add_argument('--processes', type=int, default=1)
+    parser.add_argument('--diameter', action='store_true',
+                        help='also search from every state (slow)')
+    parser.add_argument('--external', action='store_true',
+                        help='keep frontiers on disk, without path counts')
+    parser.add_argument('--memory-mb', type=int, default=256,
+                        help='memory budget of --external')
+    parser.add_argument('--work-dir', help='directory for the files of '
+                                           '--external')
+    parser.add_argument('--output', help='file to write the JSON results to')
+    args = parser.parse_args(argv)
+    if args.stools < 2 or args.cheeses < 1 or args.processes < 1:
+        parser.error('need at least 2 stools, 1 cheese and 1 process')
+    if args.external:
+        from external_bfs import explore_external
+        result = explore_external(args.stools, args.cheeses,
+                                  work_dir=args.work_dir,
+                                  memory_budget=args.memory_mb * 1024 * 1024)
+    else:
+        result = _explore_in_memory(args)
+    text = json.dumps(result, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as output:
+            output.write(text + '\n')
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
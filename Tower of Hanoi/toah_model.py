@@ -3,14 +3,71 @@ TOAHModel:  Model a game of Tour of Anne Hoy
 Cheese:   Model a cheese with a given (relative) size
 IllegalMoveError: Type of exceptions thrown when an illegal move is attempted
 MoveSequence: Record of a sequence of (not necessarily legal) moves. 
+pack_moves, unpack_moves: Convert moves to and from one byte per move
+MoveListener: Interface for objects notified of the moves made in a TOAHModel
+AnimationRecorder: MoveListener recording a text frame after every move
 """
 
+# Moves are packed as source * 16 + destination in a single byte.
+MAX_PACKED_STOOLS = 16
+
+
+def pack_moves(moves):
+    """ Return moves packed into one byte per move.
+
+    Raises ValueError if a move uses a stool index of MAX_PACKED_STOOLS
+    or more.
+
+    @type moves: iterable[tuple[int]]
+    @rtype: bytes
+
+    >>> pack_moves([(0, 1), (2, 3)])
+    b'\\x01#'
+    """
+    packed = bytearray()
+    for source, destination in moves:
+        if not (0 <= source < MAX_PACKED_STOOLS and
+                0 <= destination < MAX_PACKED_STOOLS):
+            raise ValueError("only stools 0 to {} can be packed".format(
+                MAX_PACKED_STOOLS - 1))
+        packed.append(source * MAX_PACKED_STOOLS + destination)
+    return bytes(packed)
+
+
+def unpack_moves(data):
+    """ Generate the moves packed in data by pack_moves.
+
+    @type data: bytes
+    @rtype: generator[tuple[int]]
+
+    >>> list(unpack_moves(b'\\x01#'))
+    [(0, 1), (2, 3)]
+    """
+    for byte in data:
+        yield divmod(byte, MAX_PACKED_STOOLS)
+
+
 class TOAHModel:
     """ Model a game of Tour Of Anne Hoy.
 
     Model stools holding stacks of cheese, enforcing the constraint
     that a larger cheese may not be placed on a smaller one.
+
+    The number of cheeses, a map from stool id to stool and whether every
+    cheese is on the last stool are kept up to date, so is_solved and add
+    take O(1).
+
+    Moves can be undone and redone one at a time in O(1). Every
+    SNAPSHOT_INTERVAL moves a compact state snapshot is kept, so that
+    go_to_move reaches any move index after at most SNAPSHOT_INTERVAL
+    move applications. Snapshots start from the first move made after
+    the history was cleared or loaded, and moves before that are only
+    reached by stepping.
+
+    str keeps the text of each row of cheeses and renders again only the
+    two rows each move changed.
     """
+    SNAPSHOT_INTERVAL = 1024
 
     def __init__(self, number_of_stools):
         """ Create new TOAHModel with empty stools
@@ -30,10 +87,22 @@ class TOAHModel:
         self._stools = []
         for i in range(0, number_of_stools):
             self._stools.append(Stool(i))
+        self._stools_by_id = {}
+        for stool in self._stools:
+            self._stools_by_id[stool.get_stool_id()] = stool
         self._number_of_stools = number_of_stools
         self._move_seq = MoveSequence([])
         self._number_of_cheeses = 0
-        self._animated_moves = []
+        self._solved = True
+        self._listeners = []
+        self._animation = None
+        self._redo_moves = []
+        self._snapshots = []
+        self._snapshot_base = 0
+        self._rows = None
+        self._dirty_rows = []
+        self._text = None
+        self._cell_width = 1
 
     def get_stool_at(self, index):
         """ Returns the stool at the given index inside of TOAHModel's
@@ -63,23 +132,28 @@ class TOAHModel:
         """
         return self._stools
 
-    def fill_first_stool(self, number_of_cheeses):
-        """ Fills the first stool with the given number of cheese.
+    def fill_first_stool(self, number_of_cheeses, stool_index=0):
+        """ Fills the first stool (or the stool at stool_index) with the
+        given number of cheese.
         with the largest cheese size diamater being the given number
         of cheeses and the smallest being 1.
 
         @type self: TOAHModel
         @type number_of_cheeses: int
+        @type stool_index: int
         @rtype: None
 
         >>> M = TOAHModel(4)
         >>> M.fill_first_stool(5)
         >>> len(M.get_stool_at(0))
         5
+        >>> M = TOAHModel(4)
+        >>> M.fill_first_stool(2, 3)
+        >>> M.get_state()
+        (3, 3)
         """
-        self._number_of_cheeses = number_of_cheeses
-        for size in range(1, number_of_cheeses + 1):
-            self.add(Cheese(number_of_cheeses + 1 - size), 0)
+        for cheese in Cheese.sizes(number_of_cheeses):
+            self.add(cheese, stool_index)
 
     def get_number_of_stools(self):
         """ Return the number of stools in the instance of TOAHModel.
@@ -107,6 +181,31 @@ class TOAHModel:
         """
         return self._number_of_cheeses
 
+    def is_solved(self):
+        """ Return whether every cheese of this TOAHModel is on its last
+        stool, in O(1).
+
+        @type self: TOAHModel
+        @rtype: bool
+
+        >>> M = TOAHModel(2)
+        >>> M.fill_first_stool(1)
+        >>> M.is_solved()
+        False
+        >>> M.move(0, 1)
+        >>> M.is_solved()
+        True
+        """
+        return self._solved
+
+    def _update_solved(self):
+        """ Recompute whether every cheese is on the last stool.
+
+        @type self: TOAHModel
+        @rtype: None
+        """
+        self._solved = len(self._stools[-1]) == self._number_of_cheeses
+
     def number_of_moves(self):
         """ Returns the total number of moves the user has
         made so far.
@@ -152,9 +251,9 @@ class TOAHModel:
         0
         """
         for stool in self._stools:
-            if stool.is_empty() is False:
-                if stool.locate_cheese(cheese) is not None:
-                    return stool.locate_cheese(cheese)
+            location = stool.locate_cheese(cheese)
+            if location is not None:
+                return location
         return None
 
     def get_top_cheese(self, stool_index):
@@ -171,24 +270,90 @@ class TOAHModel:
         """
         return self._stools[stool_index].get_top_cheese()
 
+    def add_listener(self, listener):
+        """ Subscribe listener to the moves made in this TOAHModel.
+
+        @type self: TOAHModel
+        @type listener: MoveListener
+        @rtype: None
+
+        >>> M = TOAHModel(3)
+        >>> M.fill_first_stool(2)
+        >>> class Printer(MoveListener):
+        ...     def on_move(self, model, source_stool, destination_stool):
+        ...         print(source_stool, destination_stool)
+        >>> M.add_listener(Printer())
+        >>> M.move(0, 1)
+        0 1
+        """
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        """ Unsubscribe listener from the moves made in this TOAHModel.
+
+        @type self: TOAHModel
+        @type listener: MoveListener
+        @rtype: None
+
+        >>> M = TOAHModel(3)
+        >>> listener = MoveListener()
+        >>> M.add_listener(listener)
+        >>> M.remove_listener(listener)
+        >>> M.get_listeners()
+        []
+        """
+        self._listeners.remove(listener)
+
+    def get_listeners(self):
+        """ Returns the listeners subscribed to this TOAHModel.
+
+        @type self: TOAHModel
+        @rtype: list[MoveListener]
+        """
+        return self._listeners
+
+    def enable_animation(self):
+        """ Start recording a text frame of this TOAHModel after every
+        move, for get_animated_moves.
+
+        @type self: TOAHModel
+        @rtype: None
+
+        >>> M = TOAHModel(4)
+        >>> M.fill_first_stool(5)
+        >>> M.enable_animation()
+        >>> M.enable_animation()
+        >>> len(M.get_listeners())
+        1
+        """
+        if self._animation is None:
+            self._animation = AnimationRecorder()
+            self.add_listener(self._animation)
+
     def get_animated_moves(self):
-        """ Returns the list of moves made so far where each move
-        is an animation leading to the next move.
+        """ Returns the list of moves made since enable_animation was
+        called, where each move is an animation leading to the next move.
+
+        No frames are recorded unless animation is enabled.
 
         @type self: TOAHModel
         @type: list[str]
 
         >>> M = TOAHModel(4)
         >>> M.fill_first_stool(5)
+        >>> M.enable_animation()
         >>> M.move(0, 1)
         >>> M.move(0, 2)
         >>> len(M.get_animated_moves())
         2
         """
-        return self._animated_moves
+        if self._animation is None:
+            return []
+        return self._animation.get_frames()
 
     def add(self, cheese, stool_number):
-        """ Stacks the given cheese on top of the desired stool.
+        """ Stacks the given cheese on top of the desired stool, unless it
+        is larger than the cheese already on top.
 
         @type self: TOAHModel
         @type cheese: Cheese object
@@ -201,18 +366,39 @@ class TOAHModel:
         >>> M.get_top_cheese(0).size
         3
         """
-        selected_stool = None
-        for stool in self._stools:
-            if stool.get_stool_id() == stool_number:
-                selected_stool = stool
-        if selected_stool.is_empty() is True:
-            selected_stool.add_cheese_to_end(cheese)
-        elif selected_stool.get_top_cheese().size > cheese.size:
+        selected_stool = self._stools_by_id[stool_number]
+        if selected_stool.is_empty() is True or \
+                selected_stool.get_top_cheese().size > cheese.size:
             selected_stool.add_cheese_to_end(cheese)
+            self._number_of_cheeses += 1
+            self._update_solved()
+            self._forget_rows()
+
+    def _check_move(self, source_stool, destination_stool):
+        """ Return the source and destination stools of the move, or raise
+        IllegalMoveError if it is not valid.
+
+        @type self: TOAHModel
+        @type source_stool: int
+        @type destination_stool: int
+        @rtype: tuple[Stool]
+        """
+        source = self._stools[source_stool]
+        destination = self._stools[destination_stool]
+        if source.is_empty():
+            raise IllegalMoveError("Selected stool has no cheese!")
+        if not destination.is_empty() and \
+                destination.get_top_cheese().size <= \
+                source.get_top_cheese().size:
+            raise IllegalMoveError("Cant move the cheese there!")
+        return source, destination
 
     def move(self, source_stool, destination_stool):
         """ Moves the top cheese from the source stool to the
-        top of destination stool if the move is a valid move.
+        top of destination stool if the move is a valid move, and
+        notifies the listeners of this TOAHModel.
+
+        Raises IllegalMoveError if the move is not valid.
 
         @type self: TOAHModel
         @type source_stool: int
@@ -227,24 +413,323 @@ class TOAHModel:
         1
         >>> M.get_top_cheese(2).size
         2
+        >>> try:
+        ...     M.move(2, 2)
+        ... except IllegalMoveError as e:
+        ...     print(e)
+        Cant move the cheese there!
         """
-        if self._stools[source_stool].get_top_cheese() is None:
-            print("\nSelected stool has no cheese!")
-            raise IllegalMoveError
-        elif self._stools[destination_stool].is_empty() is True:
-            selected_cheese = self._stools[source_stool].remove_top_cheese()
-            self._stools[destination_stool].add_cheese_to_end(selected_cheese)
-            self._move_seq.add_move(source_stool, destination_stool)
-            self._animated_moves += [str(self)]
-        elif self._stools[destination_stool].get_top_cheese().size \
-                > self._stools[source_stool].get_top_cheese().size:
-            selected_cheese = self._stools[source_stool].remove_top_cheese()
-            self._stools[destination_stool].add_cheese_to_end(selected_cheese)
-            self._move_seq.add_move(source_stool, destination_stool)
-            self._animated_moves += [str(self)]
-        else:
-            print("\nCant move the cheese there!")
-            raise IllegalMoveError
+        source, destination = self._check_move(source_stool,
+                                               destination_stool)
+        if self._redo_moves:
+            self._redo_moves = []
+            made = self.number_of_moves() - self._snapshot_base
+            if made < 0:
+                self._snapshots = []
+            else:
+                del self._snapshots[made // self.SNAPSHOT_INTERVAL + 1:]
+        if not self._snapshots:
+            self._snapshot_base = self.number_of_moves()
+            self._snapshots.append(self.get_state())
+        destination.add_cheese_to_end(source.remove_top_cheese())
+        self._update_solved()
+        self._moved(source_stool, destination_stool)
+        self._move_seq.add_move(source_stool, destination_stool)
+        self._record_snapshot()
+        for listener in self._listeners:
+            listener.on_move(self, source_stool, destination_stool)
+
+    def _shift(self, source_stool, destination_stool):
+        """ Move the top cheese of source_stool onto destination_stool,
+        without checking the move or recording it.
+
+        @type self: TOAHModel
+        @type source_stool: int
+        @type destination_stool: int
+        @rtype: None
+        """
+        self._stools[destination_stool].add_cheese_to_end(
+            self._stools[source_stool].remove_top_cheese())
+        self._update_solved()
+        self._moved(source_stool, destination_stool)
+
+    def _moved(self, source_stool, destination_stool):
+        """ Mark the rows of str that changed when the top cheese of
+        source_stool was moved onto destination_stool.
+
+        @type self: TOAHModel
+        @type source_stool: int
+        @type destination_stool: int
+        @rtype: None
+        """
+        self._text = None
+        if self._rows is not None:
+            self._dirty_rows.append(len(self._stools[source_stool]))
+            self._dirty_rows.append(len(self._stools[destination_stool]) - 1)
+
+    def _forget_rows(self):
+        """ Make the next str render every row again, after cheeses were
+        added or rearranged.
+
+        @type self: TOAHModel
+        @rtype: None
+        """
+        self._text = None
+        self._rows = None
+        self._dirty_rows = []
+
+    def _record_snapshot(self):
+        """ Keep a snapshot of the current state if the number of moves
+        made so far is the next multiple of SNAPSHOT_INTERVAL.
+
+        @type self: TOAHModel
+        @rtype: None
+        """
+        if self.number_of_moves() == self._snapshot_base + \
+                len(self._snapshots) * self.SNAPSHOT_INTERVAL:
+            self._snapshots.append(self.get_state())
+
+    def get_state(self):
+        """ Return the stool index of every cheese, ordered from the
+        smallest cheese to the largest.
+
+        @type self: TOAHModel
+        @rtype: tuple[int]
+
+        >>> M = TOAHModel(3)
+        >>> M.fill_first_stool(3)
+        >>> M.move(0, 2)
+        >>> M.get_state()
+        (2, 0, 0)
+        """
+        located = []
+        for stool in self._stools:
+            for cheese in stool.get_cheese_stack():
+                located.append((cheese.size, stool.get_stool_id()))
+        located.sort()
+        return tuple(stool_index for _, stool_index in located)
+
+    def set_state(self, state):
+        """ Rearrange the cheeses of this TOAHModel so that the ith
+        smallest cheese is on stool state[i].
+
+        The move history is cleared, since its moves no longer lead to
+        the new arrangement, and listeners are told through
+        MoveListener.on_reset.
+
+        Raises ValueError if state does not give a stool of this TOAHModel
+        for each cheese.
+
+        @type self: TOAHModel
+        @type state: tuple[int]
+        @rtype: None
+
+        >>> M = TOAHModel(3)
+        >>> M.fill_first_stool(3)
+        >>> M.move(0, 1)
+        >>> M.set_state((1, 2, 2))
+        >>> M.get_top_cheese(1).size, len(M.get_stool_at(2))
+        (1, 2)
+        >>> M.can_undo()
+        False
+        >>> try:
+        ...     M.set_state((0, 3, 0))
+        ... except ValueError as e:
+        ...     print(e)
+        state has a stool out of range
+        """
+        if len(state) != self._number_of_cheeses:
+            raise ValueError("state must give the stool of each cheese")
+        for stool_index in state:
+            if not 0 <= stool_index < self._number_of_stools:
+                raise ValueError("state has a stool out of range")
+        self.clear_history()
+        self._arrange(state)
+
+    def _arrange(self, state):
+        """ Rearrange the cheeses as in set_state, keeping the move history
+        and without checking state.
+
+        @type self: TOAHModel
+        @type state: tuple[int]
+        @rtype: None
+        """
+        cheeses = []
+        for stool in self._stools:
+            cheeses.extend(stool.get_cheese_stack())
+            del stool.get_cheese_stack()[:]
+        cheeses.sort(key=lambda c: c.size)
+        for i in range(len(cheeses) - 1, -1, -1):
+            self._stools[state[i]].add_cheese_to_end(cheeses[i])
+        self._update_solved()
+        self._forget_rows()
+        for listener in self._listeners:
+            listener.on_reset(self)
+
+    def clear_history(self):
+        """ Forget the moves made so far, the moves that could be redone
+        and the snapshots, keeping the current arrangement of cheeses.
+
+        @type self: TOAHModel
+        @rtype: None
+
+        >>> M = TOAHModel(3)
+        >>> M.fill_first_stool(2)
+        >>> M.move(0, 1)
+        >>> M.clear_history()
+        >>> M.number_of_moves(), M.can_undo(), M.get_top_cheese(1).size
+        (0, False, 1)
+        """
+        self._move_seq = MoveSequence([])
+        self._redo_moves = []
+        self._snapshots = []
+        self._snapshot_base = 0
+
+    def load_history(self, move_seq):
+        """ Use move_seq as the record of the moves made so far, without
+        applying any of them.
+
+        The moves of move_seq must lead from the starting arrangement to
+        the current one. Moves that could be redone and snapshots are
+        forgotten.
+
+        @type self: TOAHModel
+        @type move_seq: MoveSequence
+        @rtype: None
+
+        >>> M = TOAHModel(3)
+        >>> M.fill_first_stool(1)
+        >>> M.set_state((1,))
+        >>> M.load_history(MoveSequence([(0, 1)]))
+        >>> M.undo()
+        >>> M.get_state(), M.number_of_moves()
+        ((0,), 0)
+
+        Moves made after loading can be gone back over as usual:
+
+        >>> M = TOAHModel(3)
+        >>> M.fill_first_stool(3)
+        >>> M.set_state((2, 0, 0))
+        >>> M.load_history(MoveSequence([(0, 2)]))
+        >>> M.move(0, 1)
+        >>> M.go_to_move(0)
+        >>> M.get_state()
+        (0, 0, 0)
+        """
+        self.clear_history()
+        self._move_seq = move_seq
+        self._snapshot_base = move_seq.length()
+
+    def can_undo(self):
+        """ Return whether there is a move that undo can take back.
+
+        @type self: TOAHModel
+        @rtype: bool
+        """
+        return self._move_seq.length() > 0
+
+    def can_redo(self):
+        """ Return whether there is an undone move that redo can replay.
+
+        @type self: TOAHModel
+        @rtype: bool
+        """
+        return len(self._redo_moves) > 0
+
+    def undo(self):
+        """ Take back the last move made in this TOAHModel.
+
+        Raises IllegalMoveError if there is no move to take back.
+
+        @type self: TOAHModel
+        @rtype: None
+
+        >>> M = TOAHModel(3)
+        >>> M.fill_first_stool(2)
+        >>> M.move(0, 1)
+        >>> M.undo()
+        >>> M.number_of_moves(), len(M.get_stool_at(0))
+        (0, 2)
+        """
+        if not self.can_undo():
+            raise IllegalMoveError("There is no move to undo!")
+        source_stool, destination_stool = self._move_seq.pop_move()
+        self._shift(destination_stool, source_stool)
+        self._redo_moves.append((source_stool, destination_stool))
+        for listener in self._listeners:
+            listener.on_undo(self, source_stool, destination_stool)
+
+    def redo(self):
+        """ Replay the last move taken back by undo.
+
+        Raises IllegalMoveError if there is no move to replay.
+
+        @type self: TOAHModel
+        @rtype: None
+
+        >>> M = TOAHModel(3)
+        >>> M.fill_first_stool(2)
+        >>> M.move(0, 1)
+        >>> M.undo()
+        >>> M.redo()
+        >>> M.number_of_moves(), M.get_top_cheese(1).size
+        (1, 1)
+        """
+        if not self.can_redo():
+            raise IllegalMoveError("There is no move to redo!")
+        source_stool, destination_stool = self._redo_moves.pop()
+        self._shift(source_stool, destination_stool)
+        self._move_seq.add_move(source_stool, destination_stool)
+        self._record_snapshot()
+        for listener in self._listeners:
+            listener.on_move(self, source_stool, destination_stool)
+
+    def go_to_move(self, index):
+        """ Undo or redo moves until exactly index moves have been made.
+
+        index may be anything from 0 to the number of moves made plus
+        the number of moves that can be redone. When that is cheaper than
+        stepping, the nearest snapshot is restored and at most
+        SNAPSHOT_INTERVAL moves are replayed from it.
+
+        @type self: TOAHModel
+        @type index: int
+        @rtype: None
+
+        >>> M = TOAHModel(3)
+        >>> M.fill_first_stool(3)
+        >>> for move in [(0, 2), (0, 1), (2, 1), (0, 2)]:
+        ...     M.move(move[0], move[1])
+        >>> M.go_to_move(1)
+        >>> M.get_state()
+        (2, 0, 0)
+        >>> M.go_to_move(4)
+        >>> M.get_state()
+        (1, 1, 2)
+        """
+        current = self.number_of_moves()
+        if not 0 <= index <= current + len(self._redo_moves):
+            raise IndexError("move index out of range")
+        snapshot = min((index - self._snapshot_base) //
+                       self.SNAPSHOT_INTERVAL, len(self._snapshots) - 1)
+        snapshot_index = self._snapshot_base + \
+            snapshot * self.SNAPSHOT_INTERVAL
+        if snapshot >= 0 and index - snapshot_index < abs(index - current):
+            if snapshot_index < current:
+                undone = self._move_seq.truncate(snapshot_index)
+                undone.reverse()
+                self._redo_moves.extend(undone)
+            else:
+                for _ in range(snapshot_index - current):
+                    self._move_seq.add_move(*self._redo_moves.pop())
+            self._arrange(self._snapshots[snapshot])
+            current = snapshot_index
+        while current > index:
+            self.undo()
+            current -= 1
+        while current < index:
+            self.redo()
+            current += 1
 
     def _cheese_at(self, stool_index, stool_height):
         """ Return (stool_height)th from stool_index stool, if possible.
@@ -292,7 +777,6 @@ class TOAHModel:
         >>> m1 == m2
         True
         """
-        result = True
         if not isinstance(other, TOAHModel):
             return False
         if not self.get_number_of_stools() == other.get_number_of_stools():
@@ -302,52 +786,66 @@ class TOAHModel:
         stool_list = self.get_stool_list()
         other_s_list = other.get_stool_list()
         for i in range(len(stool_list)):
-            cheese_stack = stool_list[i].get_cheese_stack()
-            for cheese in cheese_stack:
-                if stool_list[i].locate_cheese(cheese) != \
-                        other_s_list[i].locate_cheese(cheese):
-                    result = False
-        return result
+            # List equality compares identical (interned) cheeses without
+            # calling Cheese.__eq__.
+            if stool_list[i].get_cheese_stack() != \
+                    other_s_list[i].get_cheese_stack():
+                return False
+        return True
 
     def __str__(self):
         """
         Depicts only the current state of the stools and cheese.
 
+        The text of each row of cheeses is kept between calls, and only
+        the two rows changed by each move since the last call are
+        rendered again. Cheeses added to stools other than through this
+        TOAHModel are not seen until set_state or add is called.
+
         @param TOAHModel self:
         @rtype: str
+
+        >>> M = TOAHModel(3)
+        >>> M.fill_first_stool(2)
+        >>> M.move(0, 2)
+        >>> [line.rstrip() for line in str(M).split("\\n")]
+        ['', ' ---            -', '=====  =====  =====']
+        """
+        if self._text is not None:
+            return self._text
+        if self._rows is None:
+            sizes = [cheese.size for stool in self._stools
+                     for cheese in stool.get_cheese_stack()]
+            self._cell_width = 2 * max(sizes, default=0) + 1
+            self._rows = [self._render_row(height)
+                          for height in range(self._number_of_cheeses)]
+        else:
+            for height in self._dirty_rows:
+                self._rows[height] = self._render_row(height)
+        self._dirty_rows = []
+        self._text = ''.join(reversed(self._rows)) + \
+            ("=" * self._cell_width + "  ") * self._number_of_stools
+        return self._text
+
+    def _render_row(self, height):
+        """ Return the line of str showing the cheeses at height, from 0
+        at the bottom, ending in a newline.
+
+        @type self: TOAHModel
+        @type height: int
+        @rtype: str
         """
-        all_cheeses = []
-        for height in range(self.get_number_of_cheeses()):
-            for stool in range(self.get_number_of_stools()):
-                if self._cheese_at(stool, height) is not None:
-                    all_cheeses.append(self._cheese_at(stool, height))
-        max_cheese_size = max([c.size for c in all_cheeses]) \
-            if len(all_cheeses) > 0 else 0
-        stool_str = "=" * (2 * max_cheese_size + 1)
-        stool_spacing = "  "
-        stools_str = (stool_str + stool_spacing) * self.get_number_of_stools()
-
-        def _cheese_str(size):
-            # helper for string representation of cheese
-            if size == 0:
-                return " " * len(stool_str)
-            cheese_part = "-" + "--" * (size - 1)
-            space_filler = " " * int((len(stool_str) - len(cheese_part)) / 2)
-            return space_filler + cheese_part + space_filler
-
-        lines = ""
-        for height in range(self.get_number_of_cheeses() - 1, -1, -1):
-            line = ""
-            for stool in range(self.get_number_of_stools()):
-                c = self._cheese_at(stool, height)
-                if isinstance(c, Cheese):
-                    s = _cheese_str(int(c.size))
-                else:
-                    s = _cheese_str(0)
-                line += s + stool_spacing
-            lines += line + "\n"
-        lines += stools_str
-        return lines
+        width = self._cell_width
+        cells = []
+        for stool in self._stools:
+            cheese = stool[height] if height < len(stool) else None
+            if isinstance(cheese, Cheese):
+                cheese_part = "-" + "--" * (int(cheese.size) - 1)
+                space_filler = " " * ((width - len(cheese_part)) // 2)
+                cells.append(space_filler + cheese_part + space_filler)
+            else:
+                cells.append(" " * width)
+        return "  ".join(cells) + "  \n"
 
 
 class Stool:
@@ -499,7 +997,8 @@ class Stool:
         0
         """
         for cheese in self._cheese_stack:
-            if cheese.size == specified_cheese.size:
+            if cheese is specified_cheese or \
+                    cheese.size == specified_cheese.size:
                 return self._id
         return None
 
@@ -561,13 +1060,59 @@ class Stool:
 class Cheese:
     """ A cheese for stacking in a TOAHModel
 
+    Cheeses are immutable flyweights: Cheese(size) always returns the same
+    object for a given size, shared by every model, so filling a model
+    allocates no cheeses after the first one of each size. Subclasses such
+    as CheeseView are ordinary objects, created anew each time.
+
     === Attributes ===
     @param int size: width of cheese
     """
+    __slots__ = ('size',)
+    _interned = {}
+
+    def __new__(cls, size, *args):
+        """ Return the Cheese of the given size, creating it the first time,
+        or a new instance of a subclass (whose __init__ may take args).
+
+        @param type cls:
+        @param int size:
+        @param list args:
+        @rtype: Cheese
+
+        >>> Cheese(3) is Cheese(3)
+        True
+        """
+        if cls is not Cheese:
+            return super().__new__(cls)
+        cheese = Cheese._interned.get(size)
+        if cheese is None:
+            cheese = super().__new__(cls)
+            object.__setattr__(cheese, 'size', size)
+            Cheese._interned[size] = cheese
+        return cheese
+
+    @staticmethod
+    def sizes(number_of_cheeses):
+        """ Return the interned cheeses of sizes number_of_cheeses down to 1,
+        largest first.
+
+        @param int number_of_cheeses:
+        @rtype: list[Cheese]
+
+        >>> [cheese.size for cheese in Cheese.sizes(3)]
+        [3, 2, 1]
+        """
+        interned = Cheese._interned
+        return [interned.get(size) or Cheese(size)
+                for size in range(number_of_cheeses, 0, -1)]
 
     def __init__(self, size):
         """ Initialize a Cheese to diameter size.
 
+        Interned cheeses already have their size, so only subclasses set
+        it here.
+
         @param Cheese self:
         @param int size:
         @rtype: None
@@ -578,7 +1123,58 @@ class Cheese:
         >>> c.size
         3
         """
-        self.size = size
+        if type(self) is not Cheese:
+            self.size = size
+
+    def __setattr__(self, name, value):
+        """ Set an attribute, unless self is an interned Cheese.
+
+        @param Cheese self:
+        @param str name:
+        @param object value:
+        @rtype: None
+
+        >>> try:
+        ...     Cheese(3).size = 4
+        ... except AttributeError as e:
+        ...     print(e)
+        Cheese is immutable
+        """
+        if type(self) is Cheese:
+            raise AttributeError("Cheese is immutable")
+        object.__setattr__(self, name, value)
+
+    def __reduce_ex__(self, protocol):
+        """ Pickle a Cheese as a call to Cheese(size), so that unpickling
+        returns the interned cheese. Instances of subclasses, which are
+        not interned, are pickled and copied as usual.
+
+        @param Cheese self:
+        @param int protocol:
+        @rtype: tuple
+
+        >>> import copy
+        >>> class Labelled(Cheese):
+        ...     pass
+        >>> labelled = Labelled(2)
+        >>> labelled.label = 'brie'
+        >>> duplicate = copy.copy(labelled)
+        >>> type(duplicate).__name__, duplicate.size, duplicate.label
+        ('Labelled', 2, 'brie')
+        >>> copy.deepcopy(Cheese(2)) is Cheese(2)
+        True
+        """
+        if type(self) is Cheese:
+            return Cheese, (self.size,)
+        return super().__reduce_ex__(protocol)
+
+    def __getnewargs__(self):
+        """ Return the arguments __new__ needs to recreate a copy of self.
+
+        @param Cheese self:
+        @rtype: tuple[int]
+        """
+        return self.size,
 
     def __eq__(self, other):
         """ Is self equivalent to other?
@@ -595,7 +1191,18 @@ class Cheese:
         >>> c == c2
         True
         """
-        return self.size == other.size
+        return self is other or self.size == other.size
+
+    def __hash__(self):
+        """ Return a hash consistent with __eq__.
+
+        @param Cheese self:
+        @rtype: int
+
+        >>> hash(Cheese(3)) == hash(3)
+        True
+        """
+        return hash(self.size)
 
     def __str__(self):
         """ returns a str represention of the cheese self.
@@ -610,6 +1217,95 @@ class Cheese:
         return 'This Cheese has size {}'.format(self.size)
 
 
+class MoveListener:
+    """ Interface for objects notified of the moves made in a TOAHModel.
+
+    Subscribe a listener with TOAHModel.add_listener. A TOAHModel with no
+    listeners does no work beyond the move itself.
+    """
+
+    def on_move(self, model, source_stool, destination_stool):
+        """ React to the top cheese of source_stool having been moved
+        onto destination_stool in model.
+
+        @type self: MoveListener
+        @type model: TOAHModel
+        @type source_stool: int
+        @type destination_stool: int
+        @rtype: None
+        """
+        pass
+
+    def on_undo(self, model, source_stool, destination_stool):
+        """ React to the move from source_stool to destination_stool
+        having been taken back in model.
+
+        @type self: MoveListener
+        @type model: TOAHModel
+        @type source_stool: int
+        @type destination_stool: int
+        @rtype: None
+        """
+        pass
+
+    def on_reset(self, model):
+        """ React to the cheeses of model having been rearranged other
+        than by moves, e.g. by TOAHModel.set_state.
+
+        @type self: MoveListener
+        @type model: TOAHModel
+        @rtype: None
+        """
+        pass
+
+
+class AnimationRecorder(MoveListener):
+    """ MoveListener recording the text frame of the model after every move.
+
+    === Private Attributes ===
+    @param list[str] _frames:
+        str of the model after each recorded move
+    """
+
+    def __init__(self):
+        """ Create a new AnimationRecorder with no frames.
+
+        @type self: AnimationRecorder
+        @rtype: None
+
+        >>> AnimationRecorder().get_frames()
+        []
+        """
+        self._frames = []
+
+    def on_move(self, model, source_stool, destination_stool):
+        """ Record the current frame of model.
+
+        @type self: AnimationRecorder
+        @type model: TOAHModel
+        @type source_stool: int
+        @type destination_stool: int
+        @rtype: None
+
+        >>> M = TOAHModel(2)
+        >>> M.fill_first_stool(1)
+        >>> recorder = AnimationRecorder()
+        >>> M.add_listener(recorder)
+        >>> M.move(0, 1)
+        >>> recorder.get_frames() == [str(M)]
+        True
+        """
+        self._frames.append(str(model))
+
+    def get_frames(self):
+        """ Return the frames recorded so far.
+
+        @type self: AnimationRecorder
+        @rtype: list[str]
+        """
+        return self._frames
+
+
 class IllegalMoveError(Exception):
     """ Exception indicating move that violate TOAHModel
     """
@@ -665,6 +1361,49 @@ class MoveSequence(object):
         """
         self._moves.append((src_stool, dest_stool))
 
+    def pop_move(self):
+        """ Remove and return the last move in MoveSequence self.
+
+        @param MoveSequence self:
+        @rtype: tuple[int]
+
+        >>> ms = MoveSequence([(1, 2), (2, 3)])
+        >>> ms.pop_move()
+        (2, 3)
+        >>> ms.length()
+        1
+        """
+        return self._moves.pop()
+
+    def truncate(self, length):
+        """ Remove the moves after the first length moves of self, and
+        return them in order.
+
+        @param MoveSequence self:
+        @param int length:
+        @rtype: list[tuple[int]]
+
+        >>> ms = MoveSequence([(1, 2), (2, 3), (3, 1)])
+        >>> ms.truncate(1)
+        [(2, 3), (3, 1)]
+        >>> ms.length()
+        1
+        """
+        removed = self._moves[length:]
+        del self._moves[length:]
+        return removed
+
+    def __iter__(self):
+        """ Iterate over the moves in self, in order.
+
+        @param MoveSequence self:
+        @rtype: iterator[tuple[int]]
+
+        >>> list(MoveSequence([(1, 2), (2, 3)]))
+        [(1, 2), (2, 3)]
+        """
+        return iter(self._moves)
+
     def length(self):
         """ Return number of moves in self.
 
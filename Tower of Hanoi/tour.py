@@ -7,7 +7,516 @@ functions to run TOAH tours.
 # solution for 'if __name__ == "main":'
 
 import time
-from toah_model import TOAHModel
+from functools import lru_cache
+from toah_model import TOAHModel, MAX_PACKED_STOOLS, pack_moves, \
+    unpack_moves
+
+
+# Tours of at most this many moves are cached by tour_blocks.
+CACHED_MOVES = 1 << 16
+
+
+def three_stool_moves(n, source, base_stool, destination):
+    """ Generate the moves taking n number of cheeses from the source
+    stool to the destination stool, using base_stool as the intermediate
+    stool.
+
+    @type n: int
+    @type source: int
+    @type base_stool: int
+    @type destination: int
+    @rtype: generator[tuple[int]]
+
+    >>> list(three_stool_moves(2, 0, 1, 2))
+    [(0, 1), (0, 2), (1, 2)]
+    """
+    if n > 1:
+        yield from three_stool_moves(n - 1, source, destination, base_stool)
+        yield source, destination
+        yield from three_stool_moves(n - 1, base_stool, source, destination)
+    elif n == 1:
+        yield source, destination
+
+
+def four_stool_moves(n, source, stool1, stool2, destination):
+    """ Generate the moves taking n number of cheeses from the source
+    stool to the destination stool, using stool1 and stool2 as
+    intermediate stools.
+
+    n is a valid natural number greater than 0
+
+    @type n: int
+    @type source: int
+    @type stool1: int
+    @type stool2: int
+    @type destination: int
+    @rtype: generator[tuple[int]]
+
+    >>> list(four_stool_moves(2, 0, 1, 2, 3))
+    [(0, 1), (0, 3), (1, 3)]
+    """
+    if n == 1:
+        yield source, destination
+    elif n == 2:
+        yield source, stool1
+        yield source, destination
+        yield stool1, destination
+    elif n == 3:
+        yield source, stool1
+        yield source, stool2
+        yield source, destination
+        yield stool2, destination
+        yield stool1, destination
+    elif n > 3:
+        yield from four_stool_moves(n - 3, source, stool2, destination, stool1)
+        yield from three_stool_moves(3, source, stool2, destination)
+        yield from four_stool_moves(n - 3, stool1, stool2, source, destination)
+
+
+def solve_moves(number_of_cheeses, number_of_stools):
+    """ Generate the moves of the tour taking a tower of number_of_cheeses
+    from the first stool to the last of three stools, or to the fourth
+    of four stools.
+
+    Raises ValueError for other numbers of stools.
+
+    @type number_of_cheeses: int
+    @type number_of_stools: int
+    @rtype: generator[tuple[int]]
+
+    >>> len(list(solve_moves(5, 4)))
+    13
+    >>> len(list(solve_moves(5, 3)))
+    31
+    """
+    if number_of_stools == 3:
+        return three_stool_moves(number_of_cheeses, 0, 1, 2)
+    if number_of_stools == 4:
+        return four_stool_moves(number_of_cheeses, 0, 1, 2, 3)
+    raise ValueError("tours are only available for 3 or 4 stools")
+
+
+def tour_length(number_of_cheeses, number_of_stools):
+    """ Return the number of moves in solve_moves(number_of_cheeses,
+    number_of_stools), without generating them.
+
+    four_stool_moves of n cheeses takes 2 * length(n - 3) + 7 moves for
+    n > 3, which unrolls to (length(r) + 7) * 2 ** k - 7 for the k steps
+    down to the r <= 3 cheeses left, so no recursion is needed.
+
+    @type number_of_cheeses: int
+    @type number_of_stools: int
+    @rtype: int
+
+    >>> tour_length(5, 4), tour_length(5, 3), tour_length(0, 4)
+    (13, 31, 0)
+    >>> [tour_length(n, 4) for n in range(1, 11)] == \\
+    ...     [sum(1 for _ in solve_moves(n, 4)) for n in range(1, 11)]
+    True
+    >>> tour_length(3000, 4).bit_length()
+    1003
+    """
+    if number_of_stools == 3:
+        return 2 ** number_of_cheeses - 1
+    if number_of_stools != 4:
+        raise ValueError("tours are only available for 3 or 4 stools")
+    steps = max(0, (number_of_cheeses - 1) // 3)
+    left = number_of_cheeses - 3 * steps
+    return (((0, 1, 3, 5)[left] + 7) << steps) - 7
+
+
+def three_stool_move(i, n, source=0, base_stool=1, destination=2):
+    """ Return move i (from 0) of three_stool_moves(n, source, base_stool,
+    destination) in O(1).
+
+    Numbering moves j = i + 1 from 1, move j takes the cheese from stool
+    (j & (j - 1)) % 3 to stool ((j | (j - 1)) + 1) % 3 of the tour from
+    stool 0 to stool 2 for odd n, or to stool 1 for even n, which is
+    relabelled to the stools given. The same arithmetic works elementwise
+    on NumPy arrays of move numbers.
+
+    @type i: int
+    @type n: int
+    @type source: int
+    @type base_stool: int
+    @type destination: int
+    @rtype: tuple[int]
+
+    >>> moves = list(three_stool_moves(4, 2, 0, 1))
+    >>> [three_stool_move(i, 4, 2, 0, 1) for i in range(15)] == moves
+    True
+    """
+    labels = _three_stool_labels(n, source, base_stool, destination)
+    j = i + 1
+    return labels[(j & (j - 1)) % 3], labels[((j | (j - 1)) + 1) % 3]
+
+
+def _three_stool_labels(n, source, base_stool, destination):
+    """ Return the stools standing for stools 0, 1 and 2 of the closed
+    form of three_stool_move.
+
+    @type n: int
+    @type source: int
+    @type base_stool: int
+    @type destination: int
+    @rtype: tuple[int]
+
+    >>> _three_stool_labels(2, 0, 1, 2)
+    (0, 2, 1)
+    """
+    if n % 2 == 1:
+        return source, base_stool, destination
+    return source, destination, base_stool
+
+
+def _move_keys(first, count):
+    """ Return a NumPy uint8 array of 2 * (j % 3) + (1 if j has an odd
+    number of trailing zero bits else 0) for the move numbers j from first
+    to first + count - 1, which determines move j of three_stool_move.
+
+    Move j takes the cheese from stool (j - p) % 3 to stool (j + p) % 3,
+    where p is 2 ** (trailing zeros of j) % 3, so 1 or 2 (as
+    j & (j - 1) = j - 2 ** t and (j | (j - 1)) + 1 = j + 2 ** t). Only
+    cheap bitwise operations are needed, and j % 3 simply cycles.
+
+    @type first: int
+    @type count: int
+    @rtype: numpy.ndarray
+    """
+    import numpy
+    dtype = numpy.uint32 if first + count <= 1 << 32 else numpy.uint64
+    j = numpy.arange(first, first + count, dtype=dtype)
+    even_bits = dtype(0x5555555555555555 & numpy.iinfo(dtype).max)
+    lowest_bit = j & (~j + dtype(1))
+    odd = (lowest_bit & even_bits) == 0
+    cycle = numpy.array([(first + k) % 3 for k in range(3)],
+                        dtype=numpy.uint8)
+    residues = numpy.tile(cycle, -(-count // 3))[:count]
+    return residues * numpy.uint8(2) + odd.view(numpy.uint8)
+
+
+def _key_labels(n, source, base_stool, destination):
+    """ Return NumPy uint8 arrays mapping each key of _move_keys to the
+    source and to the destination stool of its move.
+
+    @type n: int
+    @type source: int
+    @type base_stool: int
+    @type destination: int
+    @rtype: tuple[numpy.ndarray]
+    """
+    import numpy
+    labels = _three_stool_labels(n, source, base_stool, destination)
+    sources = []
+    destinations = []
+    for key in range(6):
+        residue, shift = key // 2, 2 if key % 2 else 1
+        sources.append(labels[(residue - shift) % 3])
+        destinations.append(labels[(residue + shift) % 3])
+    return (numpy.array(sources, dtype=numpy.uint8),
+            numpy.array(destinations, dtype=numpy.uint8))
+
+
+def three_stool_block(n, start, stop, source=0, base_stool=1,
+                      destination=2):
+    """ Return moves start to stop - 1 of three_stool_moves(n, source,
+    base_stool, destination) as two NumPy uint8 arrays of source and
+    destination stools, computed with vectorized bit operations.
+
+    Requires NumPy, which is only imported when this is called, and n of
+    at most 63 so that move numbers fit in 64 bits.
+
+    @type n: int
+    @type start: int
+    @type stop: int
+    @type source: int
+    @type base_stool: int
+    @type destination: int
+    @rtype: tuple[numpy.ndarray]
+
+    >>> try:
+    ...     import numpy
+    ... except ImportError:
+    ...     numpy = None
+    >>> numpy is None or [len(a) for a in three_stool_block(0, 0, 0)] == [0, 0]
+    True
+    """
+    if not 0 <= n <= 63 or not 0 <= start <= stop <= 2 ** n - 1:
+        raise ValueError("moves out of range of the tour")
+    if start == stop:
+        import numpy
+        return (numpy.zeros(0, dtype=numpy.uint8),
+                numpy.zeros(0, dtype=numpy.uint8))
+    keys = _move_keys(start + 1, stop - start)
+    sources, destinations = _key_labels(n, source, base_stool, destination)
+    return sources.take(keys), destinations.take(keys)
+
+
+def three_stool_blocks(n, block_size=1 << 20, source=0, base_stool=1,
+                       destination=2):
+    """ Generate all the moves of three_stool_moves(n, source, base_stool,
+    destination) as three_stool_block pairs of at most block_size moves.
+
+    block_size must be a power of two. Then the keys of every whole block
+    are those of the first block with the same move number modulo 3,
+    except for the last move, so each block is just two table lookups.
+
+    @type n: int
+    @type block_size: int
+    @type source: int
+    @type base_stool: int
+    @type destination: int
+    @rtype: generator[tuple[numpy.ndarray]]
+
+    >>> list(three_stool_blocks(0))
+    []
+    """
+    if block_size & (block_size - 1) or block_size < 1:
+        raise ValueError("block_size must be a power of two")
+    if not 0 <= n <= 63:
+        raise ValueError("moves out of range of the tour")
+    if n == 0:
+        return
+    sources, destinations = _key_labels(n, source, base_stool, destination)
+    total = tour_length(n, 3)
+    templates = {}
+    for start in range(0, total, block_size):
+        if start + block_size > total:
+            keys = _move_keys(start + 1, total - start)
+        else:
+            if (start + 1) % 3 not in templates:
+                templates[(start + 1) % 3] = _move_keys(start + 1,
+                                                        block_size)
+            keys = templates[(start + 1) % 3].copy()
+            keys[-1] = _move_keys(start + block_size, 1)[0]
+        yield sources.take(keys), destinations.take(keys)
+
+
+@lru_cache(maxsize=None)
+def _canonical_block(n, roles):
+    """ Return the tour of n cheeses between stools 0 to roles - 1, as in
+    three_stool_moves(n, 0, 1, 2) or four_stool_moves(n, 0, 1, 2, 3),
+    packed one byte per move as in toah_model.pack_moves.
+
+    @type n: int
+    @type roles: int
+    @rtype: bytes
+
+    >>> _canonical_block(2, 3)
+    b'\\x01\\x02\\x12'
+    """
+    if roles == 3:
+        return pack_moves(three_stool_moves(n, 0, 1, 2))
+    return pack_moves(four_stool_moves(n, 0, 1, 2, 3))
+
+
+@lru_cache(maxsize=1024)
+def _relabel_table(stools):
+    """ Return the bytes.translate table renaming stool i of packed moves
+    to stools[i].
+
+    @type stools: tuple[int]
+    @rtype: bytes
+
+    >>> pack_moves([(0, 1)]).translate(_relabel_table((2, 0, 1)))
+    b' '
+    """
+    if max(stools) >= MAX_PACKED_STOOLS:
+        raise ValueError("only stools 0 to {} can be packed".format(
+            MAX_PACKED_STOOLS - 1))
+    table = bytearray(range(256))
+    for source in range(len(stools)):
+        for destination in range(len(stools)):
+            table[source * MAX_PACKED_STOOLS + destination] = \
+                stools[source] * MAX_PACKED_STOOLS + stools[destination]
+    return bytes(table)
+
+
+def tour_blocks(n, stools):
+    """ Generate the tour of n cheeses from stools[0] to stools[-1] packed
+    as in toah_model.pack_moves, in blocks of at most CACHED_MOVES moves.
+
+    With three stools this is three_stool_moves(n, *stools), and with four
+    four_stool_moves(n, *stools). Tours of up to CACHED_MOVES moves are
+    generated once, cached for stools 0 to 3, and relabelled for any other
+    stools with bytes.translate; longer tours are split recursively into
+    such blocks.
+
+    @type n: int
+    @type stools: tuple[int]
+    @rtype: generator[bytes]
+
+    >>> moves = list(unpack_moves(b''.join(tour_blocks(5, (3, 0, 2, 1)))))
+    >>> moves == list(four_stool_moves(5, 3, 0, 2, 1))
+    True
+    """
+    roles = len(stools)
+    if n <= 0:
+        return
+    if tour_length(n, roles) <= CACHED_MOVES:
+        yield _canonical_block(n, roles).translate(
+            _relabel_table(tuple(stools)))
+    elif roles == 3:
+        source, base_stool, destination = stools
+        yield from tour_blocks(n - 1, (source, destination, base_stool))
+        yield pack_moves([(source, destination)])
+        yield from tour_blocks(n - 1, (base_stool, source, destination))
+    else:
+        source, stool1, stool2, destination = stools
+        yield from tour_blocks(n - 3, (source, stool2, destination, stool1))
+        yield from tour_blocks(3, (source, stool2, destination))
+        yield from tour_blocks(n - 3, (stool1, stool2, source, destination))
+
+
+def _move_tower(count, source, destination, spares):
+    """ Generate packed blocks moving a tower of count cheeses from source
+    to destination with the tour using up to two of the stools spares.
+
+    @type count: int
+    @type source: int
+    @type destination: int
+    @type spares: list[int]
+    @rtype: generator[bytes]
+
+    >>> list(_move_tower(2, 0, 4, [3]))
+    [b'\\x03\\x044']
+    """
+    if count == 1:
+        yield pack_moves([(source, destination)])
+    elif count > 1:
+        if not spares:
+            raise ValueError("not enough stools to move the tower")
+        yield from tour_blocks(count, (source,) + tuple(spares[:2]) +
+                               (destination,))
+
+
+def distribute_blocks(number_of_stools, source, segments):
+    """ Generate packed blocks of moves taking a tower on stool source to
+    the goal given by segments, a list of (count, target) pairs from the
+    largest cheeses down: the largest count cheeses end on stool target,
+    the next ones on the next target, and so on.
+
+    The tower above each segment is first moved aside to a free stool,
+    then the segment is moved with the stools that are left and the rest
+    of the goal is reached from the aside stool. When there is no stool to
+    put the rest aside, the whole tower is moved instead. Every move is a
+    block of tour_blocks.
+
+    @type number_of_stools: int
+    @type source: int
+    @type segments: list[tuple[int]]
+    @rtype: generator[bytes]
+
+    >>> M = TOAHModel(4)
+    >>> M.fill_first_stool(6, 1)
+    >>> segments = [(2, 0), (3, 3), (1, 0)]
+    >>> for block in distribute_blocks(4, 1, segments):
+    ...     for move in unpack_moves(block):
+    ...         M.move(move[0], move[1])
+    >>> M.get_state() == distributed_state(segments)
+    True
+    """
+    remaining = sum(count for count, _ in segments)
+    for count, target in segments:
+        rest = remaining - count
+        others = [stool for stool in range(number_of_stools)
+                  if stool not in (source, target)]
+        if count == 0 or target == source:
+            pass
+        elif rest == 0:
+            yield from _move_tower(count, source, target, others)
+        elif len(others) >= 2 or (others and count == 1):
+            aside = others[0]
+            yield from _move_tower(rest, source, aside,
+                                   others[1:] + [target])
+            yield from _move_tower(count, source, target, others[1:])
+            source = aside
+        else:
+            yield from _move_tower(remaining, source, target, others)
+            source = target
+        remaining = rest
+
+
+def distributed_state(segments):
+    """ Return the TOAHModel.get_state() of the goal given by segments,
+    as for distribute_blocks.
+
+    @type segments: list[tuple[int]]
+    @rtype: tuple[int]
+
+    >>> distributed_state([(2, 0), (1, 3)])
+    (3, 0, 0)
+    """
+    state = []
+    for count, target in reversed(segments):
+        state.extend([target] * count)
+    return tuple(state)
+
+
+def distribute_solver(model, source, segments):
+    """ Move the tower on stool source in model to the goal given by
+    segments, as for distribute_blocks.
+
+    @type model: TOAHModel
+    @type source: int
+    @type segments: list[tuple[int]]
+    @rtype: None
+
+    >>> M = TOAHModel(3)
+    >>> M.fill_first_stool(4, 2)
+    >>> distribute_solver(M, 2, [(1, 2), (3, 0)])
+    >>> M.get_state()
+    (0, 0, 0, 2)
+    """
+    for block in distribute_blocks(model.get_number_of_stools(), source,
+                                   segments):
+        for move in unpack_moves(block):
+            model.move(move[0], move[1])
+
+
+def three_stool_solver(model, n, source, base_stool, destination):
+    """ Move n number of cheeses in model from the source stool to the
+    destination stool, using base_stool as the intermediate stool.
+
+    @type model: TOAHModel
+    @type n: int
+    @type source: int
+    @type base_stool: int
+    @type destination: int
+    @rtype: None
+
+    >>> M = TOAHModel(3)
+    >>> M.fill_first_stool(3)
+    >>> three_stool_solver(M, 3, 0, 1, 2)
+    >>> len(M.get_stool_at(2)), M.number_of_moves()
+    (3, 7)
+    """
+    for move in three_stool_moves(n, source, base_stool, destination):
+        model.move(move[0], move[1])
+
+
+def four_stool_solver(model, n, source, stool1, stool2, destination):
+    """ Move n number of cheeses in model from the source stool to the
+    destination stool, using stool1 and stool2 as intermediate stools.
+
+    n is a valid natural number greater than 0
+
+    @type model: TOAHModel
+    @type n: int
+    @type source: int
+    @type stool1: int
+    @type stool2: int
+    @type destination: int
+    @rtype: None
+
+    >>> M = TOAHModel(4)
+    >>> M.fill_first_stool(5)
+    >>> four_stool_solver(M, 5, 0, 1, 2, 3)
+    >>> len(M.get_stool_at(3)), M.number_of_moves()
+    (5, 13)
+    """
+    for move in four_stool_moves(n, source, stool1, stool2, destination):
+        model.move(move[0], move[1])
 
 
 def tour_of_four_stools(model, delay_btw_moves=0.5, animate=False):
@@ -21,58 +530,9 @@ def tour_of_four_stools(model, delay_btw_moves=0.5, animate=False):
     @type animate: bool
         animate the tour or not
     """
-
-    def three_stool_solver(n, source, base_stool, destination):
-        """ A helper function that is used to moving n number of cheeses
-        from the origin stool to the destination stool.
-
-        @type n: int
-        @type source: int
-        @type base_stool: int
-        @type destination: int
-
-        "Examples are not practical here."
-        """
-        if n > 1:
-            three_stool_solver(n - 1, source, destination, base_stool)
-            model.move(source, destination)
-            three_stool_solver(n - 1, base_stool, source, destination)
-        elif n == 1:
-            model.move(source, destination)
-
-    def four_stool_solver(n, source, stool1, stool2, destination):
-        """ A helper function that is used to solve ordering n number of
-        cheeses from the first stool to the fourth stool.
-
-        n is a valid natural number greater than 0
-
-        @type n: int
-        @type source: int
-        @type stool1: int
-        @type stool2: int
-        @type destination: int
-        @rtype: None
-
-        "Examples are not practical here."
-        """
-        if n == 1:
-            model.move(source, destination)
-        elif n == 2:
-            model.move(source, stool1)
-            model.move(source, destination)
-            model.move(stool1, destination)
-        elif n == 3:
-            model.move(source, stool1)
-            model.move(source, stool2)
-            model.move(source, destination)
-            model.move(stool2, destination)
-            model.move(stool1, destination)
-        elif n > 3:
-            four_stool_solver(n - 3, source, stool2, destination, stool1)
-            three_stool_solver(3, source, stool2, destination)
-            four_stool_solver(n - 3, stool1, stool2, source, destination)
-
-    four_stool_solver(model.get_number_of_cheeses(), 0, 1, 2, 3)
+    if animate is True:
+        model.enable_animation()
+    four_stool_solver(model, model.get_number_of_cheeses(), 0, 1, 2, 3)
 
     if animate is True:
         for move in model.get_animated_moves():